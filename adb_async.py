@@ -0,0 +1,154 @@
+import asyncio
+import concurrent.futures
+import os
+import struct
+import threading
+
+import cv2
+import numpy as np
+
+from adb_wrapper import ADBWrapper, RAW_PIXEL_FORMATS
+from frame import Frame
+
+
+class AsyncADBWrapper:
+    """
+    Cliente ADB asíncrono: habla el protocolo del servidor ADB (puerto 5037)
+    directamente sobre sockets asyncio, sin hilos ni procesos `adb`.
+
+    Cada operación abre su propio canal, así que varias pueden ir a la vez:
+
+        pkg, frame = await asyncio.gather(aio.current_package(), aio.take_screenshot())
+
+    Desde código síncrono se usan con run_sync() (bucle de eventos en un hilo
+    propio), p.ej. ADBWrapper.screenshot_and_package().
+    """
+    def __init__(self, serial=None, host=None, port=None):
+        self.serial = serial
+        # Mismo servidor que adbutils (fake_adb.py se usa con ANDROID_ADB_SERVER_PORT)
+        self.host = host or os.environ.get("ANDROID_ADB_SERVER_HOST", "127.0.0.1")
+        self.port = port or int(os.environ.get("ANDROID_ADB_SERVER_PORT", 5037))
+        self._raw_header_size = None # 12 bytes (Android < 9) o 16 (con colorspace)
+
+    # =========================================================================
+    # PROTOCOLO
+    # =========================================================================
+
+    @staticmethod
+    async def _send_request(reader, writer, request):
+        """Petición "<longitud hex><payload>" y respuesta OKAY / FAIL<msg>."""
+        payload = request.encode()
+        writer.write(b"%04x" % len(payload) + payload)
+        await writer.drain()
+        status = await reader.readexactly(4)
+        if status != b"OKAY":
+            length = int(await reader.readexactly(4), 16)
+            message = (await reader.readexactly(length)).decode(errors="replace")
+            raise ConnectionError(f"ADB '{request}': {message}")
+
+    async def _open(self, service):
+        """Canal al servicio del dispositivo (shell:..., exec:...)."""
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            transport = f"host:transport:{self.serial}" if self.serial else "host:transport-any"
+            await self._send_request(reader, writer, transport)
+            await self._send_request(reader, writer, service)
+        except BaseException:
+            writer.close()
+            raise
+        return reader, writer
+
+    async def _read_all(self, service, timeout=None):
+        """Salida completa del servicio, con plazo (por defecto ADB_TIMEOUTS["shell"])."""
+        async def read():
+            reader, writer = await self._open(service)
+            try:
+                return await reader.read()
+            finally:
+                writer.close()
+        return await asyncio.wait_for(read(), timeout or ADBWrapper._budget("shell"))
+
+    # =========================================================================
+    # OPERACIONES
+    # =========================================================================
+
+    async def shell(self, cmd, timeout=None):
+        """Ejecuta un comando shell y retorna su salida (str, sin salto final)."""
+        out = await self._read_all("shell:" + cmd, timeout)
+        return out.decode("utf-8", errors="replace").rstrip()
+
+    async def tap(self, x, y):
+        # Swipe corto como ADBWrapper.tap_robust (seguridad de Xiaomi)
+        await self.shell(f"input swipe {x} {y} {x} {y} 100")
+
+    async def keyevent(self, keycode):
+        await self.shell(f"input keyevent {keycode}")
+
+    async def current_package(self):
+        """Paquete en primer plano o "UNKNOWN"."""
+        package = ADBWrapper._parse_package(
+            await self.shell("dumpsys window windows | grep mCurrentFocus"))
+        if package is None:
+            package = ADBWrapper._parse_package(
+                await self.shell("dumpsys activity activities | grep ResumedActivity"))
+        return package or "UNKNOWN"
+
+    async def take_screenshot(self, mode="png", timeout=None):
+        """
+        Captura (Frame BGR) según ADBWrapper.capture_mode: "png" = screencap -p,
+        "raw" = framebuffer sin comprimir. Como en el camino síncrono, un formato
+        raw no soportado lanza ValueError (el llamante pasa a "png").
+        Plazo por defecto: ADB_TIMEOUTS["screenshot"].
+        """
+        return await asyncio.wait_for(self._take_screenshot(mode), timeout or ADBWrapper._budget("screenshot"))
+
+    async def _take_screenshot(self, mode):
+        if mode != "raw":
+            png = await self._read_all("exec:screencap -p")
+            image = cv2.imdecode(np.frombuffer(png, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                raise ConnectionError("screencap -p sin imagen válida")
+            return Frame(image)
+
+        if self._raw_header_size is None:
+            sdk = await self.shell("getprop ro.build.version.sdk")
+            self._raw_header_size = 16 if int(sdk or 0) >= 28 else 12
+
+        reader, writer = await self._open("exec:screencap")
+        try:
+            header = await reader.readexactly(self._raw_header_size)
+            width, height, pixel_format = struct.unpack_from("<III", header)
+            if pixel_format not in RAW_PIXEL_FORMATS:
+                raise ValueError(f"formato de píxel {pixel_format}")
+            pixels = await reader.readexactly(width * height * 4)
+        finally:
+            writer.close()
+
+        rgba = np.frombuffer(pixels, dtype=np.uint8).reshape(height, width, 4)
+        return Frame(cv2.cvtColor(rgba, RAW_PIXEL_FORMATS[pixel_format]))
+
+
+# =========================================================================
+# PUENTE SÍNCRONO
+# =========================================================================
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def run_sync(coro, timeout=None):
+    """
+    Ejecuta la corrutina en el bucle de eventos del hilo ADB y espera el resultado.
+    Si vence el plazo se cancela (cierra sus sockets) y se relanza TimeoutError.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="adb-async", daemon=True).start()
+    future = asyncio.run_coroutine_threadsafe(coro, _loop)
+    try:
+        return future.result(timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise
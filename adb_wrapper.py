@@ -1,27 +1,146 @@
 import adbutils
+import asyncio
+import concurrent.futures
 import cv2
 import numpy as np
 import time
 import re
-from PIL import Image
+import shlex
+import socket
+import struct
+import threading
+from collections import deque
+from frame import Frame
+from video_stream import VideoStream, stream_size, upscale
+import config
+
+# Formatos de píxel de screencap (android PixelFormat) -> conversión a BGR
+RAW_PIXEL_FORMATS = {
+    1: cv2.COLOR_RGBA2BGR,  # RGBA_8888
+    2: cv2.COLOR_RGBA2BGR,  # RGBX_8888
+    5: cv2.COLOR_BGRA2BGR,  # BGRA_8888
+}
 
 class ADBWrapper:
     def __init__(self, device_id=None):
         self.device_id = device_id
         self.device = None
+        self.capture_mode = config.CAPTURE_MODE
+        self._raw_header_size = None # 12 bytes (Android < 9) o 16 (con colorspace)
+        self._raw_buffer = None      # Buffer de recepción reutilizado entre capturas
+        self.last_input_time = 0.0   # Última interacción enviada (tap, tecla, app...)
+        self._query_cache = {}       # clave -> (caduca, valor) de consultas al dispositivo
+        self._aio = None             # AsyncADBWrapper del mismo dispositivo (adb_async.py)
+        self._stream = None          # VideoStream activo (captura por vídeo)
+        self._stream_device_size = None
+
+        # Plazos por operación, circuit breaker y métricas (call_stats)
+        self._failures = 0           # Fallos seguidos
+        self._trips = 0              # Aperturas seguidas del breaker (backoff exponencial)
+        self._breaker_until = 0.0    # Hasta entonces no se llama a ADB
+        self._op_stats = {}          # operación -> llamadas, timeouts, errores, latencias
+        self._stats_lock = threading.Lock()
+        # Protege las (re)asignaciones de self.device. Los hilos (bomba de captura,
+        # GUI...) usan una referencia local del dispositivo por operación
+        # (_ensure_connection), así un reset del breaker no les deja un None a medias.
+        self._device_lock = threading.Lock()
+
+        # Shell persistente: un único `adb shell sh` para todos los comandos
+        self.persistent_shell = config.ADB_PERSISTENT_SHELL
+        self._shell_conn = None
+        self._shell_lock = threading.Lock()
+        self._shell_seq = 0
+
+        # Bomba de captura (opcional): hilo que captura sin parar en un triple buffer
+        self._pump_thread = None
+        self._pump_stop = threading.Event()
+        self._pump_cond = threading.Condition()
+        self._pump_frames = deque(maxlen=3)  # (seq, t_inicio, t_fin, frame)
+        self._pump_seq = 0
+        self._pump_served_seq = 0
+        self._pump_stats = {"frames": 0, "dropped": 0, "capture_ms": deque(maxlen=30),
+                            "timestamps": deque(maxlen=30), "ages_ms": deque(maxlen=30)}
         self._connect_client()
 
     def _connect_client(self):
+        self.close_shell()
+        started = time.time()
         try:
+            # Toda conexión del cliente lleva timeout de socket: nada bloquea indefinidamente
+            client = adbutils.AdbClient(socket_timeout=self._budget("default"))
             if self.device_id:
-                self.device = adbutils.adb.device(serial=self.device_id)
+                device = client.device(serial=self.device_id)
             else:
                 # Si no se especifica ID, usar el primero disponible
-                self.device = adbutils.adb.device()
+                device = client.device()
         except Exception as e:
             print(f"Error conectando con adbutils: {e}")
+            device = None
+            self._record("connect", started, e)
+        with self._device_lock:
+            self.device = device
+        return device
+
+    def _drop_device(self):
+        """Olvida el dispositivo: la siguiente operación reconecta."""
+        with self._device_lock:
             self.device = None
 
+    # =========================================================================
+    # DEADLINES / CIRCUIT BREAKER
+    # =========================================================================
+
+    @staticmethod
+    def _budget(op):
+        """Plazo (s) de una operación: ADB_TIMEOUTS[op] o el de por defecto."""
+        return config.ADB_TIMEOUTS.get(op, config.ADB_TIMEOUTS["default"])
+
+    def _record(self, op, started, error=None):
+        """
+        Registra la latencia de una operación. Tras ADB_BREAKER_THRESHOLD fallos
+        seguidos abre el circuit breaker: durante un backoff exponencial las
+        operaciones fallan al instante y después se reconecta.
+        """
+        with self._stats_lock:
+            stats = self._op_stats.setdefault(op, {"calls": 0, "timeouts": 0, "errors": 0,
+                                                   "ms": deque(maxlen=100)})
+            stats["calls"] += 1
+            stats["ms"].append((time.time() - started) * 1000)
+            if error is None:
+                if self._trips:
+                    print("✅ ADB responde de nuevo.")
+                self._failures = 0
+                self._trips = 0
+                return
+            if isinstance(error, (adbutils.AdbTimeout, TimeoutError)):
+                stats["timeouts"] += 1
+            else:
+                stats["errors"] += 1
+            self._failures += 1
+            if self._failures < config.ADB_BREAKER_THRESHOLD:
+                return
+            backoff = min(config.ADB_BACKOFF_MAX, config.ADB_BACKOFF_BASE * 2 ** self._trips)
+            self._trips += 1
+            self._failures = 0
+            self._breaker_until = time.time() + backoff
+        print(f"⚠ ADB sin respuesta ({op}: {error}). Pausa de {backoff:.0f}s antes de reconectar.")
+        self._drop_device() # Se reconecta al cerrar el breaker
+        self.close_shell()
+
+    def breaker_open(self):
+        return time.time() < self._breaker_until
+
+    def call_stats(self):
+        """Métricas por operación (llamadas, timeouts, errores, p50/p95 ms) y estado del breaker."""
+        with self._stats_lock:
+            ops = {}
+            for op, stats in self._op_stats.items():
+                ms = sorted(stats["ms"])
+                ops[op] = {"calls": stats["calls"], "timeouts": stats["timeouts"], "errors": stats["errors"],
+                           "p50_ms": ms[len(ms) // 2] if ms else 0.0,
+                           "p95_ms": ms[min(len(ms) - 1, int(len(ms) * 0.95))] if ms else 0.0}
+            return {"ops": ops, "breaker_open": self.breaker_open(), "trips": self._trips}
+
     def get_screen_dimensions(self):
         """Devuelve (width, height) del dispositivo."""
         if not self._ensure_connection():
@@ -42,7 +161,11 @@ class ADBWrapper:
 
     def get_battery_level(self):
         """Devuelve el nivel de bateria (0-100) o None si falla."""
-        out = self._run_command(["dumpsys", "battery", "|", "grep", "level"])
+        return self._cached("battery", lambda: self._parse_battery(
+            self._run_command(["dumpsys", "battery", "|", "grep", "level"])))
+
+    @staticmethod
+    def _parse_battery(out):
         if out:
              # Output: "  level: 85"
              match = re.search(r"level:\s+(\d+)", out)
@@ -50,37 +173,205 @@ class ADBWrapper:
                  return int(match.group(1))
         return None
 
+    # =========================================================================
+    # QUERY CACHE
+    # =========================================================================
+
+    def _cached(self, key, fetch):
+        """
+        Valor de una consulta al dispositivo cacheado durante ADB_QUERY_TTL[key]
+        segundos. Los fallos (None) no se cachean.
+        """
+        entry = self._query_cache.get(key)
+        now = time.time()
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        value = fetch()
+        self._store(key, value, now)
+        return value
+
+    def _store(self, key, value, now=None):
+        if value is None:
+            self._query_cache.pop(key, None)
+            return
+        ttl = config.ADB_QUERY_TTL.get(key, 0)
+        self._query_cache[key] = ((now or time.time()) + ttl, value)
+
+    def invalidate(self, *keys):
+        """Descarta consultas cacheadas (todas si no se indican claves)."""
+        if not keys:
+            self._query_cache.clear()
+        for key in keys:
+            self._query_cache.pop(key, None)
+
+    def get_device_status(self):
+        """
+        Estado para la GUI: {"battery", "wifi", "brightness"}. Si alguna consulta
+        ha caducado se refrescan las tres en una sola llamada shell.
+        """
+        keys = ("battery", "wifi", "brightness")
+        now = time.time()
+        if any(key not in self._query_cache or self._query_cache[key][0] <= now for key in keys):
+            out = self._run_command(["dumpsys battery | grep level; echo @@;",
+                                     "settings get global wifi_on; echo @@;",
+                                     "settings get system screen_brightness"])
+            parts = out.split("@@") if out else []
+            if len(parts) == 3:
+                self._store("battery", self._parse_battery(parts[0]), now)
+                self._store("wifi", self._parse_wifi(parts[1]), now)
+                self._store("brightness", self._parse_int(parts[2]), now)
+        return {key: self._query_cache[key][1] if key in self._query_cache else None for key in keys}
+
     def _ensure_connection(self):
-        if self.device is None:
-            self._connect_client()
-        return self.device is not None
+        """
+        Dispositivo para la operación en curso (reconectando si hace falta) o None.
+        Usar la referencia devuelta y no self.device, que otro hilo puede anular.
+        """
+        if self.breaker_open():
+            return None # Fallar rápido hasta el siguiente intento de reconexión
+        device = self.device
+        if device is None:
+            device = self._connect_client()
+        return device
 
     def _run_command(self, cmd_args, timeout=None):
         """
         Ejecuta un comando shell en el dispositivo. 
+        timeout: plazo en segundos (por defecto ADB_TIMEOUTS["input"] o ["shell"]).
         """
-        if not self._ensure_connection():
+        device = self._ensure_connection()
+        if device is None:
             return None
         
         cmd_str = " ".join(cmd_args)
+        op = "shell"
+        if cmd_str.split(" ", 1)[0] in ("input", "monkey", "am"):
+            op = "input"
+            self.last_input_time = time.time()
+            self.invalidate("package") # Puede cambiar la app en primer plano
+        timeout = timeout or self._budget(op)
+        started = time.time()
         try:
-            # adbutils shell devuelve string
-            return self.device.shell(cmd_str, timeout=timeout)
-        except adbutils.AdbTimeout:
+            out = self._run_persistent([cmd_str], timeout) if self.persistent_shell else None
+            if out is not None:
+                out = out[0]
+            else:
+                # adbutils shell devuelve string
+                out = device.shell(cmd_str, timeout=timeout)
+            self._record(op, started)
+            return out
+        except adbutils.AdbTimeout as e:
+            self._record(op, started, e)
             return None
         except Exception as e:
+            self._record(op, started, e)
             print(f"Error ejecutando comando '{cmd_str}': {e}")
             return None
 
+    # =========================================================================
+    # PERSISTENT SHELL
+    # =========================================================================
+
+    def _open_shell(self):
+        """Abre el canal `adb shell sh` (stdin/stdout por el mismo socket)."""
+        device = self.device
+        if device is None: # Anulado por el breaker desde otro hilo
+            raise adbutils.AdbError("sin dispositivo")
+        return device.open_shell("sh")
+
+    def close_shell(self):
+        """Cierra el shell persistente (se reabre en el siguiente comando)."""
+        conn, self._shell_conn = self._shell_conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def _run_persistent(self, commands, timeout=None):
+        """
+        Ejecuta comandos en el shell persistente sin abrir una conexión ADB por
+        comando. Los comandos se escriben todos seguidos (pipelining) y cada uno
+        termina con una marca para separar su salida.
+        Retorna la lista de salidas, o None si el canal falla (el llamante hace
+        fallback a device.shell). Si vence el plazo lanza AdbTimeout.
+        """
+        deadline = time.time() + (timeout or self._budget("shell"))
+        with self._shell_lock:
+            try:
+                if self._shell_conn is None:
+                    self._shell_conn = self._open_shell()
+                sock = self._shell_conn.conn
+                sock.settimeout(max(0.01, deadline - time.time()))
+
+                marks = []
+                script = []
+                for cmd in commands:
+                    self._shell_seq += 1
+                    mark = f"__AUTOBOT_{self._shell_seq}__"
+                    marks.append(mark.encode())
+                    # </dev/null: ningún comando puede quedarse leyendo nuestro stdin
+                    script.append(f"{{ {cmd}\n}} </dev/null 2>&1; printf '\\n%s\\n' {mark}\n")
+                sock.sendall("".join(script).encode())
+
+                outputs = []
+                buf = b""
+                for mark in marks:
+                    end = b"\n" + mark + b"\n"
+                    while end not in buf:
+                        sock.settimeout(max(0.01, deadline - time.time()))
+                        chunk = sock.recv(65536)
+                        if not chunk:
+                            raise ConnectionError("shell cerrado")
+                        buf += chunk
+                    out, buf = buf.split(end, 1)
+                    outputs.append(out.decode("utf-8", errors="replace").rstrip())
+                return outputs
+            except socket.timeout:
+                # El comando no terminó en plazo: el shell queda en estado incierto
+                self.close_shell()
+                raise adbutils.AdbTimeout("shell persistente: plazo agotado")
+            except Exception as e:
+                # Timeout o canal roto: el estado del shell es incierto, se descarta
+                print(f"Shell persistente no disponible ({e}). Usando adb shell.")
+                self.close_shell()
+                return None
+
+    def run_pipelined(self, commands, timeout=None):
+        """
+        Ejecuta comandos independientes en un solo viaje al dispositivo.
+        Retorna la lista de salidas (None en los que fallen).
+        """
+        if not self._ensure_connection():
+            return [None] * len(commands)
+        if self.persistent_shell:
+            if any(cmd.split(" ", 1)[0] in ("input", "monkey", "am") for cmd in commands):
+                self.last_input_time = time.time()
+                self.invalidate("package")
+            started = time.time()
+            try:
+                out = self._run_persistent(commands, timeout)
+            except adbutils.AdbTimeout as e:
+                self._record("shell", started, e)
+                return [None] * len(commands)
+            if out is not None:
+                self._record("shell", started)
+                return out
+        return [self._run_command([cmd], timeout) for cmd in commands]
+
+    def input_batch(self):
+        """Lote de entradas (taps, teclas, texto) enviado con send() en un solo viaje."""
+        return InputBatch(self)
+
     def connect(self):
         """Verifica que hay un dispositivo conectado."""
         try:
             # Forzar reconexión/chequeo
-            self._connect_client()
-            if self.device:
+            device = self._connect_client()
+            if device:
                 # device.prop es una propiedad que contiene los system properties
-                model = self.device.prop.get('ro.product.model', 'Unknown')
-                print(f"Dispositivo conectado: {self.device.serial} ({model})")
+                model = device.prop.get('ro.product.model', 'Unknown')
+                print(f"Dispositivo conectado: {device.serial} ({model})")
                 return True
             else:
                 return False
@@ -90,45 +381,285 @@ class ADBWrapper:
 
     def is_connected(self):
         """Devuelve True si el dispositivo está conectado y respondiendo."""
-        if not self.device:
-            # Intentar reconectar si perdimos la instancia
-            self._connect_client()
-            
-        if not self.device:
+        # Reconecta si perdimos la instancia
+        device = self._ensure_connection()
+        if device is None:
             return False
 
+        started = time.time()
         try:
             # Comprobación ligera: obtener estado
-            state = self.device.get_state()
+            state = device.get_state()
+            self._record("query", started)
             return state == "device"
-        except Exception:
+        except Exception as e:
             # Si falla, intentar reconectar en la siguiente llamada
-            self.device = None
+            self._record("query", started, e)
+            self._drop_device()
             return False
 
     def take_screenshot(self):
-        """Toma una captura de pantalla usando adbutils (que usa screencap y socket)."""
-        if not self._ensure_connection():
+        """
+        Toma una captura de pantalla (Frame BGR).
+        CAPTURE_MODE "raw": framebuffer sin comprimir por el socket ADB (sin PNG).
+        CAPTURE_MODE "png": screencap -p. También es el fallback de "raw".
+        Todos los intentos comparten el plazo ADB_TIMEOUTS["screenshot"].
+        """
+        device = self._ensure_connection()
+        if device is None:
             return None
 
+        if self._stream is not None:
+            frame = self._stream_frame()
+            if frame is not None:
+                return frame
+
+        started = time.time()
+        deadline = started + self._budget("screenshot")
+        error = None
         for attempt in range(3):
+            if self.capture_mode == "raw":
+                try:
+                    frame = self._take_screenshot_raw(device, deadline)
+                    self._record("screenshot", started)
+                    return frame
+                except ValueError as e:
+                    # Formato no soportado: este dispositivo usará PNG
+                    print(f"Captura raw no soportada ({e}). Usando screencap -p.")
+                    self.capture_mode = "png"
+                except Exception as e:
+                    error = e # Este intento sigue por PNG
+
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
             try:
-                # adbutils.device.screenshot() devuelve una PIL Image
-                pil_image = self.device.screenshot()
-                
-                # Convertir PIL a OpenCV (numpy array RGB -> BGR)
-                open_cv_image = np.array(pil_image)
-                # Convert RGB to BGR
-                open_cv_image = open_cv_image[:, :, ::-1].copy() 
-                
-                return open_cv_image
+                png = device.shell(["screencap", "-p"], encoding=None, timeout=remaining)
+                # imdecode da BGR directamente (sin pasar por PIL)
+                image = cv2.imdecode(np.frombuffer(png, dtype=np.uint8), cv2.IMREAD_COLOR)
+                if image is None:
+                    raise adbutils.AdbError("screencap -p sin imagen válida")
+                self._record("screenshot", started)
+                return Frame(image)
             except Exception as e:
-                # print(f"Error captura intento {attempt}: {e}")
+                error = e
+                if deadline - time.time() <= 0.5:
+                    break
                 time.sleep(0.5)
-            
-        print("Error recuperando captura tras 3 intentos")
+
+        self._record("screenshot", started, error or adbutils.AdbTimeout("plazo agotado"))
+        print(f"Error recuperando captura ({error or 'plazo agotado'})")
         return None
 
+    # =========================================================================
+    # VIDEO STREAM
+    # =========================================================================
+
+    def start_video_stream(self):
+        """
+        Arranca la captura por vídeo (screenrecord H.264 + PyAV). take_screenshot
+        servirá el último frame decodificado, reescalado a la resolución del
+        dispositivo. Retorna False (y se sigue con screencap) si no es posible.
+        """
+        if self._stream is not None:
+            return True
+        if not VideoStream.available():
+            print("Captura por vídeo no disponible (falta PyAV: pip install av). Usando screencap.")
+            return False
+        frame = self.take_screenshot()
+        device = self.device
+        if frame is None or device is None:
+            return False
+
+        h, w = frame.shape[:2]
+        stream = VideoStream(device, stream_size(w, h, config.CAPTURE_STREAM_SCALE),
+                             config.CAPTURE_STREAM_BITRATE)
+        stream.start()
+        if not stream.wait_first_frame(config.CAPTURE_STREAM_START_TIMEOUT):
+            print(f"screenrecord no disponible ({stream.error or 'sin frames'}). Usando screencap.")
+            stream.stop()
+            return False
+        self._stream = stream
+        self._stream_device_size = (w, h)
+        print(f"Captura por vídeo activa ({stream.size[0]}x{stream.size[1]}).")
+        return True
+
+    def stop_video_stream(self):
+        stream, self._stream = self._stream, None
+        if stream is not None:
+            stream.stop()
+
+    def is_streaming(self):
+        return self._stream is not None
+
+    def _stream_frame(self):
+        """Último frame del vídeo o None (y vuelta a screencap) si el stream cayó."""
+        frame = self._stream.latest(newer_than=self.last_input_time,
+                                    wait=config.CAPTURE_STREAM_INPUT_WAIT)
+        if frame is None or (frame.shape[1] > frame.shape[0]) != (
+                self._stream_device_size[0] > self._stream_device_size[1]):
+            # Caído o la pantalla rotó respecto al tamaño pedido a screenrecord
+            print(f"Captura por vídeo detenida ({self._stream.error or 'sin frames/rotación'}). Usando screencap.")
+            self.stop_video_stream()
+            return None
+        return upscale(frame, self._stream_device_size)
+
+    # =========================================================================
+    # CAPTURE PUMP
+    # =========================================================================
+
+    def start_capture_pump(self, interval=None):
+        """
+        Arranca el hilo de captura continua. Los consumidores piden el frame más
+        reciente (latest_frame / wait_for_new_frame) en vez de esperar al dispositivo.
+        interval: pausa mínima entre capturas (s).
+        """
+        if self._pump_thread and self._pump_thread.is_alive():
+            return
+        interval = config.CAPTURE_PUMP_INTERVAL if interval is None else interval
+        self._pump_stop.clear()
+        self._pump_thread = threading.Thread(target=self._pump_loop, args=(interval,),
+                                             name="capture-pump", daemon=True)
+        self._pump_thread.start()
+
+    def stop_capture_pump(self):
+        """Detiene el hilo de captura (espera a que termine la captura en curso)."""
+        self._pump_stop.set()
+        if self._pump_thread:
+            self._pump_thread.join(timeout=5)
+            self._pump_thread = None
+        with self._pump_cond:
+            self._pump_frames.clear()
+            self._pump_cond.notify_all()
+
+    def is_pumping(self):
+        return self._pump_thread is not None and self._pump_thread.is_alive()
+
+    def _pump_loop(self, interval):
+        while not self._pump_stop.is_set():
+            started = time.time()
+            frame = self.take_screenshot()
+            finished = time.time()
+            if frame is None:
+                self._pump_stop.wait(1.0) # Dispositivo caído: no martillear ADB
+                continue
+
+            with self._pump_cond:
+                self._pump_seq += 1
+                if len(self._pump_frames) == self._pump_frames.maxlen:
+                    oldest = self._pump_frames[0][0]
+                    if oldest > self._pump_served_seq:
+                        self._pump_stats["dropped"] += 1 # Nadie llegó a usarlo
+                self._pump_frames.append((self._pump_seq, started, finished, frame))
+                self._pump_stats["frames"] += 1
+                self._pump_stats["capture_ms"].append((finished - started) * 1000)
+                self._pump_stats["timestamps"].append(finished)
+                self._pump_cond.notify_all()
+
+            if interval:
+                self._pump_stop.wait(max(0.0, interval - (time.time() - started)))
+
+    def _serve(self, entry):
+        """Marca el frame como entregado y registra su edad."""
+        seq, started, finished, frame = entry
+        self._pump_served_seq = max(self._pump_served_seq, seq)
+        self._pump_stats["ages_ms"].append((time.time() - started) * 1000)
+        return frame
+
+    def latest_frame(self, max_age=None):
+        """
+        Frame más reciente de la bomba sin esperar. None si no hay ninguno o si
+        es más viejo que max_age segundos (edad desde que empezó su captura).
+        """
+        with self._pump_cond:
+            if not self._pump_frames:
+                return None
+            entry = self._pump_frames[-1]
+            if max_age is not None and time.time() - entry[1] > max_age:
+                return None
+            return self._serve(entry)
+
+    def wait_for_new_frame(self, timeout=None, newer_than=None):
+        """
+        Espera un frame cuya captura empezó después de newer_than (time.time());
+        por defecto, uno posterior al último entregado. Retorna None si vence el
+        timeout o la bomba no está activa.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._pump_cond:
+            while True:
+                if self._pump_frames:
+                    entry = self._pump_frames[-1]
+                    if (entry[1] > newer_than) if newer_than is not None else (entry[0] > self._pump_served_seq):
+                        return self._serve(entry)
+                if not self.is_pumping():
+                    return None
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._pump_cond.wait(remaining)
+
+    def capture_stats(self):
+        """Métricas de la bomba para ajuste: fps, ms por captura, edad de los frames usados."""
+        with self._pump_cond:
+            stats = self._pump_stats
+            stamps = list(stats["timestamps"])
+            fps = (len(stamps) - 1) / (stamps[-1] - stamps[0]) if len(stamps) > 1 and stamps[-1] > stamps[0] else 0.0
+            mean = lambda values: sum(values) / len(values) if values else 0.0
+            return {
+                "frames": stats["frames"],
+                "dropped": stats["dropped"],
+                "fps": fps,
+                "capture_ms": mean(stats["capture_ms"]),
+                "age_ms": mean(stats["ages_ms"]),
+            }
+
+    @staticmethod
+    def _recv_into(sock, view, deadline=None):
+        """Llena el memoryview completo desde el socket (sin copias intermedias)."""
+        received = 0
+        while received < len(view):
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise adbutils.AdbTimeout(f"screencap: plazo agotado ({received}/{len(view)} bytes)")
+                sock.settimeout(remaining)
+            n = sock.recv_into(view[received:])
+            if n == 0:
+                raise EOFError(f"screencap cortado: {received}/{len(view)} bytes")
+            received += n
+
+    def _take_screenshot_raw(self, device, deadline):
+        """
+        screencap sin -p: cabecera (w, h, formato[, colorspace]) + píxeles RGBA.
+        Los píxeles se reciben directamente en un buffer numpy preasignado y la
+        única copia es la conversión a BGR (el Frame devuelto es un array nuevo,
+        así los consumidores pueden conservarlo).
+        """
+        if self._raw_header_size is None:
+            sdk = int(device.prop.get("ro.build.version.sdk") or 0)
+            self._raw_header_size = 16 if sdk >= 28 else 12
+
+        conn = device.open_transport(timeout=max(0.01, deadline - time.time()))
+        try:
+            conn.send_command("exec:screencap")
+            conn.check_okay()
+            sock = conn.conn
+
+            header = bytearray(self._raw_header_size)
+            self._recv_into(sock, memoryview(header), deadline)
+            width, height, pixel_format = struct.unpack_from("<III", header)
+            if pixel_format not in RAW_PIXEL_FORMATS:
+                raise ValueError(f"formato de píxel {pixel_format}")
+
+            if self._raw_buffer is None or self._raw_buffer.shape[:2] != (height, width):
+                self._raw_buffer = np.empty((height, width, 4), dtype=np.uint8)
+            self._recv_into(sock, memoryview(self._raw_buffer).cast("B"), deadline)
+        finally:
+            conn.close()
+
+        return Frame(cv2.cvtColor(self._raw_buffer, RAW_PIXEL_FORMATS[pixel_format]))
+
     def tap(self, x, y):
         """Alias for tap_robust."""
         self.tap_robust(x, y)
@@ -151,18 +682,10 @@ class ADBWrapper:
 
     def input_keyevent(self, keycode):
         """Envía un evento de tecla."""
-        try:
-            if self._ensure_connection():
-                self.device.keyevent(keycode)
-        except Exception as e:
-            print(f"Error enviando keyevent {keycode}: {e}")
+        self._run_command(["input", "keyevent", str(keycode)])
 
     def stop_app(self, package_name):
-        try:
-            if self._ensure_connection():
-                self.device.app_stop(package_name)
-        except Exception as e:
-            print(f"Error parando app {package_name}: {e}")
+        self._run_command(["am", "force-stop", package_name])
 
     def start_app(self, package_name):
         # adbutils tiene app_start, pero a veces requiere activity exacta.
@@ -171,31 +694,91 @@ class ADBWrapper:
         self._run_command(["monkey", "-p", package_name, "-c", "android.intent.category.LAUNCHER", "1"])
 
     def get_current_package(self):
-        """Detecta el paquete de la app en primer plano."""
+        """Detecta el paquete de la app en primer plano (cacheado unos segundos)."""
+        return self._cached("package", self._query_current_package) or "UNKNOWN"
+
+    def _query_current_package(self):
         if not self._ensure_connection():
-            return "UNKNOWN"
-            
-        try:
-            return self.device.app_current().package
-        except Exception:
-            # Fallback a lógica manual si adbutils falla en ciertos dispositivos
-            pass
+            return None
 
         # Intento 1: dumpsys window
-        out = self._run_command(["dumpsys", "window", "windows", "|", "grep", "mCurrentFocus"])
+        package = self._parse_package(
+            self._run_command(["dumpsys", "window", "windows", "|", "grep", "mCurrentFocus"]))
+        if package:
+            return package
+
+        # Intento 2: dumpsys activity
+        return self._parse_package( # None no se cachea
+            self._run_command(["dumpsys", "activity", "activities", "|", "grep", "ResumedActivity"]))
+
+    @staticmethod
+    def _parse_package(out):
+        """Paquete de una línea de dumpsys ("... com.app/.Activity ...")."""
         if out:
             match = re.search(r'\b([a-zA-Z0-9_\.]+)/', out)
             if match:
                 return match.group(1)
+        return None
 
-        # Intento 2: dumpsys activity
-        out = self._run_command(["dumpsys", "activity", "activities", "|", "grep", "ResumedActivity"])
-        if out:
-             match = re.search(r'\b([a-zA-Z0-9_\.]+)/', out)
-             if match:
-                 return match.group(1)
-                 
-        return "UNKNOWN"
+    # =========================================================================
+    # ASYNC
+    # =========================================================================
+
+    @property
+    def aio(self):
+        """Cliente asyncio (AsyncADBWrapper) para el mismo dispositivo."""
+        if self._aio is None:
+            from adb_async import AsyncADBWrapper
+            device = self.device
+            self._aio = AsyncADBWrapper(device.serial if device else self.device_id)
+        return self._aio
+
+    def run_async(self, *coros, timeout=None):
+        """
+        Ejecuta corrutinas del cliente asyncio a la vez y retorna sus resultados
+        (en orden). Bloquea solo al llamante, no al resto del bot.
+        """
+        from adb_async import run_sync
+
+        async def gather():
+            return await asyncio.gather(*coros)
+        return run_sync(gather(), timeout)
+
+    def screenshot_and_package(self):
+        """
+        (paquete en primer plano, captura) con la consulta del paquete y la
+        captura solapadas. Si el paquete está en caché solo se captura.
+        Si el cliente asyncio falla se hacen en serie por el camino síncrono;
+        si agota el plazo no se reintenta (el plazo de la pasada ya se gastó) y
+        se retorna (None, None): paquete sin comprobar y sin captura.
+        """
+        entry = self._query_cache.get("package")
+        if entry is not None and entry[0] > time.time():
+            return entry[1], self.take_screenshot()
+        if not self._ensure_connection():
+            return "UNKNOWN", None
+        started = time.time()
+        try:
+            # Mismo modo de captura que take_screenshot (raw solo si se eligió y funciona)
+            package, frame = self.run_async(self.aio.current_package(), self.aio.take_screenshot(self.capture_mode),
+                                            timeout=self._budget("screenshot"))
+            self._record("screenshot", started)
+        except ValueError as e:
+            # Formato raw no soportado: este dispositivo usará PNG (también en síncrono)
+            print(f"Captura raw no soportada ({e}). Usando screencap -p.")
+            self.capture_mode = "png"
+            return self.get_current_package(), self.take_screenshot()
+        except (TimeoutError, asyncio.TimeoutError, concurrent.futures.TimeoutError) as e:
+            self._record("screenshot", started, adbutils.AdbTimeout(str(e) or "plazo agotado"))
+            print(f"ADB asíncrono sin respuesta en {self._budget('screenshot'):.1f}s.")
+            return None, None
+        except Exception as e:
+            self._record("screenshot", started, e)
+            print(f"Error en ADB asíncrono ({e}). Usando llamadas síncronas.")
+            return self.get_current_package(), self.take_screenshot()
+        if package != "UNKNOWN":
+            self._store("package", package)
+        return package, frame
 
     # =========================================================================
     # BRIGHTNESS CONTROL
@@ -203,7 +786,11 @@ class ADBWrapper:
     
     def get_brightness(self):
         """Devuelve el nivel de brillo actual (0-255) o None si falla."""
-        out = self._run_command(["settings", "get", "system", "screen_brightness"])
+        return self._cached("brightness", lambda: self._parse_int(
+            self._run_command(["settings", "get", "system", "screen_brightness"])))
+
+    @staticmethod
+    def _parse_int(out):
         if out:
             try:
                 return int(out.strip())
@@ -217,12 +804,14 @@ class ADBWrapper:
         self._run_command(["settings", "put", "system", "screen_brightness_mode", "0"])
         # Poner brillo al mínimo
         self._run_command(["settings", "put", "system", "screen_brightness", "0"])
+        self.invalidate("brightness")
 
     def set_brightness(self, level):
         """Establece el brillo a un nivel específico (0-255)."""
         level = max(0, min(255, level))
         self._run_command(["settings", "put", "system", "screen_brightness_mode", "0"])
         self._run_command(["settings", "put", "system", "screen_brightness", str(level)])
+        self.invalidate("brightness")
 
     def restore_brightness(self, level=128):
         """Restaura el brillo a un nivel razonable (por defecto 50%)."""
@@ -234,24 +823,36 @@ class ADBWrapper:
     
     def is_wifi_enabled(self):
         """Devuelve True si WiFi está activado, False si no, None si error."""
-        out = self._run_command(["settings", "get", "global", "wifi_on"])
-        if out:
-            try:
-                # Valor 1 o 2 = WiFi activado (varía según dispositivo)
-                # Valor 0 = WiFi desactivado
-                val = int(out.strip())
-                return val >= 1
-            except ValueError:
-                pass
-        return None
+        return self._cached("wifi", lambda: self._parse_wifi(
+            self._run_command(["settings", "get", "global", "wifi_on"])))
+
+    @staticmethod
+    def _parse_wifi(out):
+        # Valor 1 o 2 = WiFi activado (varía según dispositivo)
+        # Valor 0 = WiFi desactivado
+        val = ADBWrapper._parse_int(out)
+        return None if val is None else val >= 1
 
     def enable_wifi(self):
         """Activa el WiFi."""
         self._run_command(["svc", "wifi", "enable"])
+        self.invalidate("wifi")
 
     def disable_wifi(self):
         """Desactiva el WiFi."""
         self._run_command(["svc", "wifi", "disable"])
+        self.invalidate("wifi")
+
+    # =========================================================================
+    # TIMEZONE
+    # =========================================================================
+
+    def get_device_date(self):
+        """
+        Salida de `date` en el dispositivo (p.ej. "Tue Dec 16 18:15:00 CET 2025").
+        Cacheada: solo se usa para la zona horaria; invalidate("timezone") al cambiarla.
+        """
+        return self._cached("timezone", lambda: self._run_command(["date"]) or None)
 
     def ensure_wifi_enabled(self):
         """Verifica que el WiFi esté activado. Si no, lo activa. Retorna True si tuvo que activarlo."""
@@ -261,3 +862,54 @@ class ADBWrapper:
             return True
         return False
 
+
+
+class InputBatch:
+    """
+    Secuencia de entradas que se envía como un único script al shell.
+    Cada `input` arranca una JVM en el teléfono: las teclas consecutivas se
+    agrupan en un solo `input keyevent 67 67 67 ...`.
+
+        adb.input_batch().keyevent(*[67] * 20).text("Espa").send()
+    """
+    def __init__(self, adb):
+        self.adb = adb
+        self.commands = []
+        self._keys = []
+
+    def _flush_keys(self):
+        if self._keys:
+            self.commands.append("input keyevent " + " ".join(self._keys))
+            self._keys = []
+
+    def _add(self, cmd):
+        self._flush_keys()
+        self.commands.append(cmd)
+        return self
+
+    def keyevent(self, *keycodes):
+        self._keys.extend(str(k) for k in keycodes)
+        return self
+
+    def tap(self, x, y):
+        # Swipe corto como tap_robust (seguridad de Xiaomi)
+        return self._add(f"input swipe {x} {y} {x} {y} 100")
+
+    def swipe(self, x1, y1, x2, y2, duration=300):
+        return self._add(f"input swipe {x1} {y1} {x2} {y2} {duration}")
+
+    def text(self, text):
+        # `input text` no admite espacios literales: se codifican como %s
+        return self._add("input text " + shlex.quote(text.replace(" ", "%s")))
+
+    def sleep(self, seconds):
+        return self._add(f"sleep {seconds}")
+
+    def send(self, timeout=None):
+        """Envía el lote como un solo script. Retorna la salida (None si falla)."""
+        self._flush_keys()
+        if not self.commands:
+            return ""
+        script = "; ".join(self.commands)
+        self.commands = []
+        return self.adb._run_command([script], timeout)
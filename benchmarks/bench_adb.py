@@ -0,0 +1,131 @@
+"""
+Benchmark de ADBWrapper de extremo a extremo contra el servidor ADB falso
+(fake_adb.py): sin teléfono, apto para CI.
+
+Mide por el protocolo ADB real (sockets locales) las operaciones del bot:
+capturas PNG/raw, comandos shell (shell persistente frente a una conexión por
+comando), entrada por lotes, estado del dispositivo y captura + foco solapados.
+La latencia del USB y los tiempos del teléfono no se reproducen: las cifras
+son el coste en el PC y del protocolo.
+
+Con --bot N además arranca RealRacingBot contra el servidor falso durante N
+segundos y resume los eventos de entrada que envió.
+
+Uso:
+    python benchmarks/bench_adb.py [--repeat 20] [--frames DIR | --scenes FILE] [--bot 60]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_adb import FakeADBServer, FakeDevice, FrameDirectory, SceneGraph, summarize
+
+
+def time_it(fn, repeat):
+    fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return np.percentile(times, 50), np.percentile(times, 95)
+
+
+def run_wrapper(repeat):
+    from adb_wrapper import ADBWrapper
+    adb = ADBWrapper()
+    if not adb.connect():
+        print("Error: el servidor falso no responde.")
+        return
+
+    def capture(mode):
+        adb.capture_mode = mode
+        return adb.take_screenshot()
+
+    def shell(persistent):
+        adb.persistent_shell = persistent
+        return adb._run_command(["echo", "hola"])
+
+    def search_input(batched):
+        if batched:
+            adb.input_batch().keyevent(*[67] * 20).text("Espa").send()
+        else:
+            for _ in range(20):
+                adb._run_command(["input", "keyevent", "67"])
+            adb._run_command(["input", "text", "Espa"])
+
+    def status():
+        adb.invalidate()
+        return adb.get_device_status()
+
+    def screenshot_and_package(overlap):
+        adb.invalidate("package")
+        if overlap:
+            return adb.screenshot_and_package()
+        return adb.get_current_package(), adb.take_screenshot()
+
+    cases = [
+        ("take_screenshot png", lambda: capture("png")),
+        ("take_screenshot raw", lambda: capture("raw")),
+        ("shell (conexión por comando)", lambda: shell(False)),
+        ("shell (persistente)", lambda: shell(True)),
+        ("TZ input: 21 comandos", lambda: search_input(False)),
+        ("TZ input: lote", lambda: search_input(True)),
+        ("get_device_status (sin caché)", status),
+        ("paquete + captura en serie", lambda: screenshot_and_package(False)),
+        ("paquete + captura asyncio", lambda: screenshot_and_package(True)),
+    ]
+    print(f"{'operación':<34}{'p50 ms':>9}{'p95 ms':>9}")
+    for name, fn in cases:
+        p50, p95 = time_it(fn, repeat)
+        print(f"{name:<34}{p50:>9.1f}{p95:>9.1f}")
+    adb.capture_mode = "png"
+    adb.persistent_shell = True
+    adb.close_shell()
+
+
+def run_bot(seconds):
+    from main import RealRacingBot
+    stop_event = threading.Event()
+    bot = RealRacingBot(stop_event=stop_event, log_callback=lambda msg: None)
+    thread = threading.Thread(target=bot.run, daemon=True)
+    started = time.time()
+    thread.start()
+    thread.join(seconds)
+    stop_event.set()
+    thread.join(30)
+    return time.time() - started
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--frames", help="Directorio de frames grabados para el servidor falso")
+    parser.add_argument("--scenes", help="Grafo de escenas (JSON) para el servidor falso")
+    parser.add_argument("--bot", type=float, default=0, help="Segundos de RealRacingBot contra el servidor falso")
+    args = parser.parse_args()
+
+    source = SceneGraph(args.scenes) if args.scenes else FrameDirectory(args.frames) if args.frames else None
+    server = FakeADBServer(FakeDevice(source), port=0).start()
+    # adbutils y AsyncADBWrapper leen el puerto del entorno al importarse/crearse
+    os.environ["ANDROID_ADB_SERVER_PORT"] = str(server.port)
+    print(f"Servidor ADB falso en 127.0.0.1:{server.port}\n")
+
+    run_wrapper(args.repeat)
+
+    if args.bot:
+        server.device.events.clear()
+        elapsed = run_bot(args.bot)
+        events = server.device.events
+        print(f"\nBot: {elapsed:.0f} s, {len(events)} eventos de entrada {summarize(events)}")
+        for t, kind, values in events[-10:]:
+            print(f"  {t:8.2f}s {kind} {values}")
+
+    server.stop()
@@ -0,0 +1,224 @@
+"""
+Benchmark de la captura de pantalla: screencap -p (PNG) frente a framebuffer raw.
+
+Sin dispositivo (por defecto) simula ambos caminos con una captura de assets/:
+los bytes viajan por un socketpair local igual que por el socket de ADB y se mide
+el coste en el PC (decodificación y conversiones a BGR). La codificación PNG que
+hace el teléfono se mide aparte, como referencia del coste en el dispositivo.
+El socketpair no reproduce el ancho de banda de USB: el modo raw mueve ~25x más
+bytes (10 MB por captura a 2400x1080), así que la cifra real depende del enlace.
+
+Con --device mide capturas reales de ADBWrapper.take_screenshot en cada modo.
+
+Con --fake compara de extremo a extremo screencap (PNG, raw) y la captura por
+vídeo (screenrecord H.264, CAPTURE_STREAM) contra el servidor ADB falso
+(fake_adb.py). La pantalla emulada cambia a --fps frames por segundo y cada
+frame lleva su número codificado en un bloque gris, así se mide la latencia
+(desde que el frame aparece en el "teléfono" hasta que el bot lo tiene) y los
+frames distintos por segundo que llegan. En una sola máquina el encoder del
+teléfono falso compite por CPU con el bot: las cifras son orientativas.
+
+Uso:
+    python benchmarks/bench_capture.py [--repeat 20] [--device]
+    python benchmarks/bench_capture.py --fake [--seconds 5] [--fps 30]
+"""
+import argparse
+import io
+import os
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# adb_wrapper se importa dentro de cada modo: con --fake, adbutils debe leer el
+# puerto del servidor falso (ANDROID_ADB_SERVER_PORT) al importarse
+
+from config import ASSETS_DIR
+
+SCREEN = "captura_recompensa.png"
+
+
+def percentiles(times):
+    return np.percentile(times, 50), np.percentile(times, 95)
+
+
+def send_over_socket(payload):
+    """Devuelve el extremo receptor de un socketpair al que un hilo envía payload."""
+    rx, tx = socket.socketpair()
+
+    def sender():
+        tx.sendall(payload)
+        tx.close()
+    threading.Thread(target=sender, daemon=True).start()
+    return rx
+
+
+def png_path(payload):
+    """Camino anterior: PNG -> PIL -> np.array -> flip de canales con copia."""
+    rx = send_over_socket(payload)
+    chunks = []
+    while True:
+        chunk = rx.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    rx.close()
+    pil_image = Image.open(io.BytesIO(b"".join(chunks))).convert("RGB")
+    return np.array(pil_image)[:, :, ::-1].copy()
+
+
+def raw_path(payload, buffer, recv_into, header_size=16):
+    """Camino raw: cabecera + recv_into sobre buffer preasignado + cvtColor."""
+    rx = send_over_socket(payload)
+    header = bytearray(header_size)
+    recv_into(rx, memoryview(header))
+    width, height, _ = struct.unpack_from("<III", header)
+    recv_into(rx, memoryview(buffer).cast("B"))
+    rx.close()
+    return cv2.cvtColor(buffer, cv2.COLOR_RGBA2BGR)
+
+
+def time_it(fn, repeat):
+    fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return percentiles(times)
+
+
+def run_offline(repeat):
+    from adb_wrapper import ADBWrapper
+    recv_into = ADBWrapper._recv_into
+    bgr = cv2.imread(os.path.join(ASSETS_DIR, SCREEN), cv2.IMREAD_COLOR)
+    h, w = bgr.shape[:2]
+    rgba = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGBA)
+    bgra = cv2.cvtColor(bgr, cv2.COLOR_BGR2BGRA)  # cv2 codifica desde BGRA
+
+    png_bytes = cv2.imencode(".png", bgra)[1].tobytes()
+    raw_bytes = struct.pack("<IIII", w, h, 1, 0) + rgba.tobytes()
+    buffer = np.empty((h, w, 4), dtype=np.uint8)
+
+    # Ambos caminos deben dar la misma imagen
+    assert np.array_equal(png_path(png_bytes), raw_path(raw_bytes, buffer, recv_into))
+
+    print(f"Captura {SCREEN}: {w}x{h}, PNG {len(png_bytes) / 1e6:.1f} MB, raw {len(raw_bytes) / 1e6:.1f} MB")
+    enc = time_it(lambda: cv2.imencode(".png", bgra), repeat)
+    png = time_it(lambda: png_path(png_bytes), repeat)
+    raw = time_it(lambda: raw_path(raw_bytes, buffer, recv_into), repeat)
+    print(f"{'camino':<34}{'p50 ms':>9}{'p95 ms':>9}")
+    print(f"{'PNG encode (en el dispositivo)':<34}{enc[0]:>9.1f}{enc[1]:>9.1f}")
+    print(f"{'PNG recv + decode + BGR (PC)':<34}{png[0]:>9.1f}{png[1]:>9.1f}")
+    print(f"{'raw recv_into + BGR (PC)':<34}{raw[0]:>9.1f}{raw[1]:>9.1f}")
+    print(f"\nPC: x{png[0] / raw[0]:.1f} más rápido; total con encode: x{(png[0] + enc[0]) / raw[0]:.1f}")
+
+
+FAKE_FRAMES = 12
+MARK = (slice(0, 128), slice(0, 128))  # Bloque con el número de frame
+
+
+def fake_frames(directory, size=(2400, 1080)):
+    """Frames de 2400x1080 con contenido real y el número de frame en MARK."""
+    base = cv2.resize(cv2.imread(os.path.join(ASSETS_DIR, SCREEN), cv2.IMREAD_COLOR), size)
+    for k in range(FAKE_FRAMES):
+        img = base.copy()
+        img[MARK] = 10 + 20 * k
+        cv2.imwrite(os.path.join(directory, f"{k:03d}.png"), img)
+
+
+def frame_number(frame, width):
+    """Número de frame codificado (el bloque escala con el frame)."""
+    scale = frame.shape[1] / width
+    block = frame[:int(96 * scale), :int(96 * scale)]
+    return int(round((float(block.mean()) - 10) / 20)) % FAKE_FRAMES
+
+
+def measure_fake(adb, source, seconds):
+    """(frames distintos por segundo, latencias ms) llamando a take_screenshot en bucle."""
+    latencies = []
+    last = None
+    start = time.time()
+    while time.time() - start < seconds:
+        frame = adb.take_screenshot()
+        now = time.time()
+        if frame is None:
+            continue
+        k = frame_number(frame, 2400)
+        if k == last:
+            continue
+        last = k
+        # Último instante (<= ahora) en que la pantalla falsa pasó al frame k
+        n = int((now - source.started) * source.fps)
+        n -= (n - k) % FAKE_FRAMES
+        latencies.append((now - (source.started + n / source.fps)) * 1000)
+    return len(latencies) / seconds, latencies
+
+
+def run_fake(seconds, fps):
+    from fake_adb import FakeADBServer, FakeDevice, FrameDirectory
+    with tempfile.TemporaryDirectory() as directory:
+        fake_frames(directory)
+        source = FrameDirectory(directory, fps)
+        server = FakeADBServer(FakeDevice(source), port=0).start()
+    os.environ["ANDROID_ADB_SERVER_PORT"] = str(server.port)
+    from adb_wrapper import ADBWrapper
+
+    adb = ADBWrapper()
+    print(f"Pantalla falsa 2400x1080 a {fps:.0f} fps, {seconds:.0f} s por modo")
+    print(f"{'modo':<24}{'frames/s':>9}{'lat. p50':>10}{'lat. p95':>10}")
+    for mode in ("png", "raw", "stream"):
+        if mode == "stream":
+            adb.capture_mode = "raw"
+            if not adb.start_video_stream():
+                continue
+            label = f"stream {adb._stream.size[0]}x{adb._stream.size[1]}"
+        else:
+            adb.capture_mode = mode
+            label = f"screencap {mode}"
+        rate, latencies = measure_fake(adb, source, seconds)
+        p50, p95 = percentiles(latencies) if latencies else (float("nan"),) * 2
+        print(f"{label:<24}{rate:>9.1f}{p50:>10.0f}{p95:>10.0f}")
+    adb.stop_video_stream()
+    server.stop()
+
+
+def run_device(repeat):
+    from adb_wrapper import ADBWrapper
+    adb = ADBWrapper()
+    if not adb.connect():
+        print("Error: No device connected.")
+        return
+
+    print(f"{'modo':<8}{'p50 ms':>9}{'p95 ms':>9}")
+    for mode in ("png", "raw"):
+        adb.capture_mode = mode
+        p50, p95 = time_it(adb.take_screenshot, repeat)
+        print(f"{mode:<8}{p50:>9.1f}{p95:>9.1f}")
+        if adb.capture_mode != mode:
+            print("  (el modo raw no está soportado: se usó PNG)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--device", action="store_true", help="Medir capturas reales por ADB")
+    parser.add_argument("--fake", action="store_true", help="screencap frente a vídeo contra fake_adb.py")
+    parser.add_argument("--seconds", type=float, default=5, help="Duración de cada modo con --fake")
+    parser.add_argument("--fps", type=float, default=30, help="Cambios por segundo de la pantalla falsa")
+    args = parser.parse_args()
+    if args.fake:
+        run_fake(args.seconds, args.fps)
+    elif args.device:
+        run_device(args.repeat)
+    else:
+        run_offline(args.repeat)
@@ -0,0 +1,119 @@
+"""
+Benchmark de los backends de OCR (ocr_engine.py): pytesseract (un proceso
+`tesseract` por pasada) frente a tesserocr (Tesseract cargado en el proceso).
+
+Sobre las capturas completas de assets/ mide una pasada de image_to_data y de
+image_to_string y los métodos de OCR que encadenan varias pasadas
+(get_screen_texts: 4, find_text_adaptive: hasta 10), estos últimos también
+con OCR de la pantalla entera (OCR_TEXT_REGIONS = False) frente a las líneas
+detectadas. Con --workers N las pasadas se leen en N procesos (OCR_WORKERS).
+Comprueba además que ambos backends leen las mismas palabras. Los backends no
+instalados se omiten.
+
+Uso:
+    python benchmarks/bench_ocr.py [--repeat 5] [--engines tesserocr pytesseract] [--workers 4]
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from config import ASSETS_DIR
+from frame import Frame
+from ocr import OCR, detect_text_lines
+from ocr_cache import OCRCache
+from ocr_engine import ENGINES, available_engines
+
+SCREENS = ["captura_recompensa.png", "intermediate_screen.png", "reward_screen.png"]
+
+
+def time_it(fn, repeat):
+    fn()  # Warm-up
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return np.percentile(times, 50), np.percentile(times, 95)
+
+
+def full_screen(fn):
+    """fn con OCR de la pantalla entera (sin localización de líneas)."""
+    def run(ocr, screen):
+        config.OCR_TEXT_REGIONS = False
+        try:
+            return fn(ocr, screen)
+        finally:
+            config.OCR_TEXT_REGIONS = True
+    return run
+
+
+def words(data):
+    return [text.strip() for text in data["text"] if text.strip()]
+
+
+def run(engine_names, repeat, workers=0):
+    screens = [(name, cv2.imread(os.path.join(ASSETS_DIR, name), cv2.IMREAD_COLOR)) for name in SCREENS]
+    screens = [(name, img) for name, img in screens if img is not None]
+
+    engines = {}
+    for name in engine_names:
+        start = time.perf_counter()
+        engines[name] = ENGINES[name]()
+        print(f"{name}: inicio {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    cases = [
+        ("image_to_data (gris)", lambda ocr, s: ocr.engine.image_to_data(Frame(s).gray)),
+        ("image_to_string psm 6", lambda ocr, s: ocr.engine.image_to_string(s, psm=6)),
+        ("get_screen_texts", lambda ocr, s: ocr.get_screen_texts(Frame(s))),
+        ("find_text_adaptive (no está)", lambda ocr, s: ocr.find_text_adaptive(Frame(s), "Kiritimati")),
+        ("get_screen_texts (pantalla entera)", full_screen(lambda ocr, s: ocr.get_screen_texts(Frame(s)))),
+        ("find_text_adaptive (pantalla entera)",
+         full_screen(lambda ocr, s: ocr.find_text_adaptive(Frame(s), "Kiritimati"))),
+    ]
+    for screen_name, screen in screens:
+        gray = Frame(screen).gray
+        p50, _ = time_it(lambda: detect_text_lines(gray), repeat)
+        print(f"detect_text_lines @ {screen_name}: {len(detect_text_lines(gray))} líneas, {p50:.1f} ms")
+    print(f"\n{'caso':<60}" + "".join(f"{name + ' p50':>18}{'p95':>8}" for name in engines))
+    for screen_name, screen in screens:
+        for case_name, fn in cases:
+            line = f"{case_name + ' @ ' + screen_name:<60}"
+            for engine in engines.values():
+                ocr = OCR(engine, log=lambda msg: None, cache=OCRCache(size=0), workers=workers) # Sin caché
+                p50, p95 = time_it(lambda: fn(ocr, screen), repeat)
+                ocr.shutdown()
+                line += f"{p50:>18.0f}{p95:>8.0f}"
+            print(line)
+
+    if len(engines) > 1:
+        print("\nPalabras leídas (image_to_data en gris):")
+        for screen_name, screen in screens:
+            read = {name: words(engine.image_to_data(Frame(screen).gray)) for name, engine in engines.items()}
+            same = len({tuple(w) for w in read.values()}) == 1
+            print(f"  {screen_name:<28}{'iguales' if same else 'DISTINTAS'} "
+                  + ", ".join(f"{name}: {len(w)}" for name, w in read.items()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--engines", nargs="+", default=list(ENGINES), choices=list(ENGINES))
+    parser.add_argument("--workers", type=int, default=0, help="Procesos para las pasadas (0 = en serie)")
+    args = parser.parse_args()
+
+    usable = [name for name in args.engines if name in available_engines()]
+    for name in args.engines:
+        if name not in usable:
+            print(f"ℹ {name} no disponible: se omite.")
+    if not usable:
+        print("Error: ningún backend de OCR disponible (instalar tesseract y/o tesserocr).")
+        sys.exit(1)
+    run(usable, args.repeat, args.workers)
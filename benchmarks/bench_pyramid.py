@@ -0,0 +1,93 @@
+"""
+Benchmark del matching coarse-to-fine (pirámide) frente al matching a resolución completa.
+
+Usa como pantallas las capturas completas de assets/ y como plantillas todos los
+assets que caben en ellas. Para cada par mide el tiempo medio de find_template y
+comprueba que el resultado (posición y confianza) coincide con el modo clásico.
+
+Uso:
+    python benchmarks/bench_pyramid.py [--factors 4 8] [--repeat 5]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import cv2
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import ASSETS_DIR
+from vision import Vision
+
+SCREENS = ["captura_recompensa.png", "intermediate_screen.png", "reward_screen.png"]
+
+
+def time_call(fn, repeat):
+    fn()  # Warm-up (caches de plantilla reducida)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def best_match(vision, screen, entry, factor):
+    """(conf, loc) sin umbral, para comparar confianza entre modos."""
+    vision._coarse_cache = (None, {})
+    return vision._match(screen, entry, "bgr", factor)
+
+
+def run(factors, repeat):
+    vision = Vision(pyramid=None)
+    template_paths = sorted(glob.glob(os.path.join(ASSETS_DIR, "*.png")))
+
+    print(f"{'pantalla':<26}{'plantilla':<28}{'full ms':>9}", end="")
+    for f in factors:
+        print(f"{'1/' + str(f) + ' ms':>10}{'x':>6}{'ok':>4}", end="")
+    print()
+
+    totals = {f: [0.0, 0.0] for f in factors}
+    for screen_name in SCREENS:
+        screen = cv2.imread(os.path.join(ASSETS_DIR, screen_name), cv2.IMREAD_COLOR)
+        if screen is None:
+            continue
+        s_h, s_w = screen.shape[:2]
+
+        for path in template_paths:
+            entry = vision.registry.get(path)
+            if entry is None or entry.h > s_h or entry.w > s_w or os.path.basename(path) == screen_name:
+                continue
+
+            full_ms, _ = time_call(lambda: vision._match(screen, entry, "bgr", None), repeat)
+            full_val, full_loc = best_match(vision, screen, entry, None)
+            print(f"{screen_name:<26}{entry.name:<28}{full_ms:>9.1f}", end="")
+
+            for f in factors:
+                def call():
+                    # Cada llamada reduce la captura, como la primera búsqueda de un ciclo
+                    vision._coarse_cache = (None, {})
+                    return vision._match(screen, entry, "bgr", f)
+                pyr_ms, _ = time_call(call, repeat)
+                pyr_val, pyr_loc = best_match(vision, screen, entry, f)
+                same = abs(pyr_loc[0] - full_loc[0]) <= 2 and abs(pyr_loc[1] - full_loc[1]) <= 2
+                # Solo importa coincidir cuando el modo clásico encuentra algo
+                ok = "✓" if same or full_val < 0.8 else "✗"
+                totals[f][0] += full_ms
+                totals[f][1] += pyr_ms
+                print(f"{pyr_ms:>10.1f}{full_ms / pyr_ms:>6.1f}{ok:>4}", end="")
+            print()
+
+    print()
+    for f, (full_sum, pyr_sum) in totals.items():
+        if pyr_sum > 0:
+            print(f"Total 1/{f}: {full_sum:.0f} ms -> {pyr_sum:.0f} ms (x{full_sum / pyr_sum:.1f})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--factors", type=int, nargs="+", default=[4, 8])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.factors, args.repeat)
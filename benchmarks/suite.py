@@ -0,0 +1,242 @@
+"""
+Micro-benchmarks de Vision y OCR sobre los assets del repositorio.
+
+Cada método público de Vision y OCR se mide sobre:
+  - las capturas completas de assets/ (captura_recompensa.png, reward_screen.png...)
+  - composiciones sintéticas a varias resoluciones: una captura reescalada con
+    plantillas reales (moneda, cierre de recompensa, >>) y una X dibujada encima.
+
+Para cada caso se reportan latencias p50/p95 (ms) y memoria (pico y bloques
+asignados en una llamada, vía tracemalloc). Con --save los resultados se guardan
+como baseline JSON; en ejecuciones posteriores se comparan contra ese baseline
+y se marcan las regresiones de p50 por encima de --tolerance.
+
+Los casos de OCR se omiten si Tesseract no está instalado.
+
+Uso:
+    python benchmarks/suite.py [--repeat 5] [--filter vision.scan] [--save]
+                               [--baseline benchmarks/baseline.json] [--tolerance 0.2]
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import (ASSETS_DIR, COIN_ICON_TEMPLATE, REWARD_CLOSE_TEMPLATES,
+                    WORK_SCALE, PYRAMID_FACTOR, VISION_WORKERS, OCR_WORKERS)
+from frame import Frame
+from vision import Vision
+from ocr import OCR
+from ocr_cache import OCRCache
+
+SCREENS = ["captura_recompensa.png", "intermediate_screen.png", "reward_screen.png"]
+SYNTHETIC_RESOLUTIONS = [(1600, 720), (2400, 1080), (3200, 1440)]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def load_asset(name):
+    return cv2.imread(os.path.join(ASSETS_DIR, name), cv2.IMREAD_COLOR)
+
+
+def paste(canvas, img, x, y):
+    h, w = img.shape[:2]
+    h = min(h, canvas.shape[0] - y)
+    w = min(w, canvas.shape[1] - x)
+    canvas[y:y + h, x:x + w] = img[:h, :w]
+
+
+def synthetic_screen(base, size):
+    """Captura base reescalada a size=(w, h) con plantillas reales y una X dibujada."""
+    w, h = size
+    canvas = cv2.resize(base, (w, h), interpolation=cv2.INTER_AREA)
+    for name, (fx, fy) in [(COIN_ICON_TEMPLATE, (0.45, 0.10)),
+                           (REWARD_CLOSE_TEMPLATES[0], (0.70, 0.25)),
+                           ("ff_button.png", (0.90, 0.85))]:
+        img = load_asset(name)
+        if img is not None:
+            paste(canvas, img, int(w * fx), int(h * fy))
+    # X de cierre en la esquina superior izquierda (zona de find_close_button_dynamic)
+    x0, y0, side = int(w * 0.04), int(h * 0.04), 40
+    cv2.line(canvas, (x0, y0), (x0 + side, y0 + side), (255, 255, 255), 4)
+    cv2.line(canvas, (x0 + side, y0), (x0, y0 + side), (255, 255, 255), 4)
+    return canvas
+
+
+def fixtures():
+    """[(nombre, imagen BGR)] con las capturas reales y las sintéticas."""
+    screens = []
+    for name in SCREENS:
+        img = load_asset(name)
+        if img is not None:
+            screens.append((name, img))
+    if screens:
+        base = screens[0][1]
+        for size in SYNTHETIC_RESOLUTIONS:
+            screens.append((f"synthetic_{size[0]}x{size[1]}", synthetic_screen(base, size)))
+    return screens
+
+
+def tesseract_available():
+    from ocr_engine import available_engines
+    return bool(available_engines())
+
+
+def build_cases(vision, ocr, with_ocr):
+    """
+    Casos: (nombre, función(captura)). La captura se entrega como Frame nuevo en
+    cada llamada para medir el coste real de un frame (sin vistas cacheadas).
+    """
+    coin = os.path.join(ASSETS_DIR, COIN_ICON_TEMPLATE)
+    cases = [
+        ("vision.find_template", lambda s: vision.find_template(s, coin)),
+        ("vision.find_template_adaptive", lambda s: vision.find_template_adaptive(s, coin, hint_coords=(1080, 100, 60, 60))),
+        ("vision.scan[lobby]", lambda s: vision.scan(s, "lobby")),
+        ("vision.scan[lobby_anchors]", lambda s: vision.scan(s, "lobby_anchors")),
+        ("vision.find_fast_forward_button", lambda s: vision.find_fast_forward_button(s)),
+        ("vision.find_close_button_dynamic", lambda s: vision.find_close_button_dynamic(s)),
+    ]
+    # Métodos que no dependen de la captura (se miden una vez por ejecución)
+    static_cases = [
+        ("vision.generate_x_templates", vision.generate_x_templates),
+        ("vision.generate_ff_templates", vision.generate_ff_templates),
+        ("vision.reload_templates", vision.reload_templates),
+    ]
+    if with_ocr:
+        cases += [
+            ("ocr.preprocess_image", lambda s: ocr.preprocess_image(s)),
+            ("ocr.read_text", lambda s: ocr.read_text(s)),
+            ("ocr.extract_gold_amount", lambda s: ocr.extract_gold_amount(s)),
+            ("ocr.find_text", lambda s: ocr.find_text(s, "Oro")),
+            ("ocr.find_phrase", lambda s: ocr.find_phrase(s, "Seguir viendo")),
+            ("ocr.get_screen_texts", lambda s: ocr.get_screen_texts(s)),
+            ("ocr.get_lines", lambda s: ocr.get_lines(s)),
+            ("ocr.find_text_adaptive", lambda s: ocr.find_text_adaptive(s, "Oro", hint_coords=(900, 400, 300, 120))),
+        ]
+    else:
+        cases.append(("ocr.preprocess_image", lambda s: ocr.preprocess_image(s)))
+    return cases, static_cases
+
+
+def measure(fn, repeat):
+    """Latencias (ms) de repeat llamadas + memoria de una llamada aislada."""
+    fn()  # Warm-up (cachés de plantillas, espectros FFT...)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+
+    return {
+        "p50_ms": float(np.percentile(times, 50)),
+        "p95_ms": float(np.percentile(times, 95)),
+        "peak_kb": peak / 1024,
+        "alloc_blocks": int(blocks),
+    }
+
+
+def run(repeat, name_filter=None):
+    vision = Vision()
+    ocr = OCR(log=lambda msg: None, cache=OCRCache(size=0)) # Sin caché: se mide el OCR
+    with_ocr = tesseract_available()
+    if not with_ocr:
+        print("ℹ Tesseract no disponible: se omiten los casos de OCR salvo preprocess_image.")
+
+    cases, static_cases = build_cases(vision, ocr, with_ocr)
+    results = {}
+
+    for name, fn in static_cases:
+        if name_filter and name_filter not in name:
+            continue
+        results[name] = measure(fn, max(1, repeat // 5))
+
+    for screen_name, screen in fixtures():
+        for name, fn in cases:
+            key = f"{name}@{screen_name}"
+            if name_filter and name_filter not in key:
+                continue
+            results[key] = measure(lambda: fn(Frame(screen)), repeat)
+
+    vision.shutdown()
+    return results
+
+
+def report(results, baseline=None, tolerance=0.2):
+    """Imprime la tabla; con baseline añade la variación de p50. Retorna nº de regresiones."""
+    regressions = 0
+    header = f"{'caso':<60}{'p50 ms':>9}{'p95 ms':>9}{'pico KB':>10}{'bloques':>9}"
+    if baseline:
+        header += f"{'base p50':>10}{'Δ':>8}"
+    print(header)
+
+    for key in sorted(results):
+        r = results[key]
+        line = f"{key:<60}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['peak_kb']:>10.0f}{r['alloc_blocks']:>9}"
+        base = baseline.get(key) if baseline else None
+        if base:
+            delta = (r["p50_ms"] - base["p50_ms"]) / max(base["p50_ms"], 1e-6)
+            flag = ""
+            if delta > tolerance:
+                flag = " ⚠"
+                regressions += 1
+            line += f"{base['p50_ms']:>10.2f}{delta * 100:>7.0f}%{flag}"
+        print(line)
+
+    if baseline:
+        print(f"\nRegresiones (p50 > +{tolerance * 100:.0f}%): {regressions}")
+    return regressions
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f).get("results")
+
+
+def save_baseline(path, results):
+    data = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "opencv": cv2.__version__, "numpy": np.__version__,
+                    "cpus": os.cpu_count()},
+        "config": {"WORK_SCALE": WORK_SCALE, "PYRAMID_FACTOR": PYRAMID_FACTOR, "VISION_WORKERS": VISION_WORKERS,
+                   "OCR_WORKERS": OCR_WORKERS},
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    print(f"Baseline guardado en {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--filter", default=None, help="Solo casos cuyo nombre contenga este texto")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save", action="store_true", help="Guardar los resultados como nuevo baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Regresión de p50 tolerada (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    results = run(args.repeat, args.filter)
+    regressions = report(results, None if args.save else load_baseline(args.baseline), args.tolerance)
+    if args.save:
+        save_baseline(args.baseline, results)
+    sys.exit(1 if regressions else 0)
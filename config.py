@@ -24,6 +24,106 @@ REWARD_CLOSE_TEMPLATES = ["reward_close.png", "reward_close_cursor.png"]
 LOBBY_TEMPLATE_1 = "lobby_asset_1.png"
 LOBBY_TEMPLATE_2 = "lobby_asset_2.png"
 
+# Conjuntos de plantillas evaluados en una sola pasada con Vision.scan()
+TEMPLATE_SETS = {
+    # Estado GAME_LOBBY (prioridad: recompensa > intermedia > moneda > sin oro)
+    "lobby": REWARD_CLOSE_TEMPLATES + [INTERMEDIATE_TEMPLATE, COIN_ICON_TEMPLATE, NO_MORE_GOLD_TEMPLATE],
+    # Anchors que indican que NO estamos viendo un anuncio
+    "lobby_anchors": [LOBBY_TEMPLATE_1, LOBBY_TEMPLATE_2, INTERMEDIATE_TEMPLATE, COIN_ICON_TEMPLATE],
+}
+
+# Clasificador de pantallas por huella perceptual (screen_hash.py)
+# Capturas etiquetadas: <SCREEN_INDEX_DIR>/<etiqueta>/*.png (p.ej. screens/lobby/1.png).
+# Se incluyen reward e intermediate (copias reducidas de las capturas de assets/).
+# No hay captura completa del lobby en el repo: el lobby no se acelera hasta que
+# sus plantillas lo confirman por primera vez en la sesión (se aprende en caliente).
+# Añadir aquí capturas del lobby para tenerlo acelerado desde el arranque. No hay etiqueta
+# "settings": los ajustes de zona horaria se reconocen por el paquete en primer
+# plano y por OCR, nunca pasan por el matching de plantillas que este índice evita.
+SCREEN_INDEX_DIR = ASSETS_DIR + "/screens"
+SCREEN_HASH_SIZE = (32, 18)       # Bits de la huella (ancho x alto)
+SCREEN_HASH_MAX_DISTANCE = 48     # Máx. bits distintos para aceptar una etiqueta (de 576)
+# Distancia "segura": por debajo la pantalla es la del índice y no hay un popup
+# encima (un popup de recompensa sobre el fondo cambia ~37 bits; ruido de
+# compresión/escala ~10-15), así que no se buscan las plantillas de mayor prioridad.
+SCREEN_HASH_SURE_DISTANCE = 16
+# Plantillas que confirman cada pantalla: tras clasificar solo se buscan estas
+SCREEN_CONFIRM_TEMPLATES = {
+    "reward": REWARD_CLOSE_TEMPLATES,
+    "intermediate": [INTERMEDIATE_TEMPLATE],
+    "lobby": [LOBBY_TEMPLATE_1, LOBBY_TEMPLATE_2, COIN_ICON_TEMPLATE, NO_MORE_GOLD_TEMPLATE],
+}
+
+# Captura de pantalla: "raw" (framebuffer sin comprimir, sin PNG) o "png" (screencap -p).
+# "raw" ahorra la codificación PNG en el teléfono y la decodificación en el PC pero
+# transfiere ~25x más bytes: medir con benchmarks/bench_capture.py --device.
+# Si el dispositivo no soporta el modo raw se pasa a "png" automáticamente.
+CAPTURE_MODE = "png"
+
+# Shell persistente: un único `adb shell` abierto para todos los comandos
+# (taps, teclas, dumpsys...) en vez de una conexión nueva por comando.
+# Si el canal falla se usa adb shell normal para ese comando.
+ADB_PERSISTENT_SHELL = True
+
+# Plazos (s) por operación ADB: al vencer se corta el socket y la operación
+# falla en vez de bloquear la máquina de estados o la GUI.
+ADB_TIMEOUTS = {
+    "default": 10.0,    # Conexión y consultas del cliente adbutils
+    "shell": 10.0,      # Comandos shell (dumpsys, settings, date...)
+    "input": 3.0,       # input, am, monkey
+    "screenshot": 5.0,  # Captura completa (todos los reintentos)
+    "query": 5.0,       # get-state
+}
+# Circuit breaker: tras N fallos seguidos no se llama a ADB durante una pausa
+# exponencial (BASE, 2*BASE, 4*BASE... hasta MAX) y después se reconecta.
+ADB_BREAKER_THRESHOLD = 3
+ADB_BACKOFF_BASE = 1.0
+ADB_BACKOFF_MAX = 30.0
+
+# Cliente ADB asyncio (adb_async.py): solapa la consulta de foco y la captura
+# en el bucle de anuncios. False = llamadas síncronas en serie.
+ADB_ASYNC = True
+
+# Caché de consultas al dispositivo (ADBWrapper): segundos que vale cada valor.
+# Se invalidan explícitamente tras las acciones que los cambian (abrir/cerrar
+# app, taps, brillo, WiFi, cambio de zona horaria).
+ADB_QUERY_TTL = {
+    "package": 2.0,
+    "battery": 60.0,
+    "wifi": 10.0,
+    "brightness": 30.0,
+    "timezone": 300.0,
+}
+
+# Captura por vídeo: screenrecord H.264 a tamaño reducido decodificado en el PC
+# (requiere PyAV: pip install av, ver requirements-optional.txt). Evita
+# transferir un frame completo por decisión; la imagen es de menor calidad
+# (escala + compresión), medir con benchmarks/bench_capture.py --fake.
+# Si falla se vuelve a screencap.
+CAPTURE_STREAM = False
+CAPTURE_STREAM_SCALE = 0.5          # Tamaño del vídeo respecto a la pantalla
+CAPTURE_STREAM_BITRATE = 4000000    # bits/s
+CAPTURE_STREAM_START_TIMEOUT = 3.0  # Espera máxima (s) por el primer frame
+CAPTURE_STREAM_INPUT_WAIT = 0.3     # Espera (s) por un frame posterior a la última acción
+
+# Bomba de captura: hilo que captura continuamente y el bot usa el frame más
+# reciente en vez de esperar a ADB en cada ciclo (captura y visión en paralelo).
+CAPTURE_PUMP = False
+CAPTURE_PUMP_INTERVAL = 0.0   # Pausa mínima entre capturas (s)
+CAPTURE_MAX_AGE = 0.5         # Edad máxima (s) de un frame para reutilizarlo sin esperar
+CAPTURE_WAIT_TIMEOUT = 5.0    # Espera máxima (s) por un frame nuevo
+
+# Filtro de cambios entre capturas (screen_hash.FrameChangeGate)
+FRAME_GATE_SCALE = 8          # Reducción de la miniatura (1/8 -> 300x135 en 2400x1080)
+FRAME_GATE_PIXEL_DELTA = 12   # Diferencia de gris para contar un píxel como cambiado
+FRAME_GATE_MIN_PIXELS = 4     # Píxeles cambiados para considerar que la pantalla cambió
+
+# Esperas por evento (RealRacingBot.wait_until / wait_for_change / wait_for_template):
+# las pausas fijas tras una acción pasan a ser el tiempo máximo de espera y se
+# sigue en cuanto la pantalla cumple la condición.
+WAIT_POLL = 0.1               # Pausa entre comprobaciones (s), además de la captura
+WAIT_SETTLE = 0.3             # Tiempo sin cambios (s) para dar la pantalla por estable
+
 # Calibración de Pantalla (Desktop Mapping)
 # REMOVED: Ya no usamos desktop_tap, usamos ADB directo.
 # DESKTOP_CALIBRATION = {"x1": 0, "y1": 0, "x2": 0, "y2": 0, "enabled": False}
@@ -39,3 +139,44 @@ END_HOUR = 24   # 12 am (00:00 del día siguiente)
 
 # Umbral de confianza para la detección de imágenes (0 a 1)
 MATCH_THRESHOLD = 0.8
+
+# Resolución de trabajo (resolution.py): las capturas se reducen una vez tras
+# capturarlas. 1.0 = resolución de los assets, 0.5 = mitad (~4x menos píxeles).
+WORK_SCALE = 1.0
+# Alto (lado corto) de las capturas sobre las que se recortaron los assets
+REFERENCE_HEIGHT = 1080
+
+# Matching coarse-to-fine: factor de reducción del primer nivel (4 u 8).
+# None = matching a resolución completa (comportamiento clásico).
+PYRAMID_FACTOR = None
+
+# Hilos para repartir los matches independientes de Vision (0 o 1 = en serie)
+VISION_WORKERS = 0
+
+# Backend de OCR (ocr_engine.py): "tesserocr" mantiene Tesseract cargado en el
+# proceso; "pytesseract" lanza el ejecutable en cada pasada. "auto" = tesserocr
+# si está instalado, si no pytesseract. tesserocr es opcional (pip install
+# tesserocr, requiere libtesseract-dev y libleptonica-dev; ver README).
+OCR_ENGINE = "auto"
+OCR_LANG = "eng"
+
+# Localización de texto (ocr.py, detect_text_lines): antes del OCR se buscan las
+# líneas de texto (gradiente morfológico + componentes conexas) y Tesseract lee
+# solo esos recortes, por lotes y en modo línea. False = OCR de la pantalla entera.
+OCR_TEXT_REGIONS = True
+OCR_LINE_PAD = 6          # Margen (px) alrededor de cada línea detectada
+OCR_LINE_MIN_HEIGHT = 8   # Alto mínimo de una línea (px); el máximo es 1/6 de la captura
+OCR_LINE_MIN_FILL = 0.4   # Fracción mínima de la caja cubierta por trazos (descarta iconos/bordes)
+
+# Caché de OCR por contenido (ocr_cache.py): misma pasada/recortes y misma
+# configuración = mismo resultado, sin volver a llamar a Tesseract.
+OCR_CACHE_SIZE = 256      # Resultados recientes en memoria (LRU). 0 = sin caché en memoria
+OCR_CACHE_DB = True       # Guardar también en disco (tabla ocr_cache de gold_log.db)
+OCR_CACHE_DB_MAX = 5000   # Máximo de resultados en disco (se descartan los menos usados)
+OCR_CACHE_DB_TRIM_EVERY = 100 # Inserciones entre recortes al máximo (puede excederlo en tanto)
+
+# Procesos para leer a la vez las pasadas de OCR (o partes de sus recortes).
+# 0 o 1 = en serie; None = núcleos del host. Opcional como VISION_WORKERS: una
+# pasada ya lanzada no se detiene al acertar otra, así que solo compensa con
+# núcleos libres (en el PC de la tablet/emulador compiten con ADB y Vision).
+OCR_WORKERS = 0
@@ -0,0 +1,499 @@
+"""
+Servidor ADB falso para probar y perfilar el bot sin teléfono.
+
+Habla lo suficiente del protocolo del servidor ADB (host:version, host:devices,
+host:transport..., shell:, exec:) para adbutils, ADBWrapper y AsyncADBWrapper, y
+emula en el "dispositivo" los comandos que usa el bot: screencap (raw y -p),
+screenrecord (H.264, requiere PyAV), input, dumpsys, settings, wm size,
+getprop, date, monkey/am y svc.
+
+Las capturas salen de:
+  - un directorio de frames grabados (--frames DIR), en bucle: uno por captura o
+    a --fps frames por segundo;
+  - un grafo de escenas (--scenes escenas.json): cada escena es una imagen y sus
+    transiciones por tap, tecla o tiempo:
+
+        {"start": "lobby",
+         "scenes": {
+           "lobby": {"image": "lobby.png",
+                     "taps": [{"rect": [1000, 60, 200, 90], "goto": "ad"}]},
+           "ad":    {"image": "ad.png", "keys": {"4": "lobby"},
+                     "after": {"seconds": 30, "goto": "reward"}},
+           "reward": {"image": "reward.png", "package": "com.android.vending"}}}
+
+    Las rutas de imagen son relativas al JSON y las coordenadas, del dispositivo.
+
+Cada evento de entrada se registra con su marca de tiempo (--log eventos.jsonl).
+
+Uso:
+    python fake_adb.py [--port 5038] [--frames DIR | --scenes FILE] [--log FILE]
+    ANDROID_ADB_SERVER_PORT=5038 python gui.py
+"""
+import argparse
+import json
+import os
+import re
+import shlex
+import socket
+import socketserver
+import struct
+import threading
+import time
+from fractions import Fraction
+
+import cv2
+
+from config import ASSETS_DIR, PACKAGE_NAME
+
+try:
+    import av  # Opcional: emulación de screenrecord
+except ImportError:
+    av = None
+
+DEFAULT_PORT = 5038
+DEFAULT_IMAGE = os.path.join(ASSETS_DIR, "captura_recompensa.png")
+SERIAL = "fake-0001"
+ADB_SERVER_VERSION = 41
+
+
+# =========================================================================
+# FUENTES DE FRAMES
+# =========================================================================
+
+class FrameDirectory:
+    """Frames grabados (png/jpg ordenados por nombre) servidos en bucle. path puede ser una imagen."""
+    def __init__(self, path, fps=None):
+        if os.path.isfile(path):
+            paths = [path]
+        else:
+            paths = [os.path.join(path, n) for n in sorted(os.listdir(path))
+                     if n.lower().endswith((".png", ".jpg"))]
+        if not paths:
+            raise ValueError(f"Sin frames en {path}")
+        self.frames = [cv2.imread(p, cv2.IMREAD_COLOR) for p in paths]
+        self.fps = fps
+        self.index = 0
+        self.started = time.time()
+
+    def frame(self):
+        if self.fps:
+            index = int((time.time() - self.started) * self.fps)
+        else:
+            index = self.index
+            self.index += 1
+        return self.frames[index % len(self.frames)], index % len(self.frames)
+
+    def package(self):
+        return None
+
+    def on_input(self, kind, args):
+        pass
+
+
+class SceneGraph:
+    """Escenas con transiciones por tap (rect), tecla o tiempo."""
+    def __init__(self, path):
+        with open(path) as f:
+            spec = json.load(f)
+        base = os.path.dirname(os.path.abspath(path))
+        self.scenes = spec["scenes"]
+        self.images = {name: cv2.imread(os.path.join(base, scene["image"]), cv2.IMREAD_COLOR)
+                       for name, scene in self.scenes.items()}
+        self.current = None
+        self.entered = 0.0
+        self.goto(spec.get("start") or next(iter(self.scenes)))
+
+    def goto(self, name):
+        if name not in self.scenes:
+            print(f"⚠ Escena desconocida '{name}'")
+            return
+        self.current = name
+        self.entered = time.time()
+
+    def _tick(self):
+        after = self.scenes[self.current].get("after")
+        if after and time.time() - self.entered >= after["seconds"]:
+            self.goto(after["goto"])
+
+    def frame(self):
+        self._tick()
+        return self.images[self.current], self.current
+
+    def package(self):
+        self._tick()
+        return self.scenes[self.current].get("package")
+
+    def on_input(self, kind, args):
+        scene = self.scenes[self.current]
+        if kind == "tap":
+            x, y = args
+            for tap in scene.get("taps", []):
+                rx, ry, rw, rh = tap["rect"]
+                if rx <= x < rx + rw and ry <= y < ry + rh:
+                    self.goto(tap["goto"])
+                    return
+        elif kind == "keyevent":
+            target = scene.get("keys", {}).get(str(args[0]))
+            if target:
+                self.goto(target)
+
+
+# =========================================================================
+# DISPOSITIVO
+# =========================================================================
+
+class FakeDevice:
+    """Estado del teléfono emulado y ejecución de comandos shell."""
+    def __init__(self, source=None, log_path=None):
+        self.source = source or FrameDirectory(DEFAULT_IMAGE)
+        self.package = PACKAGE_NAME
+        self.settings = {"screen_brightness": "128", "screen_brightness_mode": "0", "wifi_on": "1"}
+        self.battery = 80
+        self.events = []  # (t, tipo, args)
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._log = open(log_path, "a") if log_path else None
+        self._encoded = {}  # (clave de frame, formato) -> bytes
+        self._last_image = None
+
+    def log_input(self, kind, *args):
+        t = time.time() - self.started
+        with self._lock:
+            self.events.append((t, kind, args))
+            self.source.on_input(kind, args)
+            if self._log:
+                self._log.write(json.dumps({"t": round(t, 4), "type": kind, "args": list(args)}) + "\n")
+                self._log.flush()
+
+    def foreground(self):
+        return self.source.package() or self.package
+
+    # --- Capturas ---------------------------------------------------------
+
+    def screencap(self, png):
+        with self._lock:
+            image, key = self.source.frame()
+            self._last_image = image
+        cache_key = (key, png)
+        data = self._encoded.get(cache_key)
+        if data is None:
+            if png:
+                data = cv2.imencode(".png", image)[1].tobytes()
+            else:
+                h, w = image.shape[:2]
+                rgba = cv2.cvtColor(image, cv2.COLOR_BGR2RGBA)
+                data = struct.pack("<IIII", w, h, 1, 0) + rgba.tobytes()
+            self._encoded[cache_key] = data
+        return data
+
+    def screenrecord(self, argv, sock):
+        """
+        `screenrecord --output-format=h264 [--size WxH] [--bit-rate N] -`: como el
+        real, solo emite un frame cuando cambia la pantalla. Las fuentes se
+        consultan a 30 Hz (FrameDirectory sin --fps avanza un frame por consulta).
+        """
+        if av is None:
+            sock.sendall(b"screenrecord: H.264 no disponible en el dispositivo falso (pip install av)\n")
+            return
+        w, h = self.screen_size()
+        if "--size" in argv:
+            w, h = (int(v) for v in argv[argv.index("--size") + 1].split("x"))
+        encoder = av.CodecContext.create("libx264", "w")
+        encoder.width, encoder.height = w, h
+        encoder.pix_fmt = "yuv420p"
+        encoder.time_base = Fraction(1, 1000)
+        if "--bit-rate" in argv:
+            encoder.bit_rate = int(argv[argv.index("--bit-rate") + 1])
+        encoder.options = {"preset": "ultrafast", "tune": "zerolatency"}
+
+        started = time.time()
+        limit = float(argv[argv.index("--time-limit") + 1]) if "--time-limit" in argv else 180
+        last_key = object()
+        try:
+            while time.time() - started < limit:
+                with self._lock:
+                    image, key = self.source.frame()
+                    self._last_image = image
+                if key != last_key:
+                    last_key = key
+                    frame = av.VideoFrame.from_ndarray(cv2.resize(image, (w, h)), format="bgr24")
+                    frame.pts = int((time.time() - started) * 1000)
+                    for packet in encoder.encode(frame):
+                        sock.sendall(bytes(packet))
+                time.sleep(1 / 30)
+        except OSError:
+            pass # El cliente cerró el stream
+
+    def screen_size(self):
+        with self._lock:
+            image = self._last_image
+            if image is None:
+                image, _ = self.source.frame()
+        return image.shape[1], image.shape[0]
+
+    # --- Shell ------------------------------------------------------------
+
+    def run_script(self, script):
+        """Ejecuta un script sh sencillo (';', '&&', '|' grep). Retorna bytes."""
+        script = re.sub(r"\s*(</dev/null|2>&1)", "", script).replace("\n", ";")
+        lexer = shlex.shlex(script, posix=True, punctuation_chars=";|&")
+        lexer.whitespace_split = True
+        out = b""
+        pipeline, argv = [], []
+        for token in list(lexer) + [";"]:
+            if token in (";", "&&", "|"):
+                if argv:
+                    pipeline.append(argv)
+                argv = []
+                if token != "|" and pipeline:
+                    out += self._run_pipeline(pipeline)
+                    pipeline = []
+            elif token not in ("{", "}"):
+                argv.append(token)
+        return out
+
+    def _run_pipeline(self, pipeline):
+        out = self.execute(pipeline[0])
+        for argv in pipeline[1:]:
+            if argv[0] == "grep" and len(argv) > 1:
+                pattern = argv[-1].encode()
+                out = b"".join(line for line in out.splitlines(keepends=True) if pattern in line)
+        return out
+
+    def execute(self, argv):
+        """Un comando del teléfono. Retorna su salida (bytes)."""
+        cmd, args = argv[0], argv[1:]
+        if cmd == "input" and args:
+            return self._input(args)
+        if cmd == "screencap":
+            return self.screencap(png="-p" in args)
+        if cmd == "dumpsys":
+            return self._dumpsys(args)
+        if cmd == "settings" and len(args) >= 3:
+            if args[0] == "get":
+                return (self.settings.get(args[2], "null") + "\n").encode()
+            if args[0] == "put" and len(args) >= 4:
+                self.settings[args[2]] = args[3]
+            return b""
+        if cmd == "wm" and args[:1] == ["size"]:
+            w, h = self.screen_size()
+            return f"Physical size: {min(w, h)}x{max(w, h)}\n".encode()
+        if cmd == "getprop":
+            props = {"ro.build.version.sdk": "30", "ro.product.model": "FakeDevice"}
+            if args:
+                return (props.get(args[0], "") + "\n").encode()
+            return "".join(f"[{k}]: [{v}]\n" for k, v in props.items()).encode()
+        if cmd == "date":
+            return time.strftime("%a %b %d %H:%M:%S CET %Y\n").encode()
+        if cmd == "monkey" and "-p" in args:
+            self.package = args[args.index("-p") + 1]
+            self.log_input("launch", self.package)
+            return b"Events injected: 1\n"
+        if cmd == "am" and args:
+            if args[0] == "force-stop" and len(args) > 1:
+                self.log_input("stop", args[1])
+                if self.package == args[1]:
+                    self.package = "com.android.launcher"
+            elif args[0] == "start" and "-n" in args:
+                self.package = args[args.index("-n") + 1].split("/")[0]
+                self.log_input("launch", self.package)
+            return b""
+        if cmd == "svc" and args[:1] == ["wifi"] and len(args) > 1:
+            self.settings["wifi_on"] = "1" if args[1] == "enable" else "0"
+            return b""
+        if cmd == "echo":
+            return (" ".join(args) + "\n").encode()
+        if cmd == "printf" and args:
+            fmt = args[0].replace("\\n", "\n")
+            return (fmt % tuple(args[1:fmt.count("%s") + 1]) if "%s" in fmt else fmt).encode()
+        if cmd in ("true", "sleep", "sh"):
+            return b""
+        return f"/system/bin/sh: {cmd}: not found\n".encode()
+
+    def _input(self, args):
+        kind, values = args[0], args[1:]
+        if kind == "tap" and len(values) >= 2:
+            self.log_input("tap", int(float(values[0])), int(float(values[1])))
+        elif kind == "swipe" and len(values) >= 4:
+            x1, y1, x2, y2 = (int(float(v)) for v in values[:4])
+            if abs(x2 - x1) + abs(y2 - y1) <= 10: # Swipe corto = tap (tap_robust)
+                self.log_input("tap", x1, y1)
+            else:
+                self.log_input("swipe", x1, y1, x2, y2)
+        elif kind == "keyevent":
+            for code in values:
+                self.log_input("keyevent", int(code) if code.isdigit() else code)
+        elif kind == "text" and values:
+            self.log_input("text", values[0].replace("%s", " "))
+        return b""
+
+    def _dumpsys(self, args):
+        section = args[0] if args else ""
+        package = self.foreground()
+        if section == "window":
+            return f"  mCurrentFocus=Window{{f00d u0 {package}/{package}.MainActivity}}\n".encode()
+        if section == "activity":
+            return f"    mResumedActivity: ActivityRecord{{f00d u0 {package}/.MainActivity t1}}\n".encode()
+        if section == "battery":
+            return f"  AC powered: false\n  USB powered: true\n  level: {self.battery}\n  scale: 100\n".encode()
+        return b""
+
+
+# =========================================================================
+# SERVIDOR
+# =========================================================================
+
+class _Handler(socketserver.BaseRequestHandler):
+    def setup(self):
+        # Respuestas pequeñas (OKAY, salidas de shell) sin esperar al ACK (Nagle)
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _read_exact(self, n):
+        data = b""
+        while len(data) < n:
+            chunk = self.request.recv(n - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+    def _read_request(self):
+        length = self._read_exact(4)
+        if not length:
+            return None
+        return self._read_exact(int(length, 16)).decode()
+
+    def _okay(self, payload=None):
+        data = b"OKAY"
+        if payload is not None:
+            payload = payload.encode()
+            data += b"%04x" % len(payload) + payload
+        self.request.sendall(data)
+
+    def _fail(self, message):
+        message = message.encode()
+        self.request.sendall(b"FAIL" + b"%04x" % len(message) + message)
+
+    def handle(self):
+        device = self.server.device
+        request = self._read_request()
+        if request is None:
+            return
+
+        if request == "host:version":
+            self._okay(f"{ADB_SERVER_VERSION:04x}")
+        elif request in ("host:devices", "host:devices-l"):
+            self._okay(f"{SERIAL}\tdevice\n")
+        elif request == "host:kill":
+            self._okay()
+        elif request.startswith("host-serial:") or request.startswith("host:tport:") \
+                or request.startswith("host:transport"):
+            self._host_or_transport(request, device)
+        else:
+            self._fail(f"unknown host service '{request}'")
+
+    def _host_or_transport(self, request, device):
+        if request.startswith("host-serial:"):
+            command = request.rsplit(":", 1)[1]
+            answers = {"get-state": "device", "get-serialno": SERIAL, "features": "cmd"}
+            if command in answers:
+                self._okay(answers[command])
+            else:
+                self._fail(f"unsupported '{command}'")
+            return
+
+        if request.startswith("host:tport:"):
+            self._okay()
+            self.request.sendall(struct.pack("<Q", 1)) # id de transporte
+        else:
+            self._okay()
+
+        service = self._read_request()
+        if service is None:
+            return
+        if service.startswith("shell:"):
+            cmd = service[len("shell:"):]
+            if cmd.strip() in ("", "sh"):
+                self._okay()
+                self._interactive_shell(device)
+            else:
+                self._okay()
+                self.request.sendall(device.run_script(cmd))
+        elif service.startswith("exec:screenrecord"):
+            self._okay()
+            device.screenrecord(service.split(), self.request)
+        elif service.startswith("exec:"):
+            self._okay()
+            self.request.sendall(device.run_script(service[len("exec:"):]))
+        else:
+            self._fail(f"unsupported service '{service}'")
+
+    def _interactive_shell(self, device):
+        """`adb shell sh`: ejecuta cada línea completa que llega por stdin."""
+        buffer = b""
+        while True:
+            chunk = self.request.recv(65536)
+            if not chunk:
+                return
+            buffer += chunk
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                if line.strip() == b"exit":
+                    return
+                self.request.sendall(device.run_script(line.decode(errors="replace")))
+
+
+class FakeADBServer(socketserver.ThreadingTCPServer):
+    """Servidor ADB falso en un hilo propio. port=0 elige un puerto libre."""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, device=None, host="127.0.0.1", port=DEFAULT_PORT):
+        self.device = device or FakeDevice()
+        super().__init__((host, port), _Handler)
+        self.port = self.server_address[1]
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-adb", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def summarize(events):
+    """Cuenta de eventos de entrada por tipo."""
+    counts = {}
+    for _, kind, _ in events:
+        counts[kind] = counts.get(kind, 0) + 1
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--frames", help="Directorio de frames grabados")
+    parser.add_argument("--fps", type=float, default=None, help="Avance de --frames por tiempo (por defecto, uno por captura)")
+    parser.add_argument("--scenes", help="Grafo de escenas (JSON)")
+    parser.add_argument("--log", help="Fichero JSONL de eventos de entrada")
+    args = parser.parse_args()
+
+    if args.scenes:
+        source = SceneGraph(args.scenes)
+    elif args.frames:
+        source = FrameDirectory(args.frames, args.fps)
+    else:
+        source = None
+    server = FakeADBServer(FakeDevice(source, args.log), port=args.port)
+    print(f"Servidor ADB falso en 127.0.0.1:{server.port} (serial {SERIAL})")
+    print(f"Usar con: ANDROID_ADB_SERVER_PORT={server.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Eventos de entrada: {summarize(server.device.events)}")
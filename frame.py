@@ -0,0 +1,66 @@
+import cv2
+import numpy as np
+
+
+class Frame(np.ndarray):
+    """
+    Captura BGR (un ndarray normal para cv2/numpy) con sus vistas derivadas
+    cacheadas: gris, umbralizadas, RGB y reducidas se calculan la primera vez que
+    se piden y se comparten entre visión, OCR, ML y GUI.
+
+    Los recortes (frame[y1:y2, x1:x2]) y las copias son Frames con caché propia.
+    Si se pinta sobre la captura (cv2.rectangle...), llamar a invalidate().
+    """
+    def __new__(cls, image):
+        return np.asarray(image).view(cls)
+
+    def __array_finalize__(self, obj):
+        self._views = {}
+
+    def __array_wrap__(self, out_arr, context=None, return_scalar=False):
+        # El resultado de operar con la captura (frame > 0, frame.mean()...) ya no
+        # es la captura: se devuelve como ndarray/escalar normal.
+        out_arr = out_arr.view(np.ndarray)
+        if return_scalar:
+            return out_arr[()]
+        return out_arr
+
+    def invalidate(self):
+        """Descarta las vistas cacheadas (tras modificar la captura in situ)."""
+        self._views.clear()
+
+    def _view(self, key, build):
+        view = self._views.get(key)
+        if view is None:
+            view = build()
+            self._views[key] = view
+        return view
+
+    @property
+    def gray(self):
+        """Escala de grises."""
+        if self.ndim == 2:
+            return self.view(np.ndarray)
+        return self._view("gray", lambda: cv2.cvtColor(self, cv2.COLOR_BGR2GRAY))
+
+    @property
+    def rgb(self):
+        """RGB (PIL, GUI, pytesseract)."""
+        return self._view("rgb", lambda: cv2.cvtColor(self, cv2.COLOR_BGR2RGB))
+
+    def threshold(self, value, mode=cv2.THRESH_BINARY):
+        """Umbralización de la versión en gris (mode: THRESH_BINARY, _INV, +OTSU...)."""
+        return self._view(("threshold", value, mode),
+                          lambda: cv2.threshold(self.gray, value, 255, mode)[1])
+
+    def resized(self, size, gray=False, interpolation=cv2.INTER_LINEAR):
+        """Versión reducida a size=(w, h), en color o en gris."""
+        return self._view(("resized", size, gray, interpolation),
+                          lambda: cv2.resize(self.gray if gray else self, size, interpolation=interpolation))
+
+
+def as_frame(image):
+    """Envuelve un ndarray en Frame (sin copia). None y Frames se devuelven tal cual."""
+    if image is None or isinstance(image, Frame):
+        return image
+    return Frame(image)
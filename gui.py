@@ -10,6 +10,7 @@ import json
 import os
 from datetime import datetime, timedelta
 from adb_wrapper import ADBWrapper
+from frame import as_frame
 from logger import GoldLogger
 from ml.trainer import ModelTrainer
 from ml.evaluator import ModelEvaluator
@@ -105,8 +106,10 @@ class BotGUI:
     def _schedule_device_status_update(self):
         """Actualiza estado de batería, WiFi y brillo cada 30s."""
         try:
+            status = self.adb_preview.get_device_status() # Una sola llamada shell
+
             # Batería
-            level = self.adb_preview.get_battery_level()
+            level = status["battery"]
             if level is not None:
                 # 5 Niveles de Color para Batería
                 if level < 20: color = "#FC8181"   # Red (Critical)
@@ -118,7 +121,7 @@ class BotGUI:
                 self.lbl_battery.config(text=f"{level}%", fg=color)
             
             # WiFi
-            wifi_status = self.adb_preview.is_wifi_enabled()
+            wifi_status = status["wifi"]
             if wifi_status is True:
                 self.lbl_wifi.config(text="ON", fg="#68D391")  # Green
             elif wifi_status is False:
@@ -127,7 +130,7 @@ class BotGUI:
                 self.lbl_wifi.config(text="--", fg="#A0AEC0")
             
             # Brillo
-            brightness = self.adb_preview.get_brightness()
+            brightness = status["brightness"]
             if brightness is not None:
                 # Convertir 0-255 a porcentaje
                 pct = int((brightness / 255) * 100)
@@ -511,7 +514,7 @@ class BotGUI:
             
             if latest_image is not None:
                 # Convertir CV2 (BGR) a PIL (RGB)
-                rgb_image = cv2.cvtColor(latest_image, cv2.COLOR_BGR2RGB)
+                rgb_image = as_frame(latest_image).rgb
                 pil_image = Image.fromarray(rgb_image)
                 
                 # Resize manteniendo aspect ratio
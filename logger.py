@@ -1,11 +1,15 @@
 import sqlite3
 import datetime
+import json
 import os
 import shutil
 
+import config
+
 class GoldLogger:
     def __init__(self, db_path="gold_log.db", legacy_txt_path="gold_diary.txt"):
         self.db_path = db_path
+        self._ocr_cache_inserts = 0 # Para recortar ocr_cache cada OCR_CACHE_DB_TRIM_EVERY
         self._init_db()
         self._migrate_legacy_txt(legacy_txt_path)
 
@@ -41,12 +45,25 @@ class GoldLogger:
                     updated_at TEXT
                 )
             """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ocr_cache (
+                    key TEXT PRIMARY KEY,
+                    data TEXT,
+                    updated_at TEXT
+                )
+            """)
+            # El recorte de ocr_cache ordena por antigüedad: sin índice sería un sort completo
+            conn.execute("CREATE INDEX IF NOT EXISTS ocr_cache_updated_at ON ocr_cache (updated_at)")
 
-    def save_ocr_memory(self, key, text, x, y, w, h, threshold):
-        """Guarda o actualiza una detección OCR exitosa en memoria."""
+    def save_ocr_memory(self, key, text, x, y, w, h, threshold=None):
+        """Guarda o actualiza una detección OCR exitosa en memoria.
+        threshold=None conserva la pasada aprendida (ver save_ocr_pass)."""
         now_str = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         try:
             with sqlite3.connect(self.db_path) as conn:
+                if threshold is None:
+                    row = conn.execute("SELECT threshold FROM ocr_memory WHERE key = ?", (key,)).fetchone()
+                    threshold = row[0] if row else 0
                 conn.execute("""
                     INSERT OR REPLACE INTO ocr_memory (key, text, x, y, w, h, threshold, updated_at)
                     VALUES (?, ?, ?, ?, ?, ?, ?, ?)
@@ -55,6 +72,22 @@ class GoldLogger:
         except Exception as e:
             print(f"Error saving OCR memory: {e}")
 
+    def save_ocr_pass(self, key, threshold):
+        """Guarda solo la pasada de OCR (umbral o código PASS_*) que acertó para key."""
+        now_str = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.execute(
+                    "UPDATE ocr_memory SET threshold = ?, updated_at = ? WHERE key = ?", (threshold, now_str, key)
+                )
+                if cursor.rowcount == 0:
+                    conn.execute("""
+                        INSERT INTO ocr_memory (key, text, x, y, w, h, threshold, updated_at)
+                        VALUES (?, '', 0, 0, 0, 0, ?, ?)
+                    """, (key, threshold, now_str))
+        except Exception as e:
+            print(f"Error saving OCR pass: {e}")
+
     def get_ocr_memory(self, key):
         """Recupera la última detección OCR exitosa para una clave dada.
         Retorna dict {text, x, y, w, h, threshold} o None."""
@@ -70,6 +103,39 @@ class GoldLogger:
             print(f"Error fetching OCR memory: {e}")
         return None
 
+    def get_ocr_cache(self, key):
+        """Resultado de OCR cacheado por contenido (ocr_cache.py) o None.
+        Un acierto renueva updated_at, así el recorte descarta los menos usados."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                row = conn.execute("SELECT data FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+                if row:
+                    now_str = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    conn.execute("UPDATE ocr_cache SET updated_at = ? WHERE key = ?", (now_str, key))
+                    return json.loads(row[0])
+        except Exception as e:
+            print(f"Error fetching OCR cache: {e}")
+        return None
+
+    def save_ocr_cache(self, key, data, max_rows=None):
+        """Guarda un resultado de OCR por contenido, conservando solo los max_rows más
+        recientes (el recorte se hace cada OCR_CACHE_DB_TRIM_EVERY inserciones)."""
+        now_str = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        max_rows = max_rows or config.OCR_CACHE_DB_MAX
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute("INSERT OR REPLACE INTO ocr_cache (key, data, updated_at) VALUES (?, ?, ?)",
+                             (key, json.dumps(data), now_str))
+                self._ocr_cache_inserts += 1
+                if self._ocr_cache_inserts % config.OCR_CACHE_DB_TRIM_EVERY:
+                    return
+                conn.execute("""
+                    DELETE FROM ocr_cache WHERE rowid IN (
+                        SELECT rowid FROM ocr_cache ORDER BY updated_at DESC, rowid DESC LIMIT -1 OFFSET ?
+                    )
+                """, (max_rows,))
+        except Exception as e:
+            print(f"Error saving OCR cache: {e}")
 
     def _migrate_legacy_txt(self, txt_path):
         """Migra datos del fichero de texto antiguo si existe y lo mueve a zz."""
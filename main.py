@@ -8,9 +8,12 @@ import cv2
 from config import *
 from adb_wrapper import ADBWrapper
 from vision import Vision
+from screen_hash import ScreenClassifier, FrameChangeGate
+from resolution import ScreenSpace
 from ocr import OCR
 from logger import GoldLogger
-from ml_logger import MLLogger, calculate_reward
+from ml_logger import MLLogger, calculate_reward, MODEL_INPUT_SIZE
+from frame import as_frame
 from enum import Enum, auto
 
 class BotState(Enum):
@@ -51,12 +54,76 @@ class Action(Enum):
     # No action / Unknown
     NONE = 99
 
+# Claves de memoria adaptativa (ocr_memory) de las plantillas del Lobby
+LOBBY_MEMORY_KEYS = {
+    INTERMEDIATE_TEMPLATE: "tmpl_intermediate",
+    COIN_ICON_TEMPLATE: "tmpl_coin_icon",
+    NO_MORE_GOLD_TEMPLATE: "tmpl_no_more_gold",
+}
+
+# Tabla de estados (la recorre RealRacingBot.run_state_machine, una pasada por vuelta):
+#   handler:    método que recibe la captura de la pasada y decide la transición
+#   enter:      método opcional al entrar en el estado (inicializar variables)
+#   next:       estados a los que puede pasar (otra transición se avisa en el log)
+#   timeout:    segundos máximos en el estado (None = sin límite); al vencer se
+#               llama a on_timeout o, si no hay, se vuelve a UNKNOWN. Solo el
+#               anuncio tiene límite (150 s, como el bucle de espera original)
+#   poll:       pausa (s) tras una pasada sin transición ni acción
+#   wake:       la pausa termina antes si cambia la pantalla (no en pantallas
+#               animadas como los anuncios: cualquier cambio de píxeles la despierta)
+#   package:    la captura viene con el paquete en primer plano (current_package)
+#   rescue:     relanzar el juego si no está en primer plano (ensure_game_context)
+STATE_TABLE = {
+    BotState.UNKNOWN: {
+        "handler": "handle_unknown", "next": (BotState.GAME_LOBBY,),
+        "timeout": None, "poll": 0.0, "rescue": True},
+    BotState.GAME_LOBBY: {
+        "handler": "handle_game_lobby",
+        "next": (BotState.REWARD_SCREEN, BotState.AD_INTERMEDIATE, BotState.TZ_INIT),
+        "timeout": None, "poll": 0.1, "rescue": True},
+    BotState.AD_INTERMEDIATE: {
+        "handler": "handle_ad_intermediate", "next": (BotState.AD_WATCHING, BotState.GAME_LOBBY),
+        "timeout": None, "poll": 0.1, "rescue": True},
+    BotState.AD_WATCHING: {
+        "handler": "handle_ad_watching", "enter": "enter_ad_watching",
+        "next": (BotState.REWARD_SCREEN, BotState.GAME_LOBBY, BotState.UNKNOWN),
+        "timeout": 150, "on_timeout": "handle_ad_timeout", # Límite del antiguo bucle del anuncio
+        "poll": 1.5, "package": True}, # Sin wake: el vídeo cambia en cada captura
+    BotState.REWARD_SCREEN: {
+        "handler": "handle_reward_screen_state", "next": (BotState.GAME_LOBBY,),
+        "timeout": None, "poll": 0.1, "rescue": True},
+    BotState.TZ_INIT: {
+        "handler": "handle_tz_init", "next": (BotState.TZ_OPEN_SETTINGS,),
+        "timeout": None, "poll": 0.1},
+    BotState.TZ_OPEN_SETTINGS: {
+        "handler": "handle_tz_open_settings", "next": (BotState.TZ_SEARCH_REGION,),
+        "timeout": None, "poll": 0.1},
+    BotState.TZ_SEARCH_REGION: {
+        "handler": "handle_tz_search_region", "next": (BotState.TZ_INPUT_SEARCH,),
+        "timeout": None, "poll": 0.1},
+    BotState.TZ_INPUT_SEARCH: {
+        "handler": "handle_tz_input_search", "next": (BotState.TZ_SELECT_COUNTRY,),
+        "timeout": None, "poll": 0.1},
+    BotState.TZ_SELECT_COUNTRY: {
+        "handler": "handle_tz_select_country", "next": (BotState.TZ_SELECT_CITY, BotState.GAME_LOBBY),
+        "timeout": None, "poll": 0.1},
+    BotState.TZ_SELECT_CITY: {
+        "handler": "handle_tz_select_city", "next": (BotState.TZ_RETURN_GAME,),
+        "timeout": None, "poll": 0.1},
+    BotState.TZ_RETURN_GAME: {
+        "handler": "handle_tz_return_game", "next": (BotState.GAME_LOBBY,),
+        "timeout": None, "poll": 0.1},
+}
+
 class RealRacingBot:
     def __init__(self, stop_event=None, log_callback=None, image_callback=None, stats_callback=None, monitor_callback=None, click_callback=None):
         self.adb = ADBWrapper()
-        self.vision = Vision()
-        self.ocr = OCR()
+        self.screen = ScreenSpace() # Resolución de trabajo (capturas y coordenadas)
+        self.vision = Vision(scale=self.screen.work_scale)
+        self.screen_classifier = ScreenClassifier()
+        self.frame_gate = FrameChangeGate()
         self.logger = GoldLogger()
+        self.ocr = OCR(memory=self.logger, log=self.log) # Aprende la pasada de OCR por clave (ocr_memory)
         self.current_timezone_state = "MADRID" 
         self.last_screen_shape = None # To store (height, width) of the last screenshot
         
@@ -75,7 +142,19 @@ class RealRacingBot:
         self.ml_enabled = True  # Toggle para activar/desactivar logging ML
         self.current_action = Action.NONE
         self.last_screenshot = None
-        
+        self._template_memory = {} # Cache de ocr_memory para plantillas (key -> hint)
+        self._last_capture_stats = time.time()
+        self._last_adb_stats = time.time()
+        self._last_ocr_stats = time.time()
+        self.wait_cycle = {"waits": 0, "budget": 0.0, "waited": 0.0} # Esperas del ciclo actual
+        self.session_wait_saved = 0.0
+        self.state_entered = time.time()  # Entrada en el estado actual (timeout de STATE_TABLE)
+        self.state_stats = {}             # estado -> {"time", "passes"}
+        self.transition_stats = {}        # (origen, destino) -> {"count", "time" en origen}
+        self._last_state_stats = time.time()
+        self.current_package = None       # Paquete de la pasada (estados con "package")
+        self.ad_watch = None              # Variables del anuncio en curso (enter_ad_watching)
+
         # Screen Dims (Lazy load or default)
         self.screen_width = 2340 
         self.screen_height = 1080
@@ -131,15 +210,75 @@ class RealRacingBot:
         now = datetime.datetime.now()
         return START_HOUR <= now.hour < END_HOUR
         
+    def capture(self):
+        """
+        Captura ADB reducida a la resolución de trabajo (None si falla).
+        Con la bomba de captura activa no se espera al dispositivo: se usa el frame
+        más reciente, siempre que sea posterior a la última acción enviada.
+        """
+        if not self.adb.is_pumping():
+            return self.screen.to_work(self.adb.take_screenshot())
+
+        newer_than = max(self.adb.last_input_time, time.time() - CAPTURE_MAX_AGE)
+        frame = self.adb.wait_for_new_frame(timeout=CAPTURE_WAIT_TIMEOUT, newer_than=newer_than)
+        self._log_capture_stats()
+        return self.screen.to_work(frame)
+
+    def capture_with_package(self):
+        """
+        (paquete en primer plano, captura de trabajo). Con ADB_ASYNC la consulta
+        del paquete y la captura van a la vez por el cliente asyncio. Con la bomba
+        o la captura por vídeo la captura ya está disponible: solo se consulta el
+        paquete (cacheado ADB_QUERY_TTL["package"]).
+        """
+        if not ADB_ASYNC or self.adb.is_pumping() or self.adb.is_streaming():
+            return self.adb.get_current_package(), self.capture()
+        package, frame = self.adb.screenshot_and_package()
+        return package, self.screen.to_work(frame)
+
+    def _log_adb_stats(self):
+        """Latencias y timeouts de ADB cada 5 minutos (ADBWrapper.call_stats)."""
+        now = time.time()
+        if now - self._last_adb_stats < 300:
+            return
+        self._last_adb_stats = now
+        ops = self.adb.call_stats()["ops"]
+        summary = ", ".join(f"{op} {s['p50_ms']:.0f}/{s['p95_ms']:.0f} ms ({s['timeouts']} timeouts, {s['errors']} errores)"
+                            for op, s in sorted(ops.items()))
+        self.log(f"📡 ADB p50/p95: {summary}")
+
+    def _log_ocr_stats(self, force=False):
+        """Aciertos de la caché de OCR por contenido cada 5 minutos (OCRCache.stats)."""
+        now = time.time()
+        if not force and now - self._last_ocr_stats < 300:
+            return
+        self._last_ocr_stats = now
+        stats = self.ocr.cache.stats()
+        if stats["hits"] + stats["disk_hits"] + stats["misses"]:
+            self.log(f"🔤 Caché OCR: {stats['hit_rate']:.0%} aciertos ({stats['hits']} memoria, "
+                     f"{stats['disk_hits']} disco, {stats['misses']} fallos, {stats['entries']} en memoria)")
+
+    def _log_capture_stats(self):
+        """Métricas de la bomba de captura cada minuto (para ajustar intervalos)."""
+        now = time.time()
+        if now - self._last_capture_stats < 60:
+            return
+        self._last_capture_stats = now
+        stats = self.adb.capture_stats()
+        self.log(f"📷 Captura: {stats['fps']:.1f} fps, {stats['capture_ms']:.0f} ms/captura, "
+                 f"edad media {stats['age_ms']:.0f} ms, descartados {stats['dropped']}/{stats['frames']}")
+
     def device_tap(self, x, y, duration=None, action=None, screenshot=None):
         """
-        Realiza un click directo en las coordenadas del dispositivo usando ADB.
-        No requiere conversion ni calibracion si las coordenadas vienen de la screenshot.
+        Realiza un click directo usando ADB.
+        Las coordenadas vienen de la screenshot (resolución de trabajo) y se
+        convierten aquí al espacio del dispositivo.
         Opcionalmente registra la accion ML.
         """
-        self.log(f"ADB Tap en ({int(x)}, {int(y)})")
+        dev_x, dev_y = self.screen.to_device(x, y)
+        self.log(f"ADB Tap en ({dev_x}, {dev_y})")
         
-        # Click Visualization Callback
+        # Click Visualization Callback (coordenadas de la imagen mostrada)
         if self.click_callback:
             self.click_callback(x, y)
         
@@ -149,9 +288,11 @@ class RealRacingBot:
             self._record_ml_action(action, screenshot)
             
         if duration and duration > 0.1:
-             self.adb.long_tap(x, y, int(duration * 1000))
+             self.adb.long_tap(dev_x, dev_y, int(duration * 1000))
         else:
-             self.adb.tap(x, y)
+             self.adb.tap(dev_x, dev_y)
+        # Tras una acción la siguiente captura se analiza entera aunque no cambie
+        self.frame_gate.reset()
     
     def _record_ml_action(self, action, screenshot=None):
         """Registra la accion para ML (Training y Monitor)."""
@@ -163,7 +304,7 @@ class RealRacingBot:
             if img is None:
                 # Si no se provee, tomamos una nueva (Snapshot del momento exacto)
                 # Esto añade latencia pero garantiza datos correctos.
-                img = self.adb.take_screenshot()
+                img = self.capture()
             
             if img is not None:
                 # 2. Enviar a Logger (BD)
@@ -177,7 +318,8 @@ class RealRacingBot:
                 
                 # 3. Enviar a Monitor (Live GUI)
                 if self.monitor_callback:
-                    self.monitor_callback(img, action)
+                    # Entrada del modelo ya reducida (misma vista que guarda el logger)
+                    self.monitor_callback(as_frame(img).resized(MODEL_INPUT_SIZE, gray=True), action)
                     
         except Exception as e:
             self.log(f"⚠ Error registrando ML Action: {e}")
@@ -187,6 +329,25 @@ class RealRacingBot:
         self.current_action = action
 
 
+    def _get_template_hint(self, memory_key):
+        """Hint (x, y, w, h) de la memoria adaptativa. Solo consulta la BD la primera vez."""
+        if memory_key not in self._template_memory:
+            memory = self.logger.get_ocr_memory(memory_key)
+            hint_coords = None
+            if memory:
+                hint_coords = (memory["x"], memory["y"], memory["w"], memory["h"])
+            self._template_memory[memory_key] = hint_coords
+        return self._template_memory[memory_key]
+
+    def _remember_template(self, memory_key, template_name, match):
+        """Guarda la posición (centro -> esquina) en memoria. Solo escribe en BD si cambió."""
+        rx, ry, rw, rh = match
+        hint_coords = (rx - rw//2, ry - rh//2, rw, rh)
+        if self._template_memory.get(memory_key) == hint_coords:
+            return
+        self._template_memory[memory_key] = hint_coords
+        self.logger.save_ocr_memory(memory_key, template_name, *hint_coords, 0)
+
     def _find_template_with_memory(self, screenshot, template_name, memory_key):
         """
         Busca un template usando memoria adaptativa.
@@ -195,41 +356,169 @@ class RealRacingBot:
         template_path = os.path.join(ASSETS_DIR, template_name)
         
         # Recuperar memoria
-        memory = self.logger.get_ocr_memory(memory_key)
-        hint_coords = None
-        if memory:
-            hint_coords = (memory["x"], memory["y"], memory["w"], memory["h"])
+        hint_coords = self._get_template_hint(memory_key)
         
         # Busqueda adaptativa
         result = self.vision.find_template_adaptive(screenshot, template_path, hint_coords=hint_coords)
         
         if result:
-            rx, ry, rw, rh = result
             # Guardar en memoria
-            self.logger.save_ocr_memory(memory_key, template_name, rx - rw//2, ry - rh//2, rw, rh, 0)
+            self._remember_template(memory_key, template_name, result)
             return result
         
         return None
 
+    def _scan_with_memory(self, screenshot, template_set, memory_keys):
+        """
+        Vision.scan con la memoria adaptativa de las plantillas indicadas.
+        memory_keys: dict {nombre_template: memory_key}.
+        Retorna dict {nombre: (x, y, w, h) | None}.
+        """
+        hints = {name: self._get_template_hint(key) for name, key in memory_keys.items()}
+        names = TEMPLATE_SETS[template_set]
+        matches = {name: None for name in names}
+
+        # 1. Clasificar la pantalla por huella y confirmar primero con sus plantillas
+        label, distance = self.screen_classifier.classify(screenshot)
+        confirm = [n for n in names if n in SCREEN_CONFIRM_TEMPLATES.get(label, [])]
+        if confirm:
+            results = self.vision.scan(screenshot, confirm, hints=hints)
+            matches.update({name: match for name, (score, match) in results.items()})
+
+        # 2. Resto de plantillas del conjunto. Con la predicción confirmada solo
+        # faltan las de mayor prioridad que el acierto (p.ej. una recompensa o la
+        # intermedia encima del lobby, cuya huella se parece a la del lobby), y
+        # ni esas si la huella está tan cerca que no cabe un popup encima.
+        hit = next((i for i, name in enumerate(names) if matches[name]), len(names))
+        if hit < len(names) and distance <= SCREEN_HASH_SURE_DISTANCE:
+            hit = 0
+        rest = [n for n in names[:hit] if n not in confirm]
+        if rest:
+            results = self.vision.scan(screenshot, rest, hints=hints)
+            matches.update({name: match for name, (score, match) in results.items()})
+
+        # Aprender la pantalla confirmada por la plantilla de mayor prioridad
+        # (si la huella no la había predicho ya)
+        for name in names:
+            if matches[name]:
+                for screen_label, templates in SCREEN_CONFIRM_TEMPLATES.items():
+                    if name in templates:
+                        if screen_label != label:
+                            self.screen_classifier.learn(screenshot, screen_label)
+                        break
+                break
+        return matches
+
+    def wait_until(self, predicate, timeout, poll=WAIT_POLL):
+        """
+        Llama a predicate() hasta que devuelva algo verdadero o pasen timeout s
+        y retorna su último resultado. timeout es la pausa fija que sustituye:
+        la diferencia con lo esperado se acumula en wait_cycle.
+        """
+        start = time.time()
+        deadline = start + timeout
+        while True:
+            result = predicate()
+            remaining = deadline - time.time()
+            if result or remaining <= 0 or self.is_stopped():
+                break
+            time.sleep(min(poll, remaining))
+        self.wait_cycle["waits"] += 1
+        self.wait_cycle["budget"] += timeout
+        self.wait_cycle["waited"] += time.time() - start
+        return result
+
+    def _wait_screen(self, timeout, before, region, settle, need_change, poll):
+        """
+        Base de wait_for_change / wait_for_stable: compara capturas (o la región
+        (x, y, w, h) de trabajo) con FrameChangeGate. Retorna la última captura.
+        """
+        gate = FrameChangeGate()
+        if region is not None:
+            x, y, w, h = region
+        crop = lambda image: image if region is None else image[y:y+h, x:x+w]
+
+        if before is None:
+            before = self.capture()
+        if before is not None:
+            gate.update(crop(before))
+        state = {"frame": before, "since": None if need_change else time.time()}
+
+        def reached():
+            frame = self.capture()
+            if frame is None:
+                return False
+            state["frame"] = frame
+            now = time.time()
+            if gate.update(crop(frame)):
+                state["since"] = now
+            return state["since"] is not None and now - state["since"] >= settle
+
+        self.wait_until(reached, timeout, poll)
+        return state["frame"]
+
+    def wait_for_change(self, timeout, before=None, region=None, settle=0.0, poll=WAIT_POLL):
+        """
+        Espera a que la pantalla cambie respecto a `before` (la captura anterior
+        a la acción; si no se da, una nueva) y, con settle > 0, a que lleve
+        settle s sin cambiar. Retorna la última captura.
+        """
+        return self._wait_screen(timeout, before, region, settle, True, poll)
+
+    def wait_for_stable(self, timeout, before=None, region=None, settle=WAIT_SETTLE, poll=WAIT_POLL):
+        """Espera a que la pantalla lleve settle s sin cambiar (animaciones). Retorna la última captura."""
+        return self._wait_screen(timeout, before, region, settle, False, poll)
+
+    def wait_for_template(self, template_name, timeout, poll=WAIT_POLL, **kwargs):
+        """
+        Espera a que aparezca la plantilla (kwargs van a Vision.find_template).
+        Retorna (match o None, última captura).
+        """
+        template_path = os.path.join(ASSETS_DIR, template_name)
+        state = {"frame": None}
+
+        def found():
+            state["frame"] = self.capture()
+            if state["frame"] is None:
+                return None
+            return self.vision.find_template(state["frame"], template_path, **kwargs)
+
+        return self.wait_until(found, timeout, poll), state["frame"]
+
+    def _game_in_front(self):
+        """True si el juego está en primer plano (sin el valor cacheado de ADBWrapper)."""
+        self.adb.invalidate("package")
+        return self.adb.get_current_package() == PACKAGE_NAME
+
+    def _log_wait_cycle(self, name):
+        """Resume las esperas del ciclo (tiempo ahorrado frente a las pausas fijas) y lo reinicia."""
+        stats = self.wait_cycle
+        if stats["waits"]:
+            saved = stats["budget"] - stats["waited"]
+            self.session_wait_saved += saved
+            self.log(f"⏱ Esperas del ciclo de {name}: {stats['waits']} esperas, "
+                     f"{stats['waited']:.1f}s de {stats['budget']:.1f}s fijos "
+                     f"({saved:.1f}s ahorrados, {self.session_wait_saved:.0f}s en la sesión)")
+        self.wait_cycle = {"waits": 0, "budget": 0.0, "waited": 0.0}
+
     def _search_country(self, term):
         """Busca país usando lupa. Retorna True si éxito."""
         self.log(f"🔎 Buscando País '{term}'...")
         # 1. Buscar Lupa
-        scr = self.adb.take_screenshot()
+        scr = self.capture()
         match = self.vision.find_template(scr, os.path.join(ASSETS_DIR, SEARCH_ICON_TEMPLATE))
         
         if match:
             cx, cy, w, h = match
-            click_x = cx + w + 50
+            click_x = cx + w + self.screen.ref(50)
             self.device_tap(click_x, cy)
-            time.sleep(0.5) 
+            scr = self.wait_for_change(0.5, before=scr, settle=WAIT_SETTLE) # Teclado
             
             self.adb._run_command(["input", "text", term])
-            time.sleep(1.0) 
             
             # Buscar resultado
-            scr = self.adb.take_screenshot()
-            results = self.ocr.get_screen_texts(scr, min_y=250)
+            scr = self.wait_for_change(1.0, before=scr, settle=WAIT_SETTLE)
+            results = self.ocr.get_screen_texts(scr, min_y=self.screen.ref(250), targets=(term,))
             
             # Exacto
             for text, x, y, w, h in results:
@@ -255,7 +544,7 @@ class RealRacingBot:
     def _click_city_direct(self, name):
         """Busca texto en pantalla (City) y pulsa."""
         self.log(f"Buscando '{name}' en pantalla...")
-        scr = self.adb.take_screenshot()
+        scr = self.capture()
         
         # Exacto (Prioridad)
         coords = self.ocr.find_text(scr, name, exact_match=True)
@@ -281,24 +570,26 @@ class RealRacingBot:
         memory_key = f"ocr_tz_pais_{term.lower()}"
         
         for _ in range(10):
-            scr = self.adb.take_screenshot()
-            results = self.ocr.get_screen_texts(scr, min_y=250)
+            scr = self.capture()
+            results = self.ocr.get_screen_texts(scr, min_y=self.screen.ref(250), targets=(term,), key=memory_key)
             
             # Exacto
             for text, x, y, w, h in results:
                 if text.upper() == term.upper():
                     cx, cy = x + w//2, y + h//2
                     self.log(f"Pais '{text}' encontrado en ({cx},{cy}) - Guardando en BD")
-                    self.logger.save_ocr_memory(memory_key, text, x, y, w, h, 0)
+                    self.logger.save_ocr_memory(memory_key, text, x, y, w, h)
                     self.device_tap(cx, cy)
+                    self.wait_for_change(2.5, before=scr, settle=WAIT_SETTLE) # Lista de ciudades
                     return True
             # Parcial
             for text, x, y, w, h in results:
                 if term.upper() in text.upper():
                     cx, cy = x + w//2, y + h//2
                     self.log(f"Pais '{text}' (parcial) en ({cx},{cy}) - Guardando en BD")
-                    self.logger.save_ocr_memory(memory_key, text, x, y, w, h, 0)
+                    self.logger.save_ocr_memory(memory_key, text, x, y, w, h)
                     self.device_tap(cx, cy)
+                    self.wait_for_change(2.5, before=scr, settle=WAIT_SETTLE)
                     return True
             time.sleep(0.3)
         return False
@@ -324,7 +615,7 @@ class RealRacingBot:
             self.log(f"⚠ Detectado anuncio Web/Consentimiento (keyword: '{found_keyword}', words: {word_count}).")
             self.log("👉 Ejecutando acción: BOTÓN ATRÁS (Back).")
             self.adb.input_keyevent(4) # KEYCODE_BACK
-            time.sleep(2.0) # Esperar a que el sistema reaccione
+            self.wait_for_change(2.0, before=screenshot) # Esperar a que el sistema reaccione
             return True
             
         return False
@@ -360,24 +651,24 @@ class RealRacingBot:
         if saltar_pos:
             self.log(f"Encuesta Google: Botón 'Saltar' detectado en {saltar_pos}. Click.")
             self.device_tap(saltar_pos[0], saltar_pos[1])
-            time.sleep(2)
+            self.wait_for_change(2, before=screenshot, settle=WAIT_SETTLE)
             return True
 
         # 2. Buscar Pantalla 1 (Buscamos la X arriba a la izquierda)
         # Intentar buscar la 'X' específicamente
         x_pos = self.ocr.find_text(screenshot, "X", exact_match=True)
         
-        if x_pos and x_pos[1] < 200 and x_pos[0] < 300: # X debe estar arriba izquierda
+        if x_pos and x_pos[1] < self.screen.ref(200) and x_pos[0] < self.screen.ref(300): # X debe estar arriba izquierda
             self.log(f"Encuesta Google: Click en 'X' encontrada por OCR en {x_pos}.")
             self.device_tap(x_pos[0], x_pos[1])
-            time.sleep(2)
+            self.wait_for_change(2, before=screenshot, settle=WAIT_SETTLE)
             return True
             
         # Si el contexto es MUY fuerte (ej: "tecnologia de google"), podemos arriesgar click ciego
         if "tecnologia" in full_text or "technology" in full_text:
             self.log("Encuesta Google: Contexto fuerte pero no veo X. Usando click ciego (170, 80).")
-            self.device_tap(170, 80)
-            time.sleep(2)
+            self.device_tap(*self.screen.from_reference(170, 80))
+            self.wait_for_change(2, before=screenshot, settle=WAIT_SETTLE)
             return True
         
         return False
@@ -388,17 +679,21 @@ class RealRacingBot:
         """
         cx, cy, w, h = match_coin
         self.log(f"Interactuando con Moneda en ({cx}, {cy})...")
+        self._log_wait_cycle("lobby") # Empieza un ciclo de anuncio
         self.device_tap(cx, cy)
         
         # Guardar tiempo de esta interacción
         self.last_reward_time = time.time()
         
-    def check_device_timezone(self):
+    def check_device_timezone(self, refresh=False):
         """
         Consulta la zona horaria del dispositivo usando ADB shell date.
+        refresh=True ignora el valor cacheado en ADBWrapper.
         Retorna: 'MADRID', 'KIRITIMATI' o 'UNKNOWN'.
         """
-        output = self.adb._run_command(["date"])
+        if refresh:
+            self.adb.invalidate("timezone")
+        output = self.adb.get_device_date()
         # output example: "Tue Dec 16 18:15:00 GMT+01:00 2025" or "CET"
         # output example: "Wed Dec 17 07:15:00 +14 2025"
         
@@ -488,7 +783,7 @@ class RealRacingBot:
         else:
              self.log("✅ Juego ya estaba abierto. Continuando...")
              
-        time.sleep(2) # Estabilización
+        self.wait_for_stable(2) # Estabilización
         
         # Inicializar estado de zona horaria
         current_tz = self.check_device_timezone()
@@ -500,11 +795,17 @@ class RealRacingBot:
         self.state = BotState.UNKNOWN
         self.last_state = None
         self.state_data = {}
+        self.state_entered = time.time()
         
         # Iniciar sesion ML si esta habilitado
         if self.ml_enabled:
             self.ml_logger.start_session(notes=f"Bot session started at {datetime.datetime.now()}")
 
+        if CAPTURE_STREAM and self.adb.start_video_stream():
+            pass # take_screenshot sirve el último frame del vídeo
+        elif CAPTURE_PUMP:
+            self.adb.start_capture_pump()
+
         last_disconnect_log = 0
         while not self.is_stopped():
             # Check connection
@@ -518,50 +819,64 @@ class RealRacingBot:
                 time.sleep(5)
                 continue
 
-            self.run_state_machine()
-            time.sleep(0.1) # Pequeña pausa para no saturar CPU
+            self.run_state_machine() # Incluye la pausa del estado (STATE_TABLE poll)
+            self._log_adb_stats()
+            self._log_ocr_stats()
+            self._log_state_stats()
+
+        self.adb.stop_capture_pump()
+        self.adb.stop_video_stream()
+        self._log_ocr_stats(force=True)
+        self._log_state_stats(force=True)
+        self.ocr.shutdown() # Procesos del pool de OCR
 
 
     def run_state_machine(self):
-        """Dispatcher de la maquina de estados con logging ML."""
+        """
+        Una pasada del dispatcher: captura, ejecuta el handler del estado según
+        STATE_TABLE, registra la transición (ML y tiempos) y hace la pausa del estado.
+        """
+        pass_start = time.time()
+        spec = STATE_TABLE[self.state]
         # Capturar estado ANTES de la accion
         state_before = self.state
         self.current_action = Action.NONE
         
-        # --- OPTIMIZATION START ---
         # Single capture per loop cycle. Shared for ML and Logic.
         try:
-            self.current_screenshot = self.adb.take_screenshot()
-            self.last_screenshot = self.current_screenshot # Alias for ML backward compat (if needed)
+            if spec.get("package"):
+                self.current_package, self.current_screenshot = self.capture_with_package()
+            else:
+                self.current_package, self.current_screenshot = None, self.capture()
         except:
-            self.current_screenshot = None
-            self.last_screenshot = None
-        # --- OPTIMIZATION END ---
+            self.current_package, self.current_screenshot = None, None
+        self.last_screenshot = self.current_screenshot # Alias for ML backward compat (if needed)
         
-        # Log de transicion visual
+        # Log de transicion visual + inicialización del estado
         if self.state != self.last_state:
             self.log(f"🔄 CAMBIO ESTADO: {self.last_state.name if self.last_state else 'None'} -> {self.state.name}")
             self.last_state = self.state
+            if spec.get("enter"):
+                getattr(self, spec["enter"])()
 
-        # 0. Chequeo de Contexto Global (Rescue) - Excepto si estamos cambiando zona
-        if "TZ_" not in self.state.name:
-             if self.ensure_game_context():
-                 time.sleep(3)
-                 return
+        # 0. Chequeo de Contexto Global (Rescue) - Solo estados dentro del juego
+        if spec.get("rescue") and self.ensure_game_context():
+            self.wait_until(self._game_in_front, 3, poll=0.5)
+            self._record_state_pass(state_before, pass_start)
+            return
 
-        # 1. Dispatch
-        if self.state == BotState.UNKNOWN:
-            self.handle_unknown()
-        elif self.state == BotState.GAME_LOBBY:
-            self.handle_game_lobby(self.current_screenshot)
-        elif self.state == BotState.AD_INTERMEDIATE:
-            self.handle_ad_intermediate(self.current_screenshot)
-        elif self.state == BotState.AD_WATCHING:
-            self.handle_ad_watching() # Own loop
-        elif self.state == BotState.REWARD_SCREEN:
-            self.handle_reward_screen_state(self.current_screenshot)
-        elif "TZ_" in self.state.name:
-            self.handle_timezone_sequence(self.current_screenshot)
+        # 1. Dispatch (o salida por tiempo máximo en el estado)
+        if spec["timeout"] is not None and time.time() - self.state_entered > spec["timeout"]:
+            if spec.get("on_timeout"):
+                getattr(self, spec["on_timeout"])(self.current_screenshot)
+            else:
+                self.log(f"⌛ {self.state.name} superó {spec['timeout']}s. Estado -> UNKNOWN")
+                self.state_data.clear()
+                self.state = BotState.UNKNOWN
+        else:
+            getattr(self, spec["handler"])(self.current_screenshot)
+            if self.state != state_before and self.state not in spec["next"]:
+                self.log(f"⚠ Transición no declarada en STATE_TABLE: {state_before.name} -> {self.state.name}")
         
         # 2. Log ML Transition (despues del dispatch)
         if self.ml_enabled and state_before != self.state:
@@ -576,8 +891,44 @@ class RealRacingBot:
                 metadata={"timestamp": time.time()}
             )
 
+        # 3. Pausa: solo si la pasada no cambió de estado ni actuó (las acciones ya esperan)
+        if state_before == self.state and self.adb.last_input_time < pass_start and not self.is_stopped():
+            if spec.get("wake"):
+                self.wait_for_change(spec["poll"], before=self.current_screenshot, poll=0.5)
+            elif spec["poll"]:
+                time.sleep(spec["poll"])
+        self._record_state_pass(state_before, pass_start)
+
+    def _record_state_pass(self, state_before, pass_start):
+        """Suma la pasada al tiempo del estado y, si hubo transición, su permanencia a la transición."""
+        now = time.time()
+        stats = self.state_stats.setdefault(state_before, {"time": 0.0, "passes": 0})
+        stats["time"] += now - pass_start
+        stats["passes"] += 1
+        if self.state != state_before:
+            transition = self.transition_stats.setdefault((state_before, self.state), {"count": 0, "time": 0.0})
+            transition["count"] += 1
+            transition["time"] += now - self.state_entered
+            self.state_entered = now
+
+    def _log_state_stats(self, force=False):
+        """Reparto del tiempo por estado y permanencia media por transición cada 5 minutos."""
+        now = time.time()
+        if not force and now - self._last_state_stats < 300:
+            return
+        self._last_state_stats = now
+        total = sum(s["time"] for s in self.state_stats.values())
+        if not total:
+            return
+        states = sorted(self.state_stats.items(), key=lambda item: -item[1]["time"])
+        self.log("⏲ Tiempo por estado: " + ", ".join(
+            f"{state.name} {s['time'] / total:.0%} ({s['time']:.0f}s, {s['passes']} pasadas)" for state, s in states))
+        transitions = sorted(self.transition_stats.items(), key=lambda item: -item[1]["time"])
+        self.log("⏲ Transiciones: " + ", ".join(
+            f"{a.name}->{b.name} x{t['count']} ({t['time'] / t['count']:.1f}s)" for (a, b), t in transitions))
+
 
-    def handle_unknown(self):
+    def handle_unknown(self, screenshot):
         """Estado inicial o de recuperación."""
         # Por defecto asumimos Lobby si el juego está abierto
         self.log("Estado UNKNOWN -> Asumiendo GAME_LOBBY...")
@@ -594,23 +945,28 @@ class RealRacingBot:
         if screenshot is None: return
         self.update_live_view(screenshot)
 
+        # Una sola pasada con todas las plantillas del Lobby; después se elige por prioridad
+        matches = self._scan_with_memory(screenshot, "lobby", LOBBY_MEMORY_KEYS)
+
         # 0. Chequeo de Rescate: ¿Estamos viendo ya una Recompensa?
         for t_name in REWARD_CLOSE_TEMPLATES:
-             if self.vision.find_template(screenshot, os.path.join(ASSETS_DIR, t_name)):
+             if matches[t_name]:
                   self.log("Detectada Pantalla Recompensa desde Lobby (Recuperación).")
                   self.state = BotState.REWARD_SCREEN
                   return
 
         # 1. Pantalla Intermedia (Confirmar) - A veces salta directo
-        match_inter = self._find_template_with_memory(screenshot, INTERMEDIATE_TEMPLATE, "tmpl_intermediate")
+        match_inter = matches[INTERMEDIATE_TEMPLATE]
         if match_inter:
+            self._remember_template(LOBBY_MEMORY_KEYS[INTERMEDIATE_TEMPLATE], INTERMEDIATE_TEMPLATE, match_inter)
             self.log("Detectada Pantalla Intermedia desde Lobby.")
             self.state = BotState.AD_INTERMEDIATE
             return
 
         # 4. Moneda Normal
-        match_coin = self._find_template_with_memory(screenshot, COIN_ICON_TEMPLATE, "tmpl_coin_icon")
+        match_coin = matches[COIN_ICON_TEMPLATE]
         if match_coin:
+             self._remember_template(LOBBY_MEMORY_KEYS[COIN_ICON_TEMPLATE], COIN_ICON_TEMPLATE, match_coin)
              # OPTIMIZATION: Check internal timezone state first before costly ADB call
              # Only verify physically if we think we aren't in Madrid but see a coin (anomaly?)
              # OR if we don't know where we are.
@@ -623,7 +979,7 @@ class RealRacingBot:
              if self.current_timezone_state != "MADRID":
                   # Verification only if we suspect mismatch
                   self.log(f"⚠ Moneda visible pero Estado TZ es '{self.current_timezone_state}'. Verificando...")
-                  real_tz = self.check_device_timezone()
+                  real_tz = self.check_device_timezone(refresh=True)
                   if real_tz != "MADRID":
                       self.log(f"⚠ Confirmado: Zona es '{real_tz}'. Forzando cambio a MADRID...")
                       self.state_data["target_zone"] = "MADRID"
@@ -634,14 +990,15 @@ class RealRacingBot:
              
              # Click en moneda
              self.interact_with_coin(screenshot, match_coin)
-             time.sleep(1.0)
+             self.wait_for_change(1.0, before=screenshot)
              # Asumimos que tras moneda viene o Intermedia o el Anuncio directo
              self.state = BotState.AD_INTERMEDIATE
              return
 
         # 5. Sin Oro / No More Ads
-        match_no_gold = self._find_template_with_memory(screenshot, NO_MORE_GOLD_TEMPLATE, "tmpl_no_more_gold")
+        match_no_gold = matches[NO_MORE_GOLD_TEMPLATE]
         if match_no_gold:
+            self._remember_template(LOBBY_MEMORY_KEYS[NO_MORE_GOLD_TEMPLATE], NO_MORE_GOLD_TEMPLATE, match_no_gold)
             self.log("Detectado 'No hay más anuncios'. Iniciando ciclo Timezone.")
             # Restriccion horaria ELIMINADA para modo experimental 24h
             # El ciclo matutino se gestiona en TZ_INIT
@@ -676,7 +1033,7 @@ class RealRacingBot:
                  self.device_tap(cx, cy)
              
              self.log("Confirmación enviada. Esperando anuncio...")
-             time.sleep(2.5)
+             self.wait_for_change(2.5, before=screenshot)
              self.state = BotState.AD_WATCHING
              return
         else:
@@ -685,29 +1042,22 @@ class RealRacingBot:
              # Fallback a Lobby que redespachará
              self.state = BotState.GAME_LOBBY
 
-    def handle_ad_watching(self):
-        """
-        Monitorizando anuncio.
-        Transitions:
-        -> REWARD_SCREEN (X cerrada, >> cerrado)
-        -> GAME_LOBBY (Web back, Survey skip)
-        """
-        # La lógica de process_active_ad era bloqueante (while loop).
-        # Para la máquina de estados, deberíamos hacerla no bloqueante o mantener el while dentro 
-        # (mini-bucle de estado) si queremos mantener la lógica de 'stall detection' continua.
-        # Dado que process_active_ad ya es robusta, la llamaremos como "acción de estado" 
-        # que retorna cuando termina el anuncio.
-        
-        # Nota: process_active_ad retorna True si terminó bien (closed), False si falló/timeout
-        result = self.run_ad_watching_logic()
-        
-        if result == "REWARD":
-             self.state = BotState.REWARD_SCREEN
-        elif result == "LOBBY":
-             self.state = BotState.GAME_LOBBY
-        else:
-             self.log("Resultado Ad Watching incierto. Estado -> UNKNOWN")
-             self.state = BotState.UNKNOWN
+    def enter_ad_watching(self):
+        """Variables del anuncio en curso (entrada en AD_WATCHING)."""
+        self.log("👀 Estado: WATCHING_AD")
+        self.frame_gate.reset()
+        self.ad_watch = {
+            "ignored_zones": [],  # X que resultaron falsos positivos
+            "stall": 0,           # Pasadas sin cambios
+            "black": 0,           # Pasadas con pantalla negra
+            "focus": 0,           # Intentos seguidos de recuperar el foco
+        }
+
+    def _end_ad_watching(self, state):
+        """Sale de AD_WATCHING. Sin recompensa el ciclo de anuncio termina aquí."""
+        self.state = state
+        if state != BotState.REWARD_SCREEN:
+            self._log_wait_cycle("anuncio")
 
     def check_lobby_anchors(self, screenshot):
         """
@@ -715,196 +1065,200 @@ class RealRacingBot:
         Retorna True si estamos CASI SEGUROS de que es el Lobby.
         Esto actúa como 'Safety Guard' para no detectar anuncios erróneamente.
         """
+        matches = self._scan_with_memory(screenshot, "lobby_anchors",
+                                         {COIN_ICON_TEMPLATE: LOBBY_MEMORY_KEYS[COIN_ICON_TEMPLATE]})
+
         # 1. Nuevos Assets de Lobby (Definidos por Usuario)
         # Son la prueba 'fuerte' de que estamos en el menu principal
-        if self.vision.find_template(screenshot, os.path.join(ASSETS_DIR, LOBBY_TEMPLATE_1)):
+        if matches[LOBBY_TEMPLATE_1]:
             self.log("⚓ Anchor Detectado: Lobby Asset 1.")
             return True
             
-        if self.vision.find_template(screenshot, os.path.join(ASSETS_DIR, LOBBY_TEMPLATE_2)):
+        if matches[LOBBY_TEMPLATE_2]:
             self.log("⚓ Anchor Detectado: Lobby Asset 2.")
             return True
 
         # 2. Pantalla Intermedia (Nube/Confirmar)
         # Si estamos aquí, NO estamos viendo un video aún.
-        if self.vision.find_template(screenshot, os.path.join(ASSETS_DIR, INTERMEDIATE_TEMPLATE)):
+        if matches[INTERMEDIATE_TEMPLATE]:
             self.log("⚓ Anchor Detectado: Pantalla Intermedia (Pre-Ad).")
             return True
 
         # El coin_icon solo indica 'Ads Disponibles', pero si lo vemos 
         # tambien es indicativo de que NO es un video de anuncio. 
         # Lo mantenemos como fallback o señal positiva secundaria.
-        if self._find_template_with_memory(screenshot, COIN_ICON_TEMPLATE, "tmpl_coin_icon"):
+        if matches[COIN_ICON_TEMPLATE]:
+             self._remember_template(LOBBY_MEMORY_KEYS[COIN_ICON_TEMPLATE], COIN_ICON_TEMPLATE, matches[COIN_ICON_TEMPLATE])
              self.log("⚓ Anchor Detectado: Moneda (Ads Disponibles).")
              return True
 
         return False
 
-    def run_ad_watching_logic(self):
-        """Lógica encapsulada de mirar anuncio."""
-        self.log("👀 Estado: WATCHING_AD")
-        start_wait = time.time()
-        ignored_zones = []
-        
-        # Variables Loop Seguridad
-        last_gray = None
-        stall_counter = 0
-        black_screen_counter = 0
-        
-        focus_recovery_attempts = 0
+    def handle_ad_watching(self, screenshot):
+        """
+        Un paso de la monitorización del anuncio. El dispatcher lo repite cada
+        1.5s (antes si cambia la pantalla) hasta el límite de STATE_TABLE.
+        Transitions:
+        -> REWARD_SCREEN (Reward close visible)
+        -> GAME_LOBBY (Anchors, Survey skip, foco perdido, pantalla negra)
+        """
+        watch = self.ad_watch
         
-        while time.time() - start_wait < 150: # Timeout
-            if self.is_stopped(): return "LOBBY"
+        # 0. CHECK FOCUS FIRST (PRIORIDAD MAXIMA) - el paquete llega con la captura
+        current_pkg = self.current_package
+        if current_pkg and current_pkg != PACKAGE_NAME and "settings" not in current_pkg.lower():
+            watch["focus"] += 1
+            self.log(f"⚠ Perdida de foco durante anuncio: {current_pkg} (intento {watch['focus']})")
             
-            # 0. CHECK FOCUS FIRST (PRIORIDAD MAXIMA)
-            current_pkg = self.adb.get_current_package()
-            if current_pkg and current_pkg != PACKAGE_NAME and "settings" not in current_pkg.lower():
-                focus_recovery_attempts += 1
-                self.log(f"⚠ Perdida de foco durante anuncio: {current_pkg} (intento {focus_recovery_attempts})")
-                
-                # Si son demasiados intentos, abortar a LOBBY
-                if focus_recovery_attempts > 5:
-                    self.log("❌ Demasiados intentos de recuperar foco. Abortando a LOBBY.")
-                    self.adb.input_keyevent(3)  # Home
-                    time.sleep(1)
-                    return "LOBBY"
-                
-                # Primero cerrar la app intrusa con Back
-                self.adb.input_keyevent(4)  # Back
+            # Si son demasiados intentos, abortar a LOBBY
+            if watch["focus"] > 5:
+                self.log("❌ Demasiados intentos de recuperar foco. Abortando a LOBBY.")
+                self.adb.input_keyevent(3)  # Home
                 time.sleep(1)
-                
-                # Traer juego al frente con monkey (mas efectivo)
-                self.adb._run_command(["monkey", "-p", PACKAGE_NAME, "-c", "android.intent.category.LAUNCHER", "1"])
-                time.sleep(2)
-                continue
-            else:
-                focus_recovery_attempts = 0  # Reset counter si estamos bien
+                self._end_ad_watching(BotState.GAME_LOBBY)
+                return
+            
+            # Primero cerrar la app intrusa con Back
+            self.adb.input_keyevent(4)  # Back
+            self.wait_for_change(1, before=screenshot)
             
-            screenshot = self.adb.take_screenshot()
+            # Traer juego al frente con monkey (mas efectivo)
+            self.adb._run_command(["monkey", "-p", PACKAGE_NAME, "-c", "android.intent.category.LAUNCHER", "1"])
+            self.frame_gate.reset()
+            self.wait_until(self._game_in_front, 2, poll=0.5)
+            return
+        else:
+            watch["focus"] = 0  # Reset counter si estamos bien
+        
+        if screenshot is None:
+            return
+
+        # Filtro de cambios: si la imagen es la misma que la anterior (que ya pasó
+        # por todos los detectores sin acierto), no se repite visión ni OCR.
+        frame_changed = self.frame_gate.update(screenshot)
+        if frame_changed:
             self.update_live_view(screenshot)
 
             # --- ANCHOR CHECK (LOBBY SAFETY) ---
             if self.check_lobby_anchors(screenshot):
                  self.log("⚠ Lobby detectado por Anchors durante 'WATCHING_AD'. Forzando salida a LOBBY.")
-                 return "LOBBY"
+                 self._end_ad_watching(BotState.GAME_LOBBY)
+                 return
             # -----------------------------------
 
             # 1. Google Survey (Transition -> LOBBY)
             if self.handle_google_survey(screenshot):
                  self.log("Encuesta Google gestionada. Volviendo a Lobby.")
-                 return "LOBBY"
+                 self._end_ad_watching(BotState.GAME_LOBBY)
+                 return
 
             # 2. Web Consent (Transition -> STAY/LOBBY via Back)
             if self.handle_web_consent(screenshot):
-                 time.sleep(2)
-                 continue 
+                 self.frame_gate.reset()
+                 self.wait_for_stable(2)
+                 return
 
             # 3. Navegador Interno (Web Bar Close)
-            # Transición -> Click -> Esperar X/Cierre (Loop)
+            # Transición -> Click -> Esperar X/Cierre (siguientes pasos)
             match_web_close = self.vision.find_template(screenshot, os.path.join(ASSETS_DIR, WEB_BAR_CLOSE_TEMPLATE))
             if match_web_close:
                  self.log("Navegador Interno detectado (Bar Close). Click.")
                  self.device_tap(match_web_close[0], match_web_close[1])
-                 time.sleep(2)
-                 continue
+                 self.wait_for_change(2, before=screenshot, settle=WAIT_SETTLE)
+                 return
 
             # 4. Dynamic X (Transition -> REWARD)
-            match_dynamic = self.vision.find_close_button_dynamic(screenshot, ignored_zones=ignored_zones)
+            match_dynamic = self.vision.find_close_button_dynamic(screenshot, ignored_zones=watch["ignored_zones"])
             if match_dynamic:
                  self.log("X Detectada. Click.")
                  cx, cy, w, h = match_dynamic
                  self.device_tap(cx, cy)
-                 time.sleep(2)
-                 
+             
                  # --- CHECK FALSO POSITIVO (Resume) ---
                  # A veces la X es para cerrar el anuncio prematuramente y sale "Seguir viento?"
-                 check_scr = self.adb.take_screenshot()
+                 check_scr = self.wait_for_change(2, before=screenshot, settle=WAIT_SETTLE)
                  match_resume = self.vision.find_template(check_scr, os.path.join(ASSETS_DIR, AD_RESUME_TEMPLATE))
                  if match_resume:
                      self.log("⚠ Falso positivo X (Detectado 'Seguir Viendo'). Reanudando...")
                      # Click en "Seguir viendo" (Resume)
                      rx, ry, rw, rh = match_resume
                      self.device_tap(rx, ry)
-                     ignored_zones.append((cx, cy, w, h)) # Ignorar esta X en el futuro próximo
-                     time.sleep(1)
-                     continue
+                     watch["ignored_zones"].append((cx, cy, w, h)) # Ignorar esta X en el futuro próximo
+                     self.wait_for_change(1, before=check_scr)
+                     return
                  # -------------------------------------
 
                  # Fix: No asumir que el anuncio terminó solo por ver una X.
-                 # Podría ser un anuncio multi-stage. Seguir en loop.
+                 # Podría ser un anuncio multi-stage. Seguir monitorizando.
                  self.log("X clickeada. Continuando monitoreo (Multi-Stage protection).")
-                 continue
+                 return
 
             # 5. Reward Close Directo (Check) - PRIORIDAD ALTA
             # Si vemos la X de recompensa, salimos ya, no importa si parece haber un Fast Forward
             for t_name in REWARD_CLOSE_TEMPLATES:
                  if self.vision.find_template(screenshot, os.path.join(ASSETS_DIR, t_name)):
                       self.log("Reward Close detectado directo.")
-                      return "REWARD"
+                      self._end_ad_watching(BotState.REWARD_SCREEN)
+                      return
 
             # 6. Fast Forward (Transition -> REWARD)
             match_ff = self.vision.find_fast_forward_button(screenshot)
             if match_ff:
                  self.log("Fast Forward detectado. Click.")
                  # Usar offset aleatorio pequeño para evitar "píxel muerto" o detección de bot
-                 import random
                  ff_x, ff_y, ff_w, ff_h = match_ff
-                 
+             
                  # Offset +/- 5px del centro
                  off_x = random.randint(-5, 5)
                  off_y = random.randint(-5, 5)
-                 
+             
                  # Click con duración explícita (0.15s) para asegurar registro
                  self.device_tap(ff_x + off_x, ff_y + off_y, duration=0.15)
-                 time.sleep(2.0) # Aumentar espera post-click
-                 continue
-            
-            # --- CHEQUEOS DE SEGURIDAD (Stall/Black) ---
-            import cv2
-            import numpy as np
-            gray = cv2.cvtColor(screenshot, cv2.COLOR_BGR2GRAY)
-            
-            # Black Screen
-            if np.mean(gray) < 10:
-                black_screen_counter += 1
-                if black_screen_counter > 6: # ~15s
-                    self.log("⚠ Pantalla negra persistente. Abortando a Lobby.")
-                    self.adb.input_keyevent(4)
-                    return "LOBBY"
-            else:
-                black_screen_counter = 0
-            
-            # Stall Detection (Imagen congelada)
-            if last_gray is not None:
-                score = cv2.matchTemplate(gray, last_gray, cv2.TM_CCOEFF_NORMED)[0][0]
-                if score > 0.98: # Muy similar
-                    stall_counter += 1
-                else:
-                    stall_counter = 0
-               
-                if stall_counter > 10: # ~20-25s congelado
-                    self.log("⚠ Anuncio congelado (Stall). Intentando tap central...")
-                    self.device_tap(int(self.screen_width/2), int(self.screen_height/2))
-                    stall_counter = 0 # Reset para dar chance
-            
-            last_gray = gray
-            # -------------------------------------------
-
-            time.sleep(1.5)
-            
+                 self.wait_for_change(2.0, before=screenshot, settle=WAIT_SETTLE)
+                 return
+        
+        # --- CHEQUEOS DE SEGURIDAD (Stall/Black) ---
+        # Misma señal barata del filtro de cambios (miniatura)
+        
+        # Black Screen
+        if self.frame_gate.mean < 10:
+            watch["black"] += 1
+            if watch["black"] > 6: # ~15s
+                self.log("⚠ Pantalla negra persistente. Abortando a Lobby.")
+                self.adb.input_keyevent(4)
+                self._end_ad_watching(BotState.GAME_LOBBY)
+                return
+        else:
+            watch["black"] = 0
+        
+        # Stall Detection (Imagen congelada)
+        if frame_changed:
+            watch["stall"] = 0
+        else:
+            watch["stall"] += 1
+           
+        if watch["stall"] > 10: # ~20-25s congelado
+            self.log("⚠ Anuncio congelado (Stall). Intentando tap central...")
+            work_w, work_h = self.screen.work_size
+            self.device_tap(work_w // 2, work_h // 2)
+            watch["stall"] = 0 # Reset para dar chance
+        # -------------------------------------------
+
+    def handle_ad_timeout(self, screenshot):
+        """AD_WATCHING superó su tiempo máximo: salir con BACK y comprobar el Lobby."""
         self.log("Timeout viendo anuncio. Intentando salir con BACK...")
         self.adb.input_keyevent(4) # Back
-        time.sleep(2.0)
         
         # Verify if we managed to exit
-        scr = self.adb.take_screenshot()
+        scr = self.wait_for_change(2.0, before=screenshot, settle=WAIT_SETTLE)
         self.update_live_view(scr)
         if self.check_lobby_anchors(scr):
              self.log("Recuperado a Lobby exitosamente.")
-             return "LOBBY"
+             self._end_ad_watching(BotState.GAME_LOBBY)
+             return
              
         self.log("No se detectó Lobby tras Timeout. Estado -> UNKNOWN")
-        return "UNKNOWN"
+        self._end_ad_watching(BotState.UNKNOWN)
 
     def handle_reward_screen(self, screenshot=None):
         """
@@ -914,11 +1268,8 @@ class RealRacingBot:
         3. Cierra la ventana.
         """
         self.log("💰 Procesando Recompensa...")
-        time.sleep(1) # Estabilizar animación
-        
-        # Use shared screenshot if provided, otherwise capture (fallback for direct usage)
-        if screenshot is None:
-            screenshot = self.adb.take_screenshot()
+        # Estabilizar animación (parte de la captura compartida si la hay)
+        screenshot = self.wait_for_stable(1, before=screenshot)
         
         self.update_live_view(screenshot) # Feedback visual
         
@@ -962,12 +1313,14 @@ class RealRacingBot:
         if not closed:
             self.log("⚠ No vi botón de cerrar recompensa. Usando Tap en esquina superior derecha (Fallback).")
             # Fallback a coordenadas típicas de cierre
-            self.device_tap(self.screen_width - 50, 50) # Top-Right Corner assumption? 
+            work_w, work_h = self.screen.work_size
+            self.device_tap(work_w - self.screen.ref(50), self.screen.ref(50)) # Top-Right Corner assumption? 
             # Mejor usar un punto seguro, pero si no hay template...
             # Intentar back key?
             # self.adb.input_keyevent(4) 
         
-        time.sleep(2) # Esperar a que cierre
+        self.wait_for_change(2, before=screenshot) # Esperar a que cierre
+        self._log_wait_cycle("anuncio")
 
     def handle_reward_screen_state(self, screenshot):
         """Lectura de oro y cierre."""
@@ -975,261 +1328,265 @@ class RealRacingBot:
         self.state = BotState.GAME_LOBBY
 
 
-    def handle_timezone_sequence(self, screenshot):
-        """Sub-máquina para Timezone."""
-        if self.state == BotState.TZ_INIT:
-             # Refresh timezone real ONLY if needed or periodically?
-             if self.current_timezone_state == "UNKNOWN":
-                 real_tz = self.check_device_timezone()
-                 if real_tz != "UNKNOWN":
-                     self.current_timezone_state = real_tz
-             
-             # Toggle simple entre MADRID y KIRITIMATI
-             current = self.current_timezone_state
-             if current == "MADRID":
-                 target = "KIRITIMATI"
-             else:
-                 target = "MADRID"
-             
-             self.state_data["target_zone"] = target
-             self.log(f"Iniciando secuencia TZ hacia: {target}")
-             self.state = BotState.TZ_OPEN_SETTINGS
-
-        elif self.state == BotState.TZ_OPEN_SETTINGS:
-             self.adb._run_command(["am", "start", "-a", "android.settings.DATE_SETTINGS"])
-             time.sleep(0.5) # Reduced from 1.0s
-             self.state = BotState.TZ_SEARCH_REGION
-             
-        elif self.state == BotState.TZ_SEARCH_REGION:
-             self.log("Buscando Region...")
-             time.sleep(0.5) # Reduced from 1.0s
-             
-             # Need fresh screen after opening settings
-             scr = self.adb.take_screenshot()
-             self.update_live_view(scr)
-             
-             h_scr, w_scr = scr.shape[:2]
-             limit_y = int(h_scr * 0.85)
-             all_texts = self.ocr.get_screen_texts(scr)
-             
-             # Buscar "Region" (prioridad)
-             region_found = False
-             for text, x, y, w, h in all_texts:
-                 if "Region" in text and (y + h//2) < limit_y:
-                     cx, cy = x + w//2, y + h//2
-                     self.log(f"✅ Region encontrado en ({cx},{cy}) - Guardando en BD")
-                     self.logger.save_ocr_memory("ocr_tz_region", text, x, y, w, h, 0)
-                     # Fast tap
-                     self.device_tap(cx, cy)
-                     time.sleep(1.0)
-                     self.state = BotState.TZ_INPUT_SEARCH
-                     region_found = True
-                     break
-             
-             if not region_found:
-                 # Buscar "Seleccionar"
-                 for text, x, y, w, h in all_texts:
-                     if "Seleccionar" in text and (y + h//2) < limit_y:
-                         cx, cy = x + w//2, y + h//2
-                         self.log(f"✅ Seleccionar encontrado en ({cx},{cy}) - Guardando en BD")
-                         self.logger.save_ocr_memory("ocr_tz_seleccionar", text, x, y, w, h, 0)
-                         # Fast tap
-                         self.device_tap(cx, cy)
-                         time.sleep(1.0)
-                         # Permanece en TZ_SEARCH_REGION para buscar Region
-                         break
-                 else:
-                     self.log("❌ No encontre Region ni Seleccionar. Reintentando...")
-                     time.sleep(0.5)
-                 
-        elif self.state == BotState.TZ_INPUT_SEARCH:
-             target = self.state_data["target_zone"]
-             
-             term = "Espa" # Default Madrid
-             if target == "KIRITIMATI": term = "Kiribati"
-             
-             self.log(f"Buscando lupa para: {term}")
-             time.sleep(0.5) # Reduced from 1.0s
-             scr = self.adb.take_screenshot()
-             self.update_live_view(scr)
-             
-             # Buscar LUPA con find_template directo (threshold 0.7, check_negative)
-             template_path = os.path.join(ASSETS_DIR, SEARCH_ICON_TEMPLATE)
-             match = self.vision.find_template(scr, template_path, threshold=0.7, check_negative=True)
-             
-             if match:
-                 cx, cy, cw, ch = match
-                 # Guardar en memoria
-                 self.logger.save_ocr_memory("tmpl_search_icon", SEARCH_ICON_TEMPLATE, cx - cw//2, cy - ch//2, cw, ch, 0)
-                 # Click a la DERECHA de la lupa (en el campo de texto)
-                 click_x = cx + cw + 50
-                 click_y = cy
-                 self.log(f"🔍 Lupa en ({cx},{cy}). Click en campo ({click_x}, {click_y}).")
-                 self.device_tap(click_x, click_y)
-             else:
-                 self.log("⚠ Lupa no encontrada. Click Fallback (540, 150).")
-                 self.device_tap(540, 150) 
-                 
-             time.sleep(1.5) # Aumentado de 1.0s a 2.0s para dar tiempo a focus
-             
-             # Borrar texto anterior (20 backspaces)
-             self.log("⌨ Limpiando campo de texto...")
-             for _ in range(20):
-                 self.adb._run_command(["input", "keyevent", "67"])
-             
-             self.log(f"⌨ Escribiendo texto: {term}")
-             self.adb._run_command(["input", "text", term])
-             time.sleep(2)
-             self.state = BotState.TZ_SELECT_COUNTRY
-             
-        elif self.state == BotState.TZ_SELECT_COUNTRY:
-             target = self.state_data["target_zone"]
-             term = "Espa"
-             if target == "KIRITIMATI": term = "Kiribati"
-             
-             if self._wait_click_country_result(term):
-                 self.log(f"País {term} seleccionado.")
-                 self.state = BotState.TZ_SELECT_CITY
-             else:
-                 self.log("No encontré país. Reintentando...")
-                 self.state = BotState.GAME_LOBBY
-                 
-        elif self.state == BotState.TZ_SELECT_CITY:
-             target = self.state_data["target_zone"]
-             
-             city = "Madrid"
-             if target == "KIRITIMATI": city = "Kiritimati"
-             memory_key = f"tz_city_{city.lower()}"
-             
-             # Smart Retry Init
-             if "city_blacklist" not in self.state_data:
-                 self.state_data["city_blacklist"] = []
-             
-             time.sleep(2.5)
-             scr = self.adb.take_screenshot()
-             
-             # DEBUG: Ver qué texto hay en la lista de ciudades
-             all_texts = self.ocr.get_screen_texts(scr)
-             self.log(f"DEBUG CITY OCR: {[t[0] for t in all_texts]}")
-             
-             # MASKING: Tachar zonas de la blacklist
-             for (bx, by, bw, bh) in self.state_data["city_blacklist"]:
-                 self.log(f"🕵‍♀ SmartRetry: Ignorando zona fallida previa en ({bx},{by})")
-                 # Dibujar rectangulo negro para que OCR no lo vea
-                 cv2.rectangle(scr, (bx, by), (bx+bw, by+bh), (0, 0, 0), -1)
-
-             memory = self.logger.get_ocr_memory(memory_key)
-             hint_coords = None
-             
-             # VALIDACIÓN MEMORIA: Ignorar si es demasiado grande (>90% pantalla)
-             if memory and memory["w"] > 0:
-                 if memory["w"] > scr.shape[1] * 0.9:
-                     self.log(f"🧠 OCR Memory CORRUPTA (Too huge) para '{city}': {memory}. IGNORANDO.")
-                     hint_coords = None
-                 else:
-                     # Verificar si la memoria cae en zona blacklisted
-                     mx, my, mw, mh = memory["x"], memory["y"], memory["w"], memory["h"]
-                     is_blacklisted = False
-                     for (bx, by, bw, bh) in self.state_data["city_blacklist"]:
-                         # Chequeo simple de proximidad (centro cerca de centro)
-                         mcx, mcy = mx + mw//2, my + mh//2
-                         bcx, bcy = bx + bw//2, by + bh//2
-                         if abs(mcx - bcx) < 50 and abs(mcy - bcy) < 50:
-                             is_blacklisted = True
-                             break
-                     
-                     if is_blacklisted:
-                         self.log(f"🧠 OCR Memory apunta a zona BLACKLISTED. Ignorando memoria.")
-                         hint_coords = None
-                     else:
-                         hint_coords = (mx, my, mw, mh)
-                         self.log(f"🧠 OCR Memory LOADED para '{city}' (Key: {memory_key}): {hint_coords}")
-             else:
-                 self.log(f"🧠 OCR Memory EMPTY/CLEARED para '{city}' (Key: {memory_key}). Buscando full screen...")
-             
-             # Búsqueda adaptativa
-             result = self.ocr.find_text_adaptive(scr, city, hint_coords=hint_coords)
-             
-             if result:
-                 rx, ry, rw, rh, threshold_used = result
-                 
-                 # MEJORA ROBUSTEZ CLICK:
-                 # scr es numpy array (CV2). Usar shape (h, w).
-                 screen_h, screen_w = scr.shape[:2]
-                 click_x = rx + rw // 2
-                 click_y = ry + rh // 2
-                 
-                 self.log(f"✅ Ciudad '{city}' encontrada. Click ROBUSTO en fila: ({click_x},{click_y}) (Text: {rx},{ry})")
-                 
-                 # Single Tap Robusto (100ms swipe)
-                 self.device_tap(click_x, click_y)
-                 time.sleep(0.5)
-                 
-                 # Guardar en memoria para próxima vez (guardamos rx/ry originales del texto)
-                 # SOLO si funciona (lo hacemos tras verificacion), pero aqui guardamos provisionalmente
-                 # para validacion. Si falla, borraremos.
-                 
-                 self.current_timezone_state = target
-                 
-                 # VERIFICACIÓN DE RETORNO A "SELECCIONAR ZONA HORARIA"
-                 # Esperar hasta que volvamos a la pantalla anterior
-                 self.log(f"Esperando retorno a pantalla Settings...")
-                 time.sleep(1.0) 
-                 
-                 start_wait_return = time.time()
-                 found_return = False
-                 while time.time() - start_wait_return < 5.0: # 5s timeout
-                     scr_check = self.adb.take_screenshot()
-                     texts = self.ocr.get_screen_texts(scr_check)
-                     self.log(f"🔎 DEBUG RETURN OCR: {[t[0] for t in texts]}") # DEBUG
-                     # IMPORTANTE: OCR devuelve palabras sueltas. No buscar frases.
-                     # Buscamos "Fecha" o "Seleccionar".
-                     found_return = any("Seleccionar" in t[0] or "Fecha" in t[0] or "Date" in t[0] for t in texts)
-                     
-                     if found_return:
-                          self.log("✅ Detectada pantalla de ajustes. Cambio confirmado.")
-                          break
-                     time.sleep(0.5)
-                 
-                 if found_return:
-                     self.log(f"Zona cambiada a {city}. Volviendo al juego...")
-                     self.logger.save_ocr_memory(memory_key, city, rx, ry, rw, rh, threshold_used) # CONFIRMAMOS MEMORIA
-                     self.state = BotState.TZ_RETURN_GAME
-                 else:
-                     self.log(f"❌ Click en '{city}' falló (No volvimos a Settings). Blacklisting zona y reintentando...")
-                     
-                     # 1. Borrar memoria (era mala)
-                     self.logger.save_ocr_memory(memory_key, "", 0, 0, 0, 0, 0)
-                     
-                     # 2. BLACKLIST: Añadir esta zona para no volver a clickarla
-                     self.state_data["city_blacklist"].append((rx, ry, rw, rh))
-                     
-                     time.sleep(1)
-             else:
-                 # SIN FALLBACK: Quedarse en el estado para reintentar
-                 self.log(f"❌ No se pudo encontrar ciudad '{city}' tras OCR adaptativo (Masked). Reintentando...")
-                 
-                 # Si la blacklist está llena y no encontramos nada, quizás limpiar blacklist?
-                 if len(self.state_data["city_blacklist"]) > 0:
-                     self.log("⚠ No encuentro nada y tengo blacklist. Limpiando blacklist por si acaso.")
-                     self.state_data["city_blacklist"] = []
-                     
-                 time.sleep(2)
+    def handle_tz_init(self, screenshot):
+        """Sub-máquina Timezone: elige la zona destino (alterna MADRID / KIRITIMATI)."""
+        # Refresh timezone real ONLY if needed or periodically?
+        if self.current_timezone_state == "UNKNOWN":
+            real_tz = self.check_device_timezone()
+            if real_tz != "UNKNOWN":
+                self.current_timezone_state = real_tz
+        
+        # Toggle simple entre MADRID y KIRITIMATI
+        current = self.current_timezone_state
+        if current == "MADRID":
+            target = "KIRITIMATI"
+        else:
+            target = "MADRID"
+        
+        self.state_data["target_zone"] = target
+        self.log(f"Iniciando secuencia TZ hacia: {target}")
+        self.state = BotState.TZ_OPEN_SETTINGS
+
+    def handle_tz_open_settings(self, screenshot):
+        """Sub-máquina Timezone: abre Ajustes > Fecha y hora."""
+        self.adb._run_command(["am", "start", "-a", "android.settings.DATE_SETTINGS"])
+        self.wait_for_change(0.5, before=screenshot)
+        self.state = BotState.TZ_SEARCH_REGION
+
+    def handle_tz_search_region(self, screenshot):
+        """Sub-máquina Timezone: pulsa 'Region' (o 'Seleccionar' para llegar a ella)."""
+        self.log("Buscando Region...")
+        
+        # Need fresh screen after opening settings
+        scr = self.wait_for_stable(0.5)
+        self.update_live_view(scr)
+        
+        h_scr, w_scr = scr.shape[:2]
+        limit_y = int(h_scr * 0.85)
+        # Para en cuanto lee "Region"; "Seleccionar" solo se mira si no aparece
+        all_texts = self.ocr.get_screen_texts(scr, targets=("Region",), key="ocr_tz_region")
+        
+        # Buscar "Region" (prioridad)
+        region_found = False
+        for text, x, y, w, h in all_texts:
+            if "Region" in text and (y + h//2) < limit_y:
+                cx, cy = x + w//2, y + h//2
+                self.log(f"✅ Region encontrado en ({cx},{cy}) - Guardando en BD")
+                self.logger.save_ocr_memory("ocr_tz_region", text, x, y, w, h)
+                # Fast tap
+                self.device_tap(cx, cy)
+                self.wait_for_change(1.0, before=scr)
+                self.state = BotState.TZ_INPUT_SEARCH
+                region_found = True
+                break
+        
+        if not region_found:
+            # Buscar "Seleccionar"
+            for text, x, y, w, h in all_texts:
+                if "Seleccionar" in text and (y + h//2) < limit_y:
+                    cx, cy = x + w//2, y + h//2
+                    self.log(f"✅ Seleccionar encontrado en ({cx},{cy}) - Guardando en BD")
+                    self.logger.save_ocr_memory("ocr_tz_seleccionar", text, x, y, w, h)
+                    # Fast tap
+                    self.device_tap(cx, cy)
+                    self.wait_for_change(1.0, before=scr)
+                    # Permanece en TZ_SEARCH_REGION para buscar Region
+                    break
+            else:
+                self.log("❌ No encontre Region ni Seleccionar. Reintentando...")
+                time.sleep(0.5)
 
-        elif self.state == BotState.TZ_RETURN_GAME:
-             self.log("Resumiendo juego (Bring to Front)...")
-             
-             # OPTIMIZATION PROACTIVE: 
-             # 1. Matar Ajustes para asegurar focus
-             self.adb.stop_app("com.android.settings")
-             time.sleep(0.5)
-             
-             # 2. Lanzar juego con Monkey (más robusto que am start directo)
-             self.adb.start_app(PACKAGE_NAME)
-             
-             time.sleep(4) # Esperar resume
-             self.state_data.clear() # Limpiar objetivo para siguiente ciclo
-             self.state = BotState.GAME_LOBBY
+    def handle_tz_input_search(self, screenshot):
+        """Sub-máquina Timezone: escribe el país en el buscador de regiones."""
+        target = self.state_data["target_zone"]
+        
+        term = "Espa" # Default Madrid
+        if target == "KIRITIMATI": term = "Kiribati"
+        
+        self.log(f"Buscando lupa para: {term}")
+        # Buscar LUPA con find_template directo (threshold 0.7, check_negative)
+        match, scr = self.wait_for_template(SEARCH_ICON_TEMPLATE, 0.5, threshold=0.7, check_negative=True)
+        self.update_live_view(scr)
+        
+        if match:
+            cx, cy, cw, ch = match
+            # Guardar en memoria
+            self.logger.save_ocr_memory("tmpl_search_icon", SEARCH_ICON_TEMPLATE, cx - cw//2, cy - ch//2, cw, ch, 0)
+            # Click a la DERECHA de la lupa (en el campo de texto)
+            click_x = cx + cw + self.screen.ref(50)
+            click_y = cy
+            self.log(f"🔍 Lupa en ({cx},{cy}). Click en campo ({click_x}, {click_y}).")
+            self.device_tap(click_x, click_y)
+        else:
+            self.log("⚠ Lupa no encontrada. Click Fallback (540, 150).")
+            self.device_tap(*self.screen.from_reference(540, 150)) 
+            
+        # Dar tiempo a focus (aparece el teclado)
+        scr = self.wait_for_change(1.5, before=scr, settle=WAIT_SETTLE)
+        
+        # Borrar texto anterior (20 backspaces)
+        self.log(f"⌨ Limpiando campo y escribiendo texto: {term}")
+        self.adb.input_batch().keyevent(*[67] * 20).text(term).send() # 67 = KEYCODE_DEL
+        self.wait_for_change(2, before=scr, settle=WAIT_SETTLE) # Resultados
+        self.state = BotState.TZ_SELECT_COUNTRY
+
+    def handle_tz_select_country(self, screenshot):
+        """Sub-máquina Timezone: pulsa el país en los resultados."""
+        target = self.state_data["target_zone"]
+        term = "Espa"
+        if target == "KIRITIMATI": term = "Kiribati"
+        
+        if self._wait_click_country_result(term):
+            self.log(f"País {term} seleccionado.")
+            self.state = BotState.TZ_SELECT_CITY
+        else:
+            self.log("No encontré país. Reintentando...")
+            self.state = BotState.GAME_LOBBY
+
+    def handle_tz_select_city(self, screenshot):
+        """Sub-máquina Timezone: pulsa la ciudad (OCR adaptativo) y confirma la vuelta a Ajustes."""
+        target = self.state_data["target_zone"]
+        
+        city = "Madrid"
+        if target == "KIRITIMATI": city = "Kiritimati"
+        memory_key = f"tz_city_{city.lower()}"
+        
+        # Smart Retry Init
+        if "city_blacklist" not in self.state_data:
+            self.state_data["city_blacklist"] = []
+        
+        # La lista de ciudades ya se esperó tras el click en el país
+        scr = self.capture()
+        before_tap = scr
+        
+        # DEBUG: Ver qué texto hay en la lista de ciudades
+        all_texts = self.ocr.get_screen_texts(scr)
+        self.log(f"DEBUG CITY OCR: {[t[0] for t in all_texts]}")
+        
+        # MASKING: Tachar zonas de la blacklist
+        if self.state_data["city_blacklist"]:
+            # Copia: la captura puede estar compartida (bomba de captura) y la
+            # copia no arrastra las vistas cacheadas (gris/umbrales) sin máscara
+            scr = scr.copy()
+        for (bx, by, bw, bh) in self.state_data["city_blacklist"]:
+            self.log(f"🕵‍♀ SmartRetry: Ignorando zona fallida previa en ({bx},{by})")
+            # Dibujar rectangulo negro para que OCR no lo vea
+            cv2.rectangle(scr, (bx, by), (bx+bw, by+bh), (0, 0, 0), -1)
+
+        memory = self.logger.get_ocr_memory(memory_key)
+        hint_coords = None
+        
+        # VALIDACIÓN MEMORIA: Ignorar si es demasiado grande (>90% pantalla)
+        if memory and memory["w"] > 0:
+            if memory["w"] > scr.shape[1] * 0.9:
+                self.log(f"🧠 OCR Memory CORRUPTA (Too huge) para '{city}': {memory}. IGNORANDO.")
+                hint_coords = None
+            else:
+                # Verificar si la memoria cae en zona blacklisted
+                mx, my, mw, mh = memory["x"], memory["y"], memory["w"], memory["h"]
+                is_blacklisted = False
+                for (bx, by, bw, bh) in self.state_data["city_blacklist"]:
+                    # Chequeo simple de proximidad (centro cerca de centro)
+                    mcx, mcy = mx + mw//2, my + mh//2
+                    bcx, bcy = bx + bw//2, by + bh//2
+                    if abs(mcx - bcx) < self.screen.ref(50) and abs(mcy - bcy) < self.screen.ref(50):
+                        is_blacklisted = True
+                        break
+                
+                if is_blacklisted:
+                    self.log(f"🧠 OCR Memory apunta a zona BLACKLISTED. Ignorando memoria.")
+                    hint_coords = None
+                else:
+                    hint_coords = (mx, my, mw, mh)
+                    self.log(f"🧠 OCR Memory LOADED para '{city}' (Key: {memory_key}): {hint_coords}")
+        else:
+            self.log(f"🧠 OCR Memory EMPTY/CLEARED para '{city}' (Key: {memory_key}). Buscando full screen...")
+        
+        # Búsqueda adaptativa
+        result = self.ocr.find_text_adaptive(scr, city, hint_coords=hint_coords,
+                                             first_pass=memory["threshold"] if memory else None)
+        
+        if result:
+            rx, ry, rw, rh, threshold_used = result
+            
+            # MEJORA ROBUSTEZ CLICK:
+            # scr es numpy array (CV2). Usar shape (h, w).
+            screen_h, screen_w = scr.shape[:2]
+            click_x = rx + rw // 2
+            click_y = ry + rh // 2
+            
+            self.log(f"✅ Ciudad '{city}' encontrada. Click ROBUSTO en fila: ({click_x},{click_y}) (Text: {rx},{ry})")
+            
+            # Single Tap Robusto (100ms swipe)
+            self.device_tap(click_x, click_y)
+            
+            # Guardar en memoria para próxima vez (guardamos rx/ry originales del texto)
+            # SOLO si funciona (lo hacemos tras verificacion), pero aqui guardamos provisionalmente
+            # para validacion. Si falla, borraremos.
+            
+            self.current_timezone_state = target
+            self.adb.invalidate("timezone")
+            
+            # VERIFICACIÓN DE RETORNO A "SELECCIONAR ZONA HORARIA"
+            # Esperar hasta que volvamos a la pantalla anterior
+            self.log(f"Esperando retorno a pantalla Settings...")
+            # Sin máscara: los rectángulos de la blacklist contarían como cambio
+            self.wait_for_change(1.5, before=before_tap, settle=WAIT_SETTLE)
+            
+            def settings_visible():
+                scr_check = self.capture()
+                texts = self.ocr.get_screen_texts(scr_check, targets=("Seleccionar", "Fecha", "Date"),
+                                                  key="ocr_tz_retorno")
+                self.log(f"🔎 DEBUG RETURN OCR: {[t[0] for t in texts]}") # DEBUG
+                # IMPORTANTE: OCR devuelve palabras sueltas. No buscar frases.
+                # Buscamos "Fecha" o "Seleccionar".
+                return any("Seleccionar" in t[0] or "Fecha" in t[0] or "Date" in t[0] for t in texts)
+            
+            found_return = self.wait_until(settings_visible, 5.0, poll=0.5) # 5s timeout
+            if found_return:
+                 self.log("✅ Detectada pantalla de ajustes. Cambio confirmado.")
+            
+            if found_return:
+                self.log(f"Zona cambiada a {city}. Volviendo al juego...")
+                self.logger.save_ocr_memory(memory_key, city, rx, ry, rw, rh, threshold_used) # CONFIRMAMOS MEMORIA
+                self.state = BotState.TZ_RETURN_GAME
+            else:
+                self.log(f"❌ Click en '{city}' falló (No volvimos a Settings). Blacklisting zona y reintentando...")
+                
+                # 1. Borrar memoria (era mala)
+                self.logger.save_ocr_memory(memory_key, "", 0, 0, 0, 0, 0)
+                
+                # 2. BLACKLIST: Añadir esta zona para no volver a clickarla
+                self.state_data["city_blacklist"].append((rx, ry, rw, rh))
+                
+                time.sleep(1)
+        else:
+            # SIN FALLBACK: Quedarse en el estado para reintentar
+            self.log(f"❌ No se pudo encontrar ciudad '{city}' tras OCR adaptativo (Masked). Reintentando...")
+            
+            # Si la blacklist está llena y no encontramos nada, quizás limpiar blacklist?
+            if len(self.state_data["city_blacklist"]) > 0:
+                self.log("⚠ No encuentro nada y tengo blacklist. Limpiando blacklist por si acaso.")
+                self.state_data["city_blacklist"] = []
+                
+            time.sleep(2)
+
+    def handle_tz_return_game(self, screenshot):
+        """Sub-máquina Timezone: cierra Ajustes y vuelve al juego."""
+        self.log("Resumiendo juego (Bring to Front)...")
+        
+        # OPTIMIZATION PROACTIVE: 
+        # 1. Matar Ajustes para asegurar focus
+        self.adb.stop_app("com.android.settings")
+        time.sleep(0.5)
+        
+        # 2. Lanzar juego con Monkey (más robusto que am start directo)
+        self.adb.start_app(PACKAGE_NAME)
+        
+        self.wait_until(self._game_in_front, 4, poll=0.5) # Esperar resume
+        self._log_wait_cycle("zona horaria")
+        self.state_data.clear() # Limpiar objetivo para siguiente ciclo
+        self.state = BotState.GAME_LOBBY
 
 if __name__ == "__main__":
     # Modo CLI Legacy
@@ -10,6 +10,10 @@ import datetime
 import cv2
 import numpy as np
 import json
+from frame import as_frame
+
+# Entrada del modelo (w, h): capturas en gris a 160x90
+MODEL_INPUT_SIZE = (160, 90)
 
 class MLLogger:
     def __init__(self, db_path="ml_data.db", screenshots_dir="training_data"):
@@ -123,11 +127,9 @@ class MLLogger:
             filename = f"{self.session_id}_{self.transition_count:06d}_{state_before_str}_{action_str}.jpg"
             screenshot_path = os.path.join(self.screenshots_dir, filename)
             try:
-                # Convertir a escala de grises
-                gray = cv2.cvtColor(screenshot, cv2.COLOR_BGR2GRAY)
-                
-                # Resize al tamano exacto del modelo (160x90)
-                gray = cv2.resize(gray, (160, 90))
+                # Escala de grises al tamano exacto del modelo (160x90).
+                # Vista cacheada de la captura: la comparte el monitor en vivo.
+                gray = as_frame(screenshot).resized(MODEL_INPUT_SIZE, gray=True)
                 
                 # Guardar como JPEG calidad 90% (a este tamano el archivo es muy pequeno)
                 cv2.imwrite(screenshot_path, gray, [cv2.IMWRITE_JPEG_QUALITY, 90])
@@ -1,32 +1,335 @@
-import pytesseract
 from PIL import Image
 import cv2
 import numpy as np
+import multiprocessing
+import os
 import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+import config
+from frame import Frame, as_frame
+from ocr_cache import OCRCache, content_key
+from ocr_engine import ENGINES, TSV_COLUMNS, create_engine
+
+# Pasadas de OCR (binarizaciones de la captura). Su código se guarda en la
+# columna threshold de ocr_memory para empezar por la que acertó la última vez:
+# 1-255 = binarización invertida con ese umbral, negativos = pasadas especiales
+# (-1 ya era la pasada OTSU/gris de find_text_adaptive).
+PASS_OTSU = -1
+PASS_GRAY = -2
+PASS_NORMAL = -3
+PASS_NAMES = {PASS_OTSU: "otsu", PASS_GRAY: "gris", PASS_NORMAL: "normal 150"}
+
+# Orden por defecto de las pasadas multi-pass (invertido, gris, normal, Otsu)
+SCREEN_PASSES = [150, PASS_GRAY, PASS_NORMAL, PASS_OTSU]
+
+
+def pass_name(code):
+    return PASS_NAMES.get(code, f"inv {code}")
+
+
+def detect_text_lines(gray, min_y=0):
+    """
+    Localiza líneas de texto candidatas (barato, sin OCR): gradiente morfológico,
+    binarización Otsu, cierre horizontal para unir letras y palabras, y
+    componentes conexas filtradas por alto y relleno. Los trazos de las letras dan
+    gradiente con independencia del color del texto y del fondo.
+    Retorna cajas (x, y, w, h) con margen, de arriba a abajo.
+    """
+    h_img, w_img = gray.shape[:2]
+    gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT,
+                                cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+    _, mask = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    # Cierre horizontal (~1/60 del alto): une las letras de una línea, no las líneas
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE,
+                            cv2.getStructuringElement(cv2.MORPH_RECT, (max(9, h_img // 60), 1)))
+    _, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+
+    pad = config.OCR_LINE_PAD
+    boxes = []
+    for x, y, w, h, area in stats[1:]:
+        if not config.OCR_LINE_MIN_HEIGHT <= h <= h_img // 6: continue
+        if w < 10 or w < h * 0.8: continue # Las líneas son más anchas que altas
+        if area < config.OCR_LINE_MIN_FILL * w * h: continue
+        if y + h // 2 < min_y: continue
+        x1, y1 = max(0, x - pad), max(0, y - pad)
+        x2, y2 = min(w_img, x + w + pad), min(h_img, y + h + pad)
+        boxes.append((int(x1), int(y1), int(x2 - x1), int(y2 - y1)))
+    return sorted(boxes, key=lambda box: (box[1], box[0]))
+
+
+def pass_image(frame, code):
+    """Imagen de la pasada (vistas cacheadas de la captura)."""
+    if code == PASS_GRAY:
+        return frame.gray
+    if code == PASS_OTSU:
+        return frame.threshold(0, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    if code == PASS_NORMAL:
+        return frame.threshold(150, cv2.THRESH_BINARY)
+    return frame.threshold(code, cv2.THRESH_BINARY_INV)
+
+
+def pass_input(frame, code, roi=None, regions=None):
+    """
+    Entrada del backend para una pasada: (imágenes, llamada). "data" = la
+    imagen (o su ROI) entera; "lines" = los recortes de las líneas detectadas.
+    """
+    image = pass_image(frame, code)
+    if roi is not None:
+        image = image[roi]
+    if regions is None:
+        return [image], "data"
+    return [image[y:y + h, x:x + w] for x, y, w, h in regions], "lines"
+
+
+def read_input(engine, images, call):
+    """Salida cruda del backend: dict de image_to_data o lista de dicts (uno por recorte)."""
+    if call == "data":
+        return engine.image_to_data(images[0])
+    return engine.lines_to_data(images)
+
+
+# =========================================================================
+# POOL DE PROCESOS
+# =========================================================================
+
+_worker_engine = None # Backend propio de cada proceso del pool
+
+
+def _init_worker(engine_name, lang):
+    """Inicializador de los procesos del pool: tesserocr carga el modelo una vez por proceso."""
+    global _worker_engine
+    _worker_engine = ENGINES[engine_name](lang)
+
+
+def _pass_task(shared, code, roi, regions):
+    """Tarea del pool: una pasada (o parte de sus recortes) sobre el gris compartido."""
+    name, shape, dtype = shared
+    shm = shared_memory.SharedMemory(name=name) # Lo libera quien lo creó (SharedFrame)
+    try:
+        images, call = pass_input(Frame(np.ndarray(shape, dtype, buffer=shm.buf)), code, roi, regions)
+        data = read_input(_worker_engine, images, call)
+        del images # Sin vistas del buffer antes de cerrarlo
+        return data
+    finally:
+        try:
+            shm.close()
+        except BufferError:
+            pass # Tras un error quedan vistas vivas en la traza; se cierra al salir
+
+
+class SharedFrame:
+    """
+    Gris de la captura en memoria compartida: las tareas del pool reciben solo su
+    nombre y forma en vez de la imagen serializada (~2.6 MB en gris, ~7.8 MB en
+    BGR a 2400x1080 por tarea). Se libera cuando terminan todas sus tareas y el
+    llamador ha llamado a release().
+    """
+    def __init__(self, image):
+        self._shm = shared_memory.SharedMemory(create=True, size=max(1, image.nbytes))
+        np.ndarray(image.shape, image.dtype, buffer=self._shm.buf)[:] = image
+        self.desc = (self._shm.name, image.shape, image.dtype.str)
+        self._users = 1 # El llamador
+        self._lock = threading.Lock()
+
+    def submit(self, executor, fn, *args):
+        """executor.submit(fn, desc, *args), reteniendo la memoria hasta que la tarea acabe."""
+        with self._lock:
+            self._users += 1
+        try:
+            future = executor.submit(fn, self.desc, *args)
+        except Exception:
+            self.release()
+            raise
+        future.add_done_callback(lambda f: self.release())
+        return future
+
+    def release(self):
+        with self._lock:
+            self._users -= 1
+            if self._users:
+                return
+        self._shm.close()
+        self._shm.unlink()
+
 
 class OCR:
-    def __init__(self):
-        # Si tesseract no está en el PATH, descomentar y ajustar ruta:
+    def __init__(self, engine=None, memory=None, log=None, cache=None, workers=None):
+        # Backend (ocr_engine.py): tesserocr en proceso o pytesseract de respaldo.
+        # Si tesseract no está en el PATH (pytesseract), descomentar y ajustar ruta:
         # pytesseract.pytesseract.tesseract_cmd = r'/usr/bin/tesseract'
-        pass
+        self.engine = engine or create_engine()
+        self.memory = memory # GoldLogger (ocr_memory): pasada que acertó por clave
+        self.log = log or print
+        # Resultados por contenido de la pasada (ocr_cache.py); con GoldLogger, también en disco
+        self.cache = cache or OCRCache(store=memory if config.OCR_CACHE_DB else None)
+
+        # Pool de procesos para las pasadas (Tesseract no suelta la CPU a otros hilos
+        # con pytesseract ni comparte la API de tesserocr). Cada proceso crea su
+        # backend, así que solo vale para los backends de ocr_engine.ENGINES.
+        self.workers = workers if workers is not None else config.OCR_WORKERS
+        if self.workers is None:
+            self.workers = os.cpu_count() or 1
+        self._executor = None
+        if self.workers > 1 and type(self.engine) is ENGINES.get(getattr(self.engine, "name", None)):
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker, initargs=(self.engine.name, self.engine.lang))
+
+    def shutdown(self):
+        """Libera el pool de procesos (si se creó)."""
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    # =========================================================================
+    # PASADAS
+    # =========================================================================
+
+    def learned_pass(self, key):
+        """Pasada que acertó la última vez para key (None si no hay)."""
+        if key is None or self.memory is None:
+            return None
+        memory = self.memory.get_ocr_memory(key)
+        return memory["threshold"] if memory and memory["threshold"] else None
+
+    @staticmethod
+    def _ordered(passes, first):
+        """Pasadas con `first` (la aprendida) delante."""
+        if first is None:
+            return list(passes)
+        return [first] + [code for code in passes if code != first]
+
+    def text_regions(self, frame, min_y=0):
+        """Líneas de texto de la captura (None = OCR de la pantalla entera)."""
+        if not config.OCR_TEXT_REGIONS:
+            return None
+        return detect_text_lines(frame.gray, min_y) or None # Sin líneas: pantalla entera
+
+    @staticmethod
+    def _merge_lines(regions, lines):
+        """
+        Une la salida de lines_to_data (un dict por recorte) en un único dict como
+        image_to_data, en coordenadas de pantalla y con line_num = nº de recorte
+        (las palabras de un recorte comparten línea).
+        """
+        data = {column: [] for column in TSV_COLUMNS}
+        for line, ((x, y, w, h), crop_data) in enumerate(zip(regions, lines), 1):
+            for i in range(len(crop_data["text"])):
+                for column in TSV_COLUMNS:
+                    data[column].append(crop_data[column][i])
+                data["left"][-1] += x
+                data["top"][-1] += y
+                data["line_num"][-1] = line
+        return data
+
+    def _mode(self, call):
+        """Configuración de OCR que entra en la clave de la caché (mismo backend, idioma y llamada)."""
+        return f"{self.engine.name}:{self.engine.lang}:{call}"
+
+    def _serial_reads(self, frame, passes, roi, regions):
+        """(código, salida cruda) de cada pasada, en orden y solo cuando se pide."""
+        for code in passes:
+            images, call = pass_input(frame, code, roi, regions)
+            yield code, self.cache.fetch(images, self._mode(call), lambda: read_input(self.engine, images, call))
+
+    def _pool_reads(self, frame, passes, roi, regions):
+        """
+        Como _serial_reads, pero lee en el pool las pasadas que no están en la
+        caché (con recortes, repartidos entre los procesos libres) y las entrega en
+        orden. La primera (la aprendida) se lanza sola; las demás, todas a la vez,
+        solo si found() no acierta con ella. Al cerrar el generador (salida
+        temprana) se cancela lo pendiente.
+        """
+        pending = [] # (código, clave de caché, futures o None, salida cacheada)
+        shared = None
+        try:
+            for wave in (passes[:1], passes[1:]):
+                pending = []
+                chunks = max(1, self.workers // max(1, len(wave)))
+                for code in wave:
+                    images, call = pass_input(frame, code, roi, regions)
+                    key = content_key(images, self._mode(call))
+                    cached = self.cache.get(key)
+                    futures = None
+                    if cached is None:
+                        if shared is None:
+                            shared = SharedFrame(frame.gray)
+                        if regions is None:
+                            parts = [None]
+                        else:
+                            n = min(chunks, len(regions))
+                            parts = [regions[i * len(regions) // n:(i + 1) * len(regions) // n] for i in range(n)]
+                        futures = [shared.submit(self._executor, _pass_task, code, roi, part) for part in parts]
+                    pending.append((code, key, futures, cached))
+
+                for code, key, futures, cached in pending:
+                    if futures is not None:
+                        results = [f.result() for f in futures]
+                        cached = results[0] if regions is None else [line for part in results for line in part]
+                        self.cache.put(key, cached)
+                    yield code, cached
+        finally:
+            for _, _, futures, _ in pending:
+                for f in futures or ():
+                    f.cancel()
+            if shared is not None:
+                shared.release()
+
+    def _run_passes(self, frame, passes, found, roi=None, regions=None):
+        """
+        Ejecuta las pasadas en orden hasta que found(data) devuelva algo distinto
+        de None (salida temprana). Con regions (cajas de detect_text_lines) solo se
+        leen esos recortes. Con pool, las pasadas se leen a la vez pero found las
+        recibe en el mismo orden que en serie (mismo resultado).
+        Retorna (resultado, código de la pasada, nº de pasadas).
+        """
+        if self._executor and (len(passes) > 1 or (regions and len(regions) > 1)):
+            try:
+                return self._first_hit(self._pool_reads(frame, passes, roi, regions), found, regions, len(passes))
+            except BrokenProcessPool as e:
+                self.log(f"⚠ Pool de OCR caído ({e}). Pasadas en serie.")
+                self.shutdown()
+        return self._first_hit(self._serial_reads(frame, passes, roi, regions), found, regions, len(passes))
+
+    def _first_hit(self, reads, found, regions, total):
+        try:
+            for count, (code, raw) in enumerate(reads, 1):
+                result = found(raw if regions is None else self._merge_lines(regions, raw))
+                if result is not None:
+                    return result, code, count
+            return None, None, total
+        finally:
+            reads.close()
+
+    def _finish(self, label, key, code, count, total, learned=None):
+        """
+        Log de pasadas usadas y, con key, aprende la pasada que acertó si no es
+        la ya aprendida (learned, leída al ordenar las pasadas).
+        """
+        if code is None:
+            self.log(f"🔤 OCR '{label}': sin acierto en {count} pasadas")
+            return
+        self.log(f"🔤 OCR '{label}': {count}/{total} pasadas (acierto: {pass_name(code)})")
+        if key is not None and self.memory is not None and code != learned:
+            self.memory.save_ocr_pass(key, code)
 
     def preprocess_image(self, cv2_image):
         """Mejora la imagen para OCR (skala de grises, umbralización)."""
-        gray = cv2.cvtColor(cv2_image, cv2.COLOR_BGR2GRAY)
         # Aplicar umbralización para resaltar texto negro/blanco
         # Ajustar si el texto es blanco sobre fondo oscuro o al revés.
         # En RR3 suele ser texto blanco.
-        _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY_INV) 
-        return thresh
+        return as_frame(cv2_image).threshold(150, cv2.THRESH_BINARY_INV)
 
     def read_text(self, cv2_image):
         """Lee texto genérico de una imagen."""
         if cv2_image is None:
             return ""
         
-        # Pytesseract espera PIL Image o numpy array
-        # Convertir BGR a RGB para PIL si fuera necesario, pero pytesseract maneja numpy.
-        text = pytesseract.image_to_string(cv2_image)
+        # Ambos backends aceptan el array numpy directamente
+        text = self.engine.image_to_string(cv2_image)
         return text.strip()
 
     def extract_gold_amount(self, cv2_image):
@@ -39,7 +342,7 @@ class OCR:
         
         # Configuración para buscar solo números o texto específico podría ayudar
         # psm 6: Assume a single uniform block of text.
-        text = pytesseract.image_to_string(cv2_image, config='--psm 6')
+        text = self.engine.image_to_string(cv2_image, psm=6)
         
         # Buscar patrón numérico cerca de keywords "Gold", "Oro", "GC", "R$" (si fuera dinero, pero buscamos oro)
         # RR3 dice algo como "5 Gold" o solo el numero grande.
@@ -59,16 +362,17 @@ class OCR:
         
         return 0
 
-    def find_text(self, cv2_image, search_text, exact_match=False, case_sensitive=False):
-        """Busca texto en la imagen y devuelve coordenadas (x, y) del centro. Multi-pass."""
+    def find_text(self, cv2_image, search_text, exact_match=False, case_sensitive=False, key=None):
+        """
+        Busca texto en la imagen y devuelve coordenadas (x, y) del centro. Multi-pass:
+        para en la primera pasada que lo encuentra; con key empieza por la que acertó antes.
+        """
         if cv2_image is None: return None
         
-        # Estrategia Multi-pass:
-        gray = cv2.cvtColor(cv2_image, cv2.COLOR_BGR2GRAY)
-        _, thresh_inv = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY_INV)
-        _, thresh_norm = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY)
-        
-        images_to_try = [thresh_inv, gray, thresh_norm]
+        # Estrategia Multi-pass (vistas cacheadas de la captura): invertido, gris, normal
+        frame = as_frame(cv2_image)
+        learned = self.learned_pass(key)
+        passes = self._ordered(SCREEN_PASSES[:3], learned)
         
         # Palabras clave de búsqueda
         if case_sensitive:
@@ -79,13 +383,7 @@ class OCR:
              search_words = [w.lower() for w in search_text.split() if len(w) > 3]
              if not search_words: search_words = [w.lower() for w in search_text.split()]
         
-        for idx, img_pass in enumerate(images_to_try):
-            if len(img_pass.shape) == 2:
-                img_rgb = cv2.cvtColor(img_pass, cv2.COLOR_GRAY2RGB)
-            else:
-                img_rgb = img_pass
-
-            data = pytesseract.image_to_data(img_rgb, output_type=pytesseract.Output.DICT)
+        def found(data):
             n_boxes = len(data['text'])
             
             for i in range(n_boxes):
@@ -113,10 +411,13 @@ class OCR:
                     # Encontramos match
                     x, y, w, h = data['left'][i], data['top'][i], data['width'][i], data['height'][i]
                     return (x + w // 2, y + h // 2)
-                    
-        return None
+            return None
+
+        coords, code, count = self._run_passes(frame, passes, found)
+        self._finish(search_text, key, code, count, len(passes), learned)
+        return coords
 
-    def find_phrase(self, cv2_image, phrase, case_sensitive=False):
+    def find_phrase(self, cv2_image, phrase, case_sensitive=False, key=None):
         """Busca una frase exacta (secuencia de palabras en la misma línea). Devuelve centro (x,y)."""
         if cv2_image is None: return None
         
@@ -125,103 +426,94 @@ class OCR:
         if not case_sensitive:
             target_words = [w.lower() for w in target_words]
             
-        gray = cv2.cvtColor(cv2_image, cv2.COLOR_BGR2GRAY)
-        # Probamos par de umbrales por robustez
-        _, thresh_inv = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY_INV)
-        _, thresh_norm = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY)
+        frame = as_frame(cv2_image)
+        # Probamos par de umbrales por robustez (invertido, gris, normal)
+        learned = self.learned_pass(key)
+        passes = self._ordered(SCREEN_PASSES[:3], learned)
         
-        for img_pass in [thresh_inv, gray, thresh_norm]:
-             if len(img_pass.shape) == 2:
-                 img_rgb = cv2.cvtColor(img_pass, cv2.COLOR_GRAY2RGB)
-             else:
-                 img_rgb = img_pass
-                 
-             data = pytesseract.image_to_data(img_rgb, output_type=pytesseract.Output.DICT)
-             n_boxes = len(data['text'])
-             
-             # Recorremos buscando la primera palabra
-             for i in range(n_boxes):
-                 word = data['text'][i].strip()
-                 if not word: continue
-                 
-                 curr_word = word if case_sensitive else word.lower()
-                 
-                 # Chequeo primera palabra match
-                 if curr_word == target_words[0]:
-                     # Candidato encontrado. Verificar resto de palabras
-                     match_full = True
-                     combined_w = data['width'][i]
-                     
-                     current_idx = i
-                     for j in range(1, len(target_words)):
-                         next_idx = current_idx + 1
-                         if next_idx >= n_boxes:
-                             match_full = False
-                             break
-                             
-                         # Verificar que sigamos en la misma linea y bloque (aproximado)
-                         # Tesseract usa line_num
-                         if data['line_num'][next_idx] != data['line_num'][current_idx]:
-                             match_full = False
-                             break
-                             
-                         next_word_raw = data['text'][next_idx].strip()
-                         next_word = next_word_raw if case_sensitive else next_word_raw.lower()
-                         
-                         if next_word != target_words[j]:
-                             match_full = False
-                             break
-                             
-                         # Acumular ancho para el centro final
-                         # Asumimos que están adyacentes horizontalmente
-                         # Distancia entre palabras?
-                         dist = data['left'][next_idx] - (data['left'][current_idx] + data['width'][current_idx])
-                         if dist > 100: # Si están muy lejos, no es frase
-                             match_full = False
-                             break
-                             
-                         combined_w = (data['left'][next_idx] + data['width'][next_idx]) - data['left'][i]
-                         current_idx = next_idx
-                         
-                     if match_full:
-                         # Calcular centro de TODA la frase
-                         x = data['left'][i]
-                         y = data['top'][i] # Usamos top del primero
-                         h = data['height'][i] # Altura del primero
-                         
-                         return (x + combined_w // 2, y + h // 2)
-                         
-        return None
+        def found(data):
+            n_boxes = len(data['text'])
+            
+            # Recorremos buscando la primera palabra
+            for i in range(n_boxes):
+                word = data['text'][i].strip()
+                if not word: continue
+                
+                curr_word = word if case_sensitive else word.lower()
+                
+                # Chequeo primera palabra match
+                if curr_word == target_words[0]:
+                    # Candidato encontrado. Verificar resto de palabras
+                    match_full = True
+                    combined_w = data['width'][i]
+                    
+                    current_idx = i
+                    for j in range(1, len(target_words)):
+                        next_idx = current_idx + 1
+                        if next_idx >= n_boxes:
+                            match_full = False
+                            break
+                            
+                        # Verificar que sigamos en la misma linea y bloque (aproximado)
+                        # Tesseract usa line_num
+                        if data['line_num'][next_idx] != data['line_num'][current_idx]:
+                            match_full = False
+                            break
+                            
+                        next_word_raw = data['text'][next_idx].strip()
+                        next_word = next_word_raw if case_sensitive else next_word_raw.lower()
+                        
+                        if next_word != target_words[j]:
+                            match_full = False
+                            break
+                            
+                        # Acumular ancho para el centro final
+                        # Asumimos que están adyacentes horizontalmente
+                        # Distancia entre palabras?
+                        dist = data['left'][next_idx] - (data['left'][current_idx] + data['width'][current_idx])
+                        if dist > 100: # Si están muy lejos, no es frase
+                            match_full = False
+                            break
+                            
+                        combined_w = (data['left'][next_idx] + data['width'][next_idx]) - data['left'][i]
+                        current_idx = next_idx
+                        
+                    if match_full:
+                        # Calcular centro de TODA la frase
+                        x = data['left'][i]
+                        y = data['top'][i] # Usamos top del primero
+                        h = data['height'][i] # Altura del primero
+                        
+                        return (x + combined_w // 2, y + h // 2)
+                        
+            return None
 
-    def get_screen_texts(self, cv2_image, min_y=0):
+        center, code, count = self._run_passes(frame, passes, found)
+        self._finish(phrase, key, code, count, len(passes), learned)
+        return center
+
+    def get_screen_texts(self, cv2_image, min_y=0, targets=None, key=None):
         """Devuelve lista de (texto, x, y, w, h) de toda la pantalla.
-           Usa estrategia Multi-pass para asegurar que no se pierden textos."""
+           Usa estrategia Multi-pass para asegurar que no se pierden textos.
+           Solo se leen las líneas de texto detectadas (detect_text_lines).
+           Con targets (palabras buscadas) para en la primera pasada que lee
+           alguna; con key empieza por la pasada que acertó la última vez."""
         if cv2_image is None: return []
 
-        # Estrategia Multi-pass idéntica a find_text
-        gray = cv2.cvtColor(cv2_image, cv2.COLOR_BGR2GRAY)
-        _, thresh_inv = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY_INV)
-        _, thresh_norm = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY)
-        # Pass 4: Otsu (Dynamic Thresholding)
-        _, thresh_otsu = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        
+        # Estrategia Multi-pass (vistas cacheadas de la captura):
         # Probar Invertido (mejor contraste), luego Gray (suave), luego Normal, luego Otsu
-        images_to_try = [thresh_inv, gray, thresh_norm, thresh_otsu]
+        frame = as_frame(cv2_image)
+        learned = self.learned_pass(key)
+        passes = self._ordered(SCREEN_PASSES, learned)
+        wanted = [t.lower() for t in targets] if targets else None
         
         results_set = set() # Evitar duplicados (usaremos key: "text_x_y")
         results_list = []
         
-        for img_pass in images_to_try:
-            # Pytesseract espera imagen (el wrapper lo gestiona o lo pasamos como RGB)
-            if len(img_pass.shape) == 2:
-                img_rgb = cv2.cvtColor(img_pass, cv2.COLOR_GRAY2RGB)
-            else:
-                img_rgb = img_pass
-
-            # psm 11: Sparse text. Busca tanto texto como sea posible sin asumir orden.
-            # default (3) a veces falla en listas dispersas. Probar config default primero.
-            data = pytesseract.image_to_data(img_rgb, output_type=pytesseract.Output.DICT)
+        def collect(data):
+            # psm 3 (default). psm 11 (sparse) sería otra opción para listas dispersas.
             n_boxes = len(data['text'])
+            hit = None
             
             for i in range(n_boxes):
                 text = data['text'][i].strip()
@@ -237,11 +529,18 @@ class OCR:
                 # Deduplication key based on rough proximity to combine passes
                 # Usamos una clave laxa para evitar el mismo texto en exacto mismo sitio
                 # (Texto, X//10, Y//10)
-                key = (text, x // 20, y // 20)
+                dedup_key = (text, x // 20, y // 20)
                 
-                if key not in results_set:
-                    results_set.add(key)
+                if dedup_key not in results_set:
+                    results_set.add(dedup_key)
                     results_list.append((text, x, y, w, h))
+                if wanted and any(t in text.lower() for t in wanted):
+                    hit = True
+            return hit # None = seguir con la siguiente pasada
+        
+        _, code, count = self._run_passes(frame, passes, collect, regions=self.text_regions(frame, min_y))
+        if wanted:
+            self._finish("/".join(targets), key, code, count, len(passes), learned)
                 
         # Ordenar por verticalidad (arriba a abajo)
         return sorted(results_list, key=lambda tx: tx[2])
@@ -250,82 +549,38 @@ class OCR:
         """Devuelve líneas de texto completas de la imagen."""
         if cv2_image is None: return []
         
-        rgb = cv2.cvtColor(cv2_image, cv2.COLOR_BGR2RGB)
+        rgb = as_frame(cv2_image).rgb
         # psm 6: Assume a single uniform block of text.
-        text = pytesseract.image_to_string(rgb, config='--psm 6')
+        text = self.engine.image_to_string(rgb, psm=6)
         
         lines = [line.strip() for line in text.split('\n') if line.strip()]
         return lines
 
-    def find_text_adaptive(self, cv2_image, search_text, hint_coords=None, thresholds=None):
+    def find_text_adaptive(self, cv2_image, search_text, hint_coords=None, thresholds=None, first_pass=None):
         """
         Busca texto con sensibilidad adaptativa.
         1. Si hint_coords (x, y, w, h) se proporciona, primero busca en esa región.
         2. Si no se encuentra, itera por diferentes umbrales de binarización.
+        3. Por último, pasadas OTSU y gris.
+        La búsqueda completa lee solo las líneas de texto detectadas.
+        first_pass (el threshold guardado en ocr_memory) se prueba primero en
+        cada paso; se para en la primera pasada que encuentra el texto.
         
-        Retorna: (x, y, w, h, threshold_used) o None si no se encuentra.
+        Retorna: (x, y, w, h, pasada) o None si no se encuentra. La pasada es el
+        umbral usado o un código PASS_* (guardar en ocr_memory como threshold).
         """
         if cv2_image is None:
             return None
         
         if thresholds is None:
             thresholds = [150, 100, 200, 80, 180, 120]  # Default sensitivity range
+        first_pass = first_pass or None # 0 = sin pasada aprendida
         
         search_lower = search_text.lower()
         h_img, w_img = cv2_image.shape[:2]
+        frame = as_frame(cv2_image)
         
-        # --- Paso 1: Buscar en hint_coords si existen ---
-        if hint_coords:
-            hx, hy, hw, hh = hint_coords
-            # Expandir el ROI un poco para tolerancia
-            margin = 50
-            x1 = max(0, hx - margin)
-            y1 = max(0, hy - margin)
-            x2 = min(w_img, hx + hw + margin)
-            y2 = min(h_img, hy + hh + margin)
-            
-            roi = cv2_image[y1:y2, x1:x2]
-            
-            # Probar con el umbral recordado primero (si hint_coords incluye threshold)
-            gray_roi = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
-            for thresh_val in thresholds[:2]:  # Solo los primeros 2 en ROI
-                _, thresh_img = cv2.threshold(gray_roi, thresh_val, 255, cv2.THRESH_BINARY_INV)
-                img_rgb = cv2.cvtColor(thresh_img, cv2.COLOR_GRAY2RGB)
-                
-                data = pytesseract.image_to_data(img_rgb, output_type=pytesseract.Output.DICT)
-                for i in range(len(data['text'])):
-                    raw_text = data['text'][i].strip().lower()
-                    if not raw_text: continue
-                    
-                    # Match Logic:
-                    # 1. Exact match (insensitive)
-                    # 2. Search term inside detected text (e.g. "Madrid" in "Madrid (GMT+1)")
-                    # 3. Detected text inside Search term ONLY if detected is long enough (avoid "a" in "Madrid")
-                    match = False
-                    if search_lower == raw_text:
-                        match = True
-                    elif search_lower in raw_text:
-                        match = True
-                    elif len(raw_text) > 3 and raw_text in search_lower:
-                        match = True
-                        
-                    if match:
-                        # Encontrado en ROI
-                        lx, ly, lw, lh = data['left'][i], data['top'][i], data['width'][i], data['height'][i]
-                        # Ajustar coordenadas al marco completo
-                        abs_x = x1 + lx
-                        abs_y = y1 + ly
-                        print(f"OCR Adaptive: Encontrado '{search_text}' en hint ROI @ ({abs_x},{abs_y}) thresh={thresh_val}")
-                        return (abs_x, abs_y, lw, lh, thresh_val)
-        
-        # --- Paso 2: Búsqueda completa con umbral variable ---
-        gray = cv2.cvtColor(cv2_image, cv2.COLOR_BGR2GRAY)
-        
-        for thresh_val in thresholds:
-            _, thresh_img = cv2.threshold(gray, thresh_val, 255, cv2.THRESH_BINARY_INV)
-            img_rgb = cv2.cvtColor(thresh_img, cv2.COLOR_GRAY2RGB)
-            
-            data = pytesseract.image_to_data(img_rgb, output_type=pytesseract.Output.DICT)
+        def locate(data):
             for i in range(len(data['text'])):
                 # Filter bad confidence (blocks)
                 if 'conf' in data:
@@ -338,6 +593,10 @@ class OCR:
                 raw_text = data['text'][i].strip().lower()
                 if not raw_text: continue
                 
+                # Match Logic:
+                # 1. Exact match (insensitive)
+                # 2. Search term inside detected text (e.g. "Madrid" in "Madrid (GMT+1)")
+                # 3. Detected text inside Search term ONLY if detected is long enough (avoid "a" in "Madrid")
                 match = False
                 if search_lower == raw_text:
                     match = True
@@ -347,43 +606,48 @@ class OCR:
                     match = True
                     
                 if match:
-                    lx, ly, lw, lh = data['left'][i], data['top'][i], data['width'][i], data['height'][i]
-                    print(f"OCR Adaptive: Encontrado '{search_text}' (Raw: '{raw_text}') @ ({lx},{ly}) thresh={thresh_val}")
-                    return (lx, ly, lw, lh, thresh_val)
+                    return (data['left'][i], data['top'][i], data['width'][i], data['height'][i], raw_text)
+            return None
         
-        # Paso 3: Probar también con OTSU y normal
-        _, thresh_otsu = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        for img_pass in [thresh_otsu, gray]:
-            if len(img_pass.shape) == 2:
-                img_rgb = cv2.cvtColor(img_pass, cv2.COLOR_GRAY2RGB)
-            else:
-                img_rgb = img_pass
+        used = 0
+        total = 0
+        
+        # --- Paso 1: Buscar en hint_coords si existen ---
+        if hint_coords:
+            hx, hy, hw, hh = hint_coords
+            # Expandir el ROI un poco para tolerancia
+            margin = 50
+            x1 = max(0, hx - margin)
+            y1 = max(0, hy - margin)
+            x2 = min(w_img, hx + hw + margin)
+            y2 = min(h_img, hy + hh + margin)
             
-            data = pytesseract.image_to_data(img_rgb, output_type=pytesseract.Output.DICT)
-            for i in range(len(data['text'])):
-                if 'conf' in data:
-                    try:
-                        conf = int(data['conf'][i])
-                        if conf == -1: continue
-                    except:
-                        pass
-                
-                raw_text = data['text'][i].strip().lower()
-                if not raw_text: continue
-                
-                match = False
-                if search_lower == raw_text:
-                    match = True
-                elif search_lower in raw_text:
-                    match = True
-                elif len(raw_text) > 3 and raw_text in search_lower:
-                    match = True
-
-                if match:
-                    lx, ly, lw, lh = data['left'][i], data['top'][i], data['width'][i], data['height'][i]
-                    print(f"OCR Adaptive: Encontrado '{search_text}' (Raw: '{raw_text}') @ ({lx},{ly}) (OTSU/Gray pass)")
-                    return (lx, ly, lw, lh, -1)  # -1 indica pass especial
+            # El ROI sale de la umbralización de la captura completa, que se
+            # comparte con el Paso 2 si hay que seguir buscando.
+            passes = self._ordered(thresholds[:2], first_pass)  # Solo los primeros 2 en ROI
+            total += len(passes)
+            found, code, count = self._run_passes(frame, passes, locate, roi=(slice(y1, y2), slice(x1, x2)))
+            used += count
+            if found:
+                # Encontrado en ROI: ajustar coordenadas al marco completo
+                lx, ly, lw, lh, raw_text = found
+                abs_x = x1 + lx
+                abs_y = y1 + ly
+                print(f"OCR Adaptive: Encontrado '{search_text}' en hint ROI @ ({abs_x},{abs_y}) thresh={code}")
+                self._finish(search_text, None, code, used, total)
+                return (abs_x, abs_y, lw, lh, code)
+        
+        # --- Paso 2 y 3: Búsqueda completa con umbral variable, luego OTSU y gris ---
+        passes = self._ordered(list(thresholds) + [PASS_OTSU, PASS_GRAY], first_pass)
+        total += len(passes)
+        found, code, count = self._run_passes(frame, passes, locate, regions=self.text_regions(frame))
+        used += count
+        if found:
+            lx, ly, lw, lh, raw_text = found
+            print(f"OCR Adaptive: Encontrado '{search_text}' (Raw: '{raw_text}') @ ({lx},{ly}) pasada={pass_name(code)}")
+            self._finish(search_text, None, code, used, total)
+            return (lx, ly, lw, lh, code)
         
         print(f"OCR Adaptive: No encontrado '{search_text}' tras todos los intentos.")
+        self._finish(search_text, None, None, used, total)
         return None
-
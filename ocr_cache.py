@@ -0,0 +1,92 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import config
+
+
+def content_key(images, mode):
+    """
+    Clave de contenido (blake2b) de una o varias imágenes ya preprocesadas (la
+    pasada o sus recortes) más la configuración de OCR que las lee (`mode`:
+    backend, idioma, psm...). Misma imagen y misma configuración = mismo resultado.
+    """
+    digest = hashlib.blake2b(mode.encode(), digest_size=16)
+    for image in images:
+        image = np.ascontiguousarray(image)
+        digest.update(f"{image.shape}{image.dtype}".encode())
+        digest.update(image.data)
+    return digest.hexdigest()
+
+
+class OCRCache:
+    """
+    Caché de resultados de OCR por contenido: LRU en memoria de los últimos
+    resultados y, opcionalmente, almacén en disco (tabla ocr_cache de GoldLogger,
+    junto a ocr_memory) que sobrevive entre secuencias y sesiones.
+
+    Los resultados son los de image_to_data / lines_to_data del backend (dicts y
+    listas de dicts serializables a JSON).
+    """
+    def __init__(self, size=None, store=None):
+        self.size = size if size is not None else config.OCR_CACHE_SIZE
+        self.store = store # GoldLogger (get_ocr_cache/save_ocr_cache) o None = solo memoria
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Resultado cacheado para key o None (cuenta acierto/fallo)."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        data = self.store.get_ocr_cache(key) if self.store is not None else None
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, data)
+        return data
+
+    def put(self, key, data):
+        with self._lock:
+            self._remember(key, data)
+        if self.store is not None:
+            self.store.save_ocr_cache(key, data)
+
+    def _remember(self, key, data):
+        if self.size <= 0:
+            return
+        self._entries[key] = data
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def fetch(self, images, mode, read):
+        """Resultado de read() para (images, mode), leyendo de la caché si ya se hizo."""
+        key = content_key(images, mode)
+        data = self.get(key)
+        if data is None:
+            data = read()
+            self.put(key, data)
+        return data
+
+    def stats(self):
+        """Aciertos en memoria y en disco, fallos, tasa de acierto y entradas en memoria."""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                    "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                    "entries": len(self._entries)}
+
+    def clear(self):
+        """Vacía la LRU en memoria (el almacén en disco se conserva)."""
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,193 @@
+import threading
+
+import numpy as np
+
+import config
+
+try:
+    import tesserocr  # Opcional: Tesseract en proceso (libtesseract)
+except ImportError:
+    tesserocr = None
+
+try:
+    import pytesseract
+except ImportError:
+    pytesseract = None
+
+# Columnas de image_to_data (formato TSV de Tesseract, igual que pytesseract)
+TSV_COLUMNS = ["level", "page_num", "block_num", "par_num", "line_num", "word_num",
+               "left", "top", "width", "height", "conf", "text"]
+
+# Margen (px) alrededor de cada recorte al apilarlos en una página (stack_lines)
+STACK_BORDER = 8
+
+
+class PytesseractEngine:
+    """
+    Backend clásico: cada llamada lanza el ejecutable `tesseract` (imagen a
+    fichero temporal y carga del modelo de idioma en cada pasada).
+    """
+    name = "pytesseract"
+
+    def __init__(self, lang=None):
+        self.lang = lang or config.OCR_LANG
+
+    @staticmethod
+    def available():
+        if pytesseract is None:
+            return False
+        try:
+            pytesseract.get_tesseract_version()
+            return True
+        except Exception:
+            return False
+
+    def image_to_data(self, image, psm=3):
+        """Palabras con caja y confianza: dict de listas (claves de TSV_COLUMNS)."""
+        return pytesseract.image_to_data(image, lang=self.lang, config=f"--psm {psm}",
+                                         output_type=pytesseract.Output.DICT)
+
+    def image_to_string(self, image, psm=3):
+        return pytesseract.image_to_string(image, lang=self.lang, config=f"--psm {psm}")
+
+    def lines_to_data(self, images):
+        """
+        image_to_data de varias líneas de texto (recortes) en una sola llamada:
+        se apilan en una página (psm 6, una línea por recorte) y cada palabra se
+        devuelve en el recorte que la contiene. Lista de dicts, uno por imagen.
+        """
+        page, offsets = stack_lines(images)
+        data = self.image_to_data(page, psm=6)
+        return split_lines(data, offsets)
+
+
+class TesserocrEngine:
+    """
+    Tesseract en proceso (tesserocr): el modelo se carga una sola vez y las
+    imágenes se pasan como buffer numpy (SetImageBytes), sin ficheros ni procesos.
+    Misma salida que pytesseract: image_to_data parsea el TSV de la propia API.
+    """
+    name = "tesserocr"
+
+    def __init__(self, lang=None):
+        self.lang = lang or config.OCR_LANG
+        self._api = tesserocr.PyTessBaseAPI(lang=self.lang)
+        self._lock = threading.Lock() # La API no admite llamadas concurrentes
+
+    @staticmethod
+    def available():
+        return tesserocr is not None
+
+    def _set_image(self, image, psm):
+        # Como pytesseract (PIL.Image.fromarray), los 3 canales se pasan tal cual
+        image = np.ascontiguousarray(image)
+        height, width = image.shape[:2]
+        channels = 1 if image.ndim == 2 else image.shape[2]
+        self._api.SetPageSegMode(psm)
+        self._api.SetImageBytes(image.tobytes(), width, height, channels, width * channels)
+
+    def image_to_data(self, image, psm=3):
+        """Palabras con caja y confianza: dict de listas (claves de TSV_COLUMNS)."""
+        with self._lock:
+            self._set_image(image, psm)
+            self._api.Recognize()
+            tsv = self._api.GetTSVText(0)
+        data = {column: [] for column in TSV_COLUMNS}
+        for row in tsv.splitlines():
+            values = row.split("\t")
+            if len(values) < len(TSV_COLUMNS):
+                values.append("") # Filas de bloque/línea sin texto
+            for column, value in zip(TSV_COLUMNS, values):
+                if column == "text":
+                    data[column].append(value)
+                elif column == "conf":
+                    data[column].append(float(value))
+                else:
+                    data[column].append(int(value))
+        return data
+
+    def image_to_string(self, image, psm=3):
+        with self._lock:
+            self._set_image(image, psm)
+            return self._api.GetUTF8Text()
+
+    def lines_to_data(self, images):
+        """image_to_data de cada recorte en modo línea única (psm 7), sin recargar el modelo."""
+        return [self.image_to_data(image, psm=7) for image in images]
+
+    def close(self):
+        self._api.End()
+
+
+def stack_lines(images, gap=None):
+    """
+    Apila recortes (mismo nº de canales) en una página para OCR por lotes.
+    Cada franja se rellena con el fondo de su recorte (mediana del borde).
+    Retorna (página, [(y inicial, alto)] por recorte).
+    """
+    border = STACK_BORDER
+    width = max(image.shape[1] for image in images) + 2 * border
+    rows, offsets, y = [], [], border
+    for image in images:
+        h = image.shape[0]
+        edge = np.concatenate([image[0], image[-1], image[:, 0], image[:, -1]])
+        background = np.median(edge, axis=0).astype(image.dtype)
+        space = gap if gap is not None else max(border, h // 2)
+        stripe = np.empty((h + space,) + (width,) + image.shape[2:], dtype=image.dtype)
+        stripe[:] = background
+        stripe[space // 2:space // 2 + h, border:border + image.shape[1]] = image
+        rows.append(stripe)
+        offsets.append((y + space // 2, h))
+        y += h + space
+    top = np.empty((border,) + rows[0].shape[1:], dtype=rows[0].dtype)
+    top[:] = rows[0][0]
+    return np.vstack([top] + rows), offsets
+
+
+def split_lines(data, offsets, border=STACK_BORDER):
+    """Reparte las palabras de la página apilada entre sus recortes (coordenadas del recorte)."""
+    per_line = [{column: [] for column in TSV_COLUMNS} for _ in offsets]
+    starts = [start for start, h in offsets]
+    for i, text in enumerate(data["text"]):
+        if not text.strip():
+            continue
+        center = data["top"][i] + data["height"][i] // 2
+        line = max(0, int(np.searchsorted(starts, center, side="right")) - 1)
+        start, h = offsets[line]
+        if not start - h // 2 <= center <= start + h + h // 2:
+            continue
+        for column in TSV_COLUMNS:
+            value = data[column][i]
+            if column == "left":
+                value -= border
+            elif column == "top":
+                value -= start
+            per_line[line][column].append(value)
+    return per_line
+
+
+ENGINES = {
+    TesserocrEngine.name: TesserocrEngine,
+    PytesseractEngine.name: PytesseractEngine,
+}
+
+
+def available_engines():
+    """Nombres de los backends utilizables en esta máquina (por preferencia)."""
+    return [name for name, engine in ENGINES.items() if engine.available()]
+
+
+def create_engine(name=None):
+    """
+    Backend de OCR según config.OCR_ENGINE ("auto", "tesserocr" o "pytesseract").
+    "auto" usa tesserocr si está instalado y si no (o si falla al cargar) pytesseract.
+    """
+    name = name or config.OCR_ENGINE
+    if name in ("auto", TesserocrEngine.name) and TesserocrEngine.available():
+        try:
+            return TesserocrEngine()
+        except Exception as e:
+            print(f"⚠ tesserocr no pudo iniciar Tesseract ({e}). Usando pytesseract.")
+    elif name == TesserocrEngine.name:
+        print("⚠ tesserocr no está instalado. Usando pytesseract.")
+    return PytesseractEngine()
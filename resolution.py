@@ -0,0 +1,52 @@
+import cv2
+import config
+from frame import as_frame
+
+
+class ScreenSpace:
+    """
+    Capa de resolución de trabajo entre la captura ADB y los detectores.
+
+    Las capturas se reducen una sola vez a la resolución de trabajo y todo el bot
+    (visión, OCR, ML, GUI) trabaja en esas coordenadas; solo device_tap las
+    devuelve al espacio del dispositivo.
+
+    Los assets se recortaron en capturas de REFERENCE_HEIGHT píxeles de alto (lado
+    corto). La captura se lleva a work_scale * REFERENCE_HEIGHT, así las plantillas
+    solo se reescalan por work_scale y el mismo set de assets sirve para
+    dispositivos con otra resolución.
+    """
+    def __init__(self, work_scale=None, reference_height=None):
+        self.work_scale = work_scale or config.WORK_SCALE
+        self.reference_height = reference_height or config.REFERENCE_HEIGHT
+        self.factor = 1.0        # trabajo / dispositivo (se fija con la primera captura)
+        self.device_size = None  # (w, h) de la última captura nativa
+        self.work_size = None    # (w, h) de la última captura de trabajo
+
+    def to_work(self, frame):
+        """Captura nativa -> captura de trabajo (sin copia si no hay que escalar)."""
+        if frame is None:
+            return None
+        h, w = frame.shape[:2]
+        if self.device_size != (w, h):
+            self.device_size = (w, h)
+            self.factor = self.work_scale * self.reference_height / min(w, h)
+            if abs(self.factor - 1.0) < 1e-3:
+                self.factor = 1.0
+            self.work_size = (int(round(w * self.factor)), int(round(h * self.factor)))
+
+        if self.factor == 1.0:
+            return as_frame(frame)
+        return as_frame(cv2.resize(frame, self.work_size, interpolation=cv2.INTER_AREA))
+
+    def to_device(self, x, y):
+        """Coordenadas de trabajo -> coordenadas del dispositivo (para ADB)."""
+        return int(round(x / self.factor)), int(round(y / self.factor))
+
+    def ref(self, length):
+        """Longitud en píxeles de referencia (constantes del código) -> píxeles de trabajo."""
+        return int(round(length * self.work_scale))
+
+    def from_reference(self, x, y):
+        """Punto fijo en coordenadas de referencia -> coordenadas de trabajo."""
+        return self.ref(x), self.ref(y)
@@ -0,0 +1,143 @@
+import glob
+import os
+import cv2
+import numpy as np
+import config
+from frame import as_frame
+
+# Bits a 1 de cada byte (popcount por tabla)
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint16)
+
+
+# Diferencia mínima (niveles de gris) para que un bit valga 1: las zonas planas
+# quedan a 0 de forma estable en vez de depender del ruido.
+DHASH_MARGIN = 2
+
+
+def dhash(image, size=None):
+    """
+    Huella perceptual (dHash) de una captura: se reduce a (w+1) x h en gris y se
+    compara cada píxel con su vecino derecho. Retorna los w*h bits empaquetados (uint8).
+    """
+    w, h = size or config.SCREEN_HASH_SIZE
+    # Submuestreo previo (~8x8 muestras por celda): el INTER_AREA sobre la captura
+    # completa cuesta más que todo lo demás junto.
+    step = max(1, min(image.shape[0] // (8 * h), image.shape[1] // (8 * (w + 1))))
+    small = cv2.resize(image[::step, ::step], (w + 1, h), interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    small = small.astype(np.int16)
+    return np.packbits(small[:, 1:] - small[:, :-1] > DHASH_MARGIN)
+
+
+def hamming(hash_a, hash_b):
+    """Número de bits distintos entre dos huellas."""
+    return int(_POPCOUNT[np.bitwise_xor(hash_a, hash_b)].sum())
+
+
+class ScreenClassifier:
+    """
+    Clasificador de pantallas por huella perceptual.
+    Índice de huellas etiquetadas (lobby, intermediate, reward...) construido
+    desde un directorio <index_dir>/<etiqueta>/*.png y ampliado en caliente cuando el
+    matching de plantillas confirma una pantalla. Una consulta es un resize y un XOR
+    contra todo el índice, de modo que el matching completo queda solo para confirmar.
+    """
+    MAX_PER_LABEL = 32  # Huellas aprendidas en caliente por etiqueta (FIFO)
+
+    def __init__(self, index_dir=None, max_distance=None):
+        self.index_dir = index_dir if index_dir is not None else config.SCREEN_INDEX_DIR
+        self.max_distance = max_distance if max_distance is not None else config.SCREEN_HASH_MAX_DISTANCE
+        self._labels = []
+        self._hashes = None  # (N, bytes) uint8
+        self._learned = {}   # etiqueta -> número de huellas aprendidas
+        self.reload()
+
+    def reload(self):
+        """Reconstruye el índice desde el directorio de capturas etiquetadas."""
+        self._labels = []
+        self._hashes = None
+        self._learned = {}
+        if not self.index_dir or not os.path.isdir(self.index_dir):
+            return
+        for label in sorted(os.listdir(self.index_dir)):
+            for path in sorted(glob.glob(os.path.join(self.index_dir, label, "*.png"))):
+                img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+                if img is None:
+                    print(f"Error: No se pudo cargar la captura etiquetada: {path}")
+                    continue
+                self._add(label, dhash(img))
+
+    def __len__(self):
+        return len(self._labels)
+
+    def _add(self, label, fingerprint):
+        self._labels.append(label)
+        row = fingerprint[None]
+        self._hashes = row if self._hashes is None else np.vstack([self._hashes, row])
+
+    def learn(self, image, label):
+        """Añade la captura al índice con su etiqueta (confirmada por plantillas)."""
+        count = self._learned.get(label, 0)
+        if count >= self.MAX_PER_LABEL:
+            # Descartar la huella aprendida más antigua de esta etiqueta
+            learned = [i for i, l in enumerate(self._labels) if l == label][-count:]
+            oldest = learned[0]
+            del self._labels[oldest]
+            self._hashes = np.delete(self._hashes, oldest, axis=0)
+            count -= 1
+        self._add(label, dhash(image))
+        self._learned[label] = count + 1
+
+    def classify(self, image):
+        """
+        Etiqueta de la huella más cercana del índice.
+        Retorna (etiqueta, distancia) o (None, distancia) si ninguna está a menos
+        de max_distance bits (o el índice está vacío).
+        """
+        if self._hashes is None:
+            return None, None
+        distances = _POPCOUNT[np.bitwise_xor(self._hashes, dhash(image))].sum(axis=1)
+        best = int(distances.argmin())
+        distance = int(distances[best])
+        if distance > self.max_distance:
+            return None, distance
+        return self._labels[best], distance
+
+
+class FrameChangeGate:
+    """
+    Detector barato de cambios entre capturas consecutivas.
+    Compara una miniatura en gris (reducida 1/scale) con la anterior: la captura
+    cuenta como cambiada si al menos min_pixels píxeles difieren más de pixel_delta.
+    Un umbral por píxel (y no una media o un hash global) mantiene visible la
+    aparición de elementos pequeños como una X de cierre en una esquina.
+    La misma miniatura da el brillo medio para detectar pantallas negras.
+    """
+    def __init__(self, scale=None, pixel_delta=None, min_pixels=None):
+        self.scale = scale or config.FRAME_GATE_SCALE
+        self.pixel_delta = pixel_delta if pixel_delta is not None else config.FRAME_GATE_PIXEL_DELTA
+        self.min_pixels = min_pixels if min_pixels is not None else config.FRAME_GATE_MIN_PIXELS
+        self.mean = None       # Brillo medio (0-255) de la última captura
+        self.changed_pixels = None
+        self.reset()
+
+    def reset(self):
+        """Olvida la captura anterior: la siguiente cuenta como cambiada (p.ej. tras un tap)."""
+        self._last = None
+
+    def update(self, image):
+        """Registra una captura nueva. Retorna True si cambió respecto a la anterior."""
+        # INTER_AREA promedia bloques scale x scale: un submuestreo por saltos
+        # perdería trazos finos (la X de cierre son líneas de pocos píxeles).
+        h, w = image.shape[:2]
+        thumb = as_frame(image).resized((w // self.scale, h // self.scale), gray=True,
+                                        interpolation=cv2.INTER_AREA)
+        self.mean = float(thumb.mean())
+
+        last, self._last = self._last, thumb
+        if last is None or last.shape != thumb.shape:
+            self.changed_pixels = None
+            return True
+        self.changed_pixels = int(np.count_nonzero(cv2.absdiff(thumb, last) > self.pixel_delta))
+        return self.changed_pixels >= self.min_pixels
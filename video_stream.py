@@ -0,0 +1,173 @@
+import socket
+import threading
+import time
+
+import cv2
+
+from frame import Frame
+
+try:
+    import av  # PyAV (opcional): decodificación H.264 del modo vídeo
+except ImportError:
+    av = None
+
+# NAL "access unit delimiter": marca el final del frame pendiente en el parser
+H264_AUD = b"\x00\x00\x00\x01\x09\xf0"
+
+
+class VideoStream:
+    """
+    Captura por vídeo: `screenrecord --output-format=h264 -` a tamaño reducido,
+    decodificado en el PC con PyAV. El hilo lector publica el último frame
+    decodificado y ADBWrapper.take_screenshot lo sirve sin ir al dispositivo.
+
+    screenrecord solo emite frames cuando la pantalla cambia: sin frames nuevos
+    el último sigue siendo la pantalla actual. El stream se reabre al llegar al
+    límite de tiempo de screenrecord (3 min).
+    """
+    def __init__(self, device, size, bitrate, idle_flush=0.03):
+        self.device = device
+        self.size = size          # (w, h) del vídeo (múltiplos de 16)
+        self.bitrate = bitrate
+        self.idle_flush = idle_flush
+        self.error = None         # Motivo por el que el stream dejó de funcionar
+        self._cond = threading.Condition()
+        self._latest = None       # (t, frame)
+        self._stop = threading.Event()
+        self._thread = None
+        self._conn = None
+        self.stats = {"frames": 0, "restarts": 0, "decode_ms": 0.0}
+
+    @staticmethod
+    def available():
+        return av is not None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="video-stream", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        with self._cond:
+            self._cond.notify_all()
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive() and self.error is None
+
+    def _open(self):
+        w, h = self.size
+        conn = self.device.open_transport()
+        conn.send_command(f"exec:screenrecord --output-format=h264 --size {w}x{h} "
+                          f"--bit-rate {self.bitrate} -")
+        conn.check_okay()
+        return conn
+
+    def _run(self):
+        failures = 0
+        while not self._stop.is_set():
+            try:
+                self._conn = self._open()
+                self._read(self._conn.conn)
+                failures = 0
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                failures += 1
+                if not self.stats["frames"] or failures >= 3:
+                    # screenrecord o el decoder no sirven aquí (o el dispositivo cayó)
+                    self.error = str(e)
+                    break
+                self._stop.wait(1.0)
+            finally:
+                if self._conn is not None:
+                    try:
+                        self._conn.close()
+                    except Exception:
+                        pass
+            if self._stop.is_set():
+                break
+            self.stats["restarts"] += 1 # Fin de --time-limit: reabrir
+        with self._cond:
+            self._cond.notify_all()
+
+    def _read(self, sock):
+        codec = av.CodecContext.create("h264", "r")
+        sock.settimeout(self.idle_flush)
+        pending = False
+        while not self._stop.is_set():
+            try:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    if not self.stats["frames"]:
+                        raise EOFError("screenrecord terminó sin frames")
+                    return
+            except socket.timeout:
+                if not pending:
+                    continue
+                # Sin datos un momento: el frame en el parser está completo
+                chunk, pending = H264_AUD, False
+            else:
+                pending = True
+            for packet in codec.parse(chunk):
+                start = time.perf_counter()
+                for decoded in codec.decode(packet):
+                    self._publish(decoded.to_ndarray(format="bgr24"), start)
+
+    def _publish(self, image, start):
+        frame = Frame(image)
+        now = time.time()
+        with self._cond:
+            self._latest = (now, frame)
+            self.stats["frames"] += 1
+            self.stats["decode_ms"] = (time.perf_counter() - start) * 1000
+            self._cond.notify_all()
+
+    def wait_first_frame(self, timeout):
+        """True si llega el primer frame antes de timeout."""
+        deadline = time.time() + timeout
+        with self._cond:
+            while self._latest is None and self.is_alive():
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return self._latest is not None
+
+    def latest(self, newer_than=0.0, wait=0.0):
+        """
+        Último frame decodificado. Si es anterior a newer_than (p.ej. la última
+        acción) espera hasta `wait` s uno nuevo; si no llega, la pantalla no ha
+        cambiado y se devuelve el último. None si el stream ha caído.
+        """
+        deadline = time.time() + wait
+        with self._cond:
+            while self._latest is not None and self._latest[0] < newer_than and self.is_alive():
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            if self._latest is None or not self.is_alive():
+                return None
+            return self._latest[1]
+
+
+def stream_size(width, height, scale):
+    """Tamaño de vídeo para screenrecord: escala y múltiplos de 16 (encoders H.264)."""
+    return max(16, int(width * scale) // 16 * 16), max(16, int(height * scale) // 16 * 16)
+
+
+def upscale(frame, size):
+    """Frame del vídeo -> resolución del dispositivo (misma interfaz que screencap)."""
+    if (frame.shape[1], frame.shape[0]) == size:
+        return frame
+    return Frame(cv2.resize(frame, size, interpolation=cv2.INTER_LINEAR))
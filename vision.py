@@ -1,23 +1,402 @@
+import glob
+import os
+from concurrent.futures import ThreadPoolExecutor
 import cv2
 import numpy as np
+import config
+from frame import as_frame
+
+
+class Template:
+    """Plantilla decodificada con sus variantes precalculadas (BGR, gris, invertida)."""
+    def __init__(self, name, path, bgr):
+        self.name = name
+        self.path = path
+        self.bgr = bgr
+        self.gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+        self.inv = cv2.bitwise_not(bgr)
+        self.h, self.w = bgr.shape[:2]
+        self._scaled = {}
+
+    def scaled(self, factor, variant="bgr"):
+        """Variante reducida 1/factor (cacheada) para el nivel grueso de la pirámide."""
+        key = (factor, variant)
+        if key not in self._scaled:
+            img = getattr(self, variant)
+            size = (max(1, self.w // factor), max(1, self.h // factor))
+            self._scaled[key] = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+        return self._scaled[key]
+
+
+def scale_template(img, scale):
+    """Reescala una plantilla a la resolución de trabajo (sin copia si scale == 1)."""
+    if scale == 1.0:
+        return img
+    h, w = img.shape[:2]
+    size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+    interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR
+    return cv2.resize(img, size, interpolation=interpolation)
+
+
+class TemplateRegistry:
+    """
+    Registro de plantillas precargadas en memoria.
+    Carga una sola vez todos los assets nombrados en config.py y todos los
+    ff_button*.png, de modo que cada match no vuelve a decodificar el PNG.
+    """
+    FF_BUTTON_PATTERN = "ff_button*.png"
+
+    def __init__(self, assets_dir=None, scale=None):
+        self.assets_dir = assets_dir or config.ASSETS_DIR
+        # Escala de trabajo: los assets se reducen una vez al cargarlos (ver resolution.py)
+        self.scale = scale or config.WORK_SCALE
+        self._templates = {}   # path normalizado -> Template (o None si no existe)
+        self._ff_buttons = []
+        self._reported_missing = set()
+        self.reload()
+
+    def _config_asset_names(self):
+        """Nombres de assets declarados en config.py (*_TEMPLATE y *_TEMPLATES)."""
+        names = []
+        for attr in dir(config):
+            value = getattr(config, attr)
+            if attr.endswith("_TEMPLATE") and isinstance(value, str):
+                names.append(value)
+            elif attr.endswith("_TEMPLATES") and isinstance(value, (list, tuple)):
+                names.extend(value)
+        return sorted(set(names))
+
+    def _key(self, path_or_name):
+        if os.path.dirname(path_or_name) == "":
+            path_or_name = os.path.join(self.assets_dir, path_or_name)
+        return os.path.normpath(path_or_name)
+
+    def _load(self, path):
+        if not os.path.exists(path):
+            return None
+        bgr = cv2.imread(path, cv2.IMREAD_COLOR)
+        if bgr is None:
+            return None
+        bgr = scale_template(bgr, self.scale)
+        return Template(os.path.basename(path), path, bgr)
+
+    def reload(self):
+        """Vuelve a leer del disco todos los assets (p.ej. tras recortar uno nuevo)."""
+        templates = {}
+        for name in self._config_asset_names():
+            key = self._key(name)
+            templates[key] = self._load(key)
+
+        ff_paths = sorted(glob.glob(os.path.join(self.assets_dir, self.FF_BUTTON_PATTERN)))
+        ff_buttons = []
+        for path in ff_paths:
+            key = self._key(path)
+            template = templates.get(key) or self._load(key)
+            templates[key] = template
+            if template is not None:
+                ff_buttons.append(template)
+
+        self._templates = templates
+        self._ff_buttons = ff_buttons
+        self._reported_missing = set()
+
+    def get(self, path_or_name):
+        """
+        Devuelve la Template asociada a una ruta (o nombre dentro de assets_dir).
+        Las rutas no declaradas en config se cargan la primera vez y quedan cacheadas.
+        """
+        key = self._key(path_or_name)
+        if key not in self._templates:
+            self._templates[key] = self._load(key)
+
+        template = self._templates[key]
+        if template is None and key not in self._reported_missing:
+            print(f"Error: No se pudo cargar la imagen plantilla: {path_or_name}")
+            self._reported_missing.add(key)
+        return template
+
+    def ff_buttons(self):
+        """Plantillas ff_button*.png encontradas en el último (re)load."""
+        return self._ff_buttons
+
+
+class TemplateBank:
+    """
+    Familia de plantillas generadas (X, >>|) construida una sola vez.
+    Las plantillas del mismo tamaño se guardan apiladas en arrays contiguos (k, h, w)
+    y se comparan todas a la vez contra un ROI en escala de grises: la DFT del ROI
+    se calcula una sola vez y se comparte entre todas las plantillas, y el
+    denominador de TM_CCOEFF_NORMED sale de las imágenes integrales del ROI,
+    comunes a cada grupo de tamaño.
+    """
+    def __init__(self, templates):
+        self.names = [name for name, _ in templates]
+        self.groups = []
+
+        by_shape = {}
+        for idx, (name, img) in enumerate(templates):
+            by_shape.setdefault(img.shape[:2], []).append(idx)
+
+        for shape, indices in by_shape.items():
+            stack = np.ascontiguousarray(np.stack([templates[i][1] for i in indices]))
+            zero_mean = stack.astype(np.float32)
+            zero_mean -= zero_mean.mean(axis=(1, 2), keepdims=True)
+            norms = np.sqrt((zero_mean.astype(np.float64) ** 2).sum(axis=(1, 2))).astype(np.float32)
+            self.groups.append({
+                "shape": shape,
+                "indices": indices,
+                "stack": stack,
+                "zero_mean": zero_mean,
+                "norms": norms,
+                "spectra": {},  # (P, Q) -> espectro conjugado de las plantillas
+            })
+
+    def __len__(self):
+        return len(self.names)
+
+    def template(self, index):
+        """Plantilla uint8 por índice (vista sobre el array apilado)."""
+        for group in self.groups:
+            if index in group["indices"]:
+                return group["stack"][group["indices"].index(index)]
+        raise IndexError(index)
+
+    def roi_context(self, roi_gray):
+        """Datos del ROI compartidos por todos los grupos: DFT e imágenes integrales."""
+        r_h, r_w = roi_gray.shape[:2]
+        dft_size = (cv2.getOptimalDFTSize(r_h), cv2.getOptimalDFTSize(r_w))
+        spectrum = np.fft.rfft2(roi_gray.astype(np.float32), s=dft_size)
+        integral, integral_sq = cv2.integral2(roi_gray, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+        return {
+            "shape": (r_h, r_w),
+            "dft_size": dft_size,
+            "spectrum": spectrum,
+            "integral": integral,
+            "integral_sq": integral_sq,
+        }
+
+    def match_group(self, ctx, group):
+        """
+        TM_CCOEFF_NORMED de todas las plantillas de un grupo sobre el ROI.
+        Retorna lista [(indice, max_val, max_loc)] en el orden del grupo.
+        """
+        r_h, r_w = ctx["shape"]
+        t_h, t_w = group["shape"]
+        if t_h > r_h or t_w > r_w:
+            return []
+
+        dft_size = ctx["dft_size"]
+        spectra = group["spectra"].get(dft_size)
+        if spectra is None:
+            spectra = np.conj(np.fft.rfft2(group["zero_mean"], s=dft_size))
+            group["spectra"][dft_size] = spectra
+
+        # Numerador: correlación con la plantilla de media cero (vía DFT compartida)
+        out_h, out_w = r_h - t_h + 1, r_w - t_w + 1
+        corr = np.fft.irfft2(ctx["spectrum"][None] * spectra, s=dft_size)[:, :out_h, :out_w]
+
+        # Denominador: desviación de cada ventana del ROI (común a todo el grupo)
+        ii, ii_sq = ctx["integral"], ctx["integral_sq"]
+        win_sum = ii[t_h:, t_w:] - ii[:-t_h, t_w:] - ii[t_h:, :-t_w] + ii[:-t_h, :-t_w]
+        win_sq = ii_sq[t_h:, t_w:] - ii_sq[:-t_h, t_w:] - ii_sq[t_h:, :-t_w] + ii_sq[:-t_h, :-t_w]
+        win_std = np.sqrt(np.maximum(win_sq - win_sum * win_sum / (t_h * t_w), 0)).astype(np.float32)
+        win_std[win_std < 1e-3] = np.inf  # Ventanas planas -> 0, como OpenCV
+
+        scores = corr / (win_std[None] * group["norms"][:, None, None])
+        flat = scores.reshape(len(group["indices"]), -1)
+        best = flat.argmax(axis=1)
+
+        results = []
+        for j, index in enumerate(group["indices"]):
+            pos = int(best[j])
+            results.append((index, min(1.0, float(flat[j, pos])), (pos % out_w, pos // out_w)))
+        return results
+
+    def match(self, roi_gray):
+        """
+        Compara todo el banco contra el ROI.
+        Retorna lista [(max_val, max_loc)] indexada como el banco (None si no cabe).
+        """
+        ctx = self.roi_context(roi_gray)
+        results = [None] * len(self.names)
+        for group in self.groups:
+            for index, max_val, max_loc in self.match_group(ctx, group):
+                results[index] = (max_val, max_loc)
+        return results
+
 
 class Vision:
-    def __init__(self):
-        pass
+    # Lado mínimo (px) de la plantilla reducida para que el nivel grueso sea fiable
+    PYRAMID_MIN_TEMPLATE_SIDE = 8
+    # Candidatos del nivel grueso que se refinan a resolución completa
+    PYRAMID_CANDIDATES = 3
+
+    def __init__(self, registry=None, pyramid=None, workers=None, scale=None):
+        self.scale = scale or config.WORK_SCALE
+        self.registry = registry or TemplateRegistry(scale=self.scale)
+        # Factor de la pirámide (4 u 8). None = matching a resolución completa.
+        self.pyramid = pyramid if pyramid is not None else config.PYRAMID_FACTOR
+        self._coarse_cache = (None, {})  # (screen, {factor: screen reducida})
+
+        # Pool opcional para repartir matches independientes entre núcleos
+        # (cv2.matchTemplate y las FFT de numpy liberan el GIL).
+        self.workers = workers if workers is not None else config.VISION_WORKERS
+        self._executor = None
+        if self.workers and self.workers > 1:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="vision")
+        # Bancos generativos: se dibujan una sola vez (a la escala de trabajo)
+        self.x_bank = TemplateBank([(name, scale_template(img, self.scale)) for name, img in self.generate_x_templates()])
+        self.ff_bank = TemplateBank([(name, scale_template(img, self.scale)) for name, img in self.generate_ff_templates()])
+
+    def reload_templates(self):
+        """Recarga explícita de las plantillas del disco."""
+        self.registry.reload()
+
+    def shutdown(self):
+        """Libera el pool de hilos (si se creó)."""
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _map(self, fn, items):
+        """map() en el pool si existe; en serie si no. Conserva el orden."""
+        if self._executor:
+            return list(self._executor.map(fn, items))
+        return [fn(item) for item in items]
+
+    def _first_hit(self, stages):
+        """
+        Ejecuta etapas ordenadas y devuelve el resultado de la primera con acierto.
+        stages: lista de etapas; cada etapa es un callable que prepara y devuelve su
+        lista de tareas, y cada tarea devuelve una lista de candidatos (orden, resultado).
+        El acierto de una etapa es su candidato de menor orden, así el resultado es el
+        mismo que en serie. La preparación (p.ej. la FFT de la ROI) se hace una vez
+        por etapa, antes de repartir sus tareas.
+
+        En serie se corta en la primera etapa con acierto. Con pool las tareas de
+        cada etapa se lanzan en cuanto está preparada, mientras se prepara la
+        siguiente; si las etapas ya resueltas dan el acierto no se preparan más. En
+        cuanto se resuelve la primera etapa con acierto, se cancela el trabajo
+        pendiente del resto.
+        """
+        if not self._executor:
+            for stage in stages:
+                candidates = [c for task in stage() for c in task()]
+                if candidates:
+                    return min(candidates, key=lambda c: c[0])[1]
+            return None
+
+        futures = []
+        try:
+            for stage in stages:
+                hit = self._resolved_hit(futures)
+                if hit is not None:
+                    return hit[1]
+                futures.append([self._executor.submit(task) for task in stage()])
+            for stage_futures in futures:
+                candidates = [c for f in stage_futures for c in f.result()]
+                if candidates:
+                    return min(candidates, key=lambda c: c[0])[1]
+            return None
+        finally:
+            for stage_futures in futures:
+                for f in stage_futures:
+                    f.cancel()
+
+    @staticmethod
+    def _resolved_hit(futures):
+        """Candidato ganador si las etapas ya terminadas lo deciden (None si falta alguna)."""
+        for stage_futures in futures:
+            if not all(f.done() for f in stage_futures):
+                return None
+            candidates = [c for f in stage_futures for c in f.result()]
+            if candidates:
+                return min(candidates, key=lambda c: c[0])
+        return None
+
+    def _coarse_screen(self, screen_image, factor):
+        """Captura reducida 1/factor. Se reutiliza entre llamadas sobre la misma captura."""
+        cached_screen, smalls = self._coarse_cache
+        if cached_screen is not screen_image:
+            smalls = {}
+            self._coarse_cache = (screen_image, smalls)
+        if factor not in smalls:
+            s_h, s_w = screen_image.shape[:2]
+            smalls[factor] = cv2.resize(screen_image, (s_w // factor, s_h // factor), interpolation=cv2.INTER_AREA)
+        return smalls[factor]
+
+    def _match(self, screen_image, entry, variant="bgr", pyramid=None):
+        """
+        Devuelve (max_val, max_loc) de TM_CCOEFF_NORMED para la plantilla.
+        Con pyramid=N busca primero a 1/N y refina a resolución completa solo
+        en una ventana pequeña alrededor de los mejores candidatos.
+        """
+        template = getattr(entry, variant)
+        factor = pyramid or 0
+        # Plantillas pequeñas: bajar de nivel (8 -> 4 -> 2) antes que perder detalle
+        while factor > 1 and min(entry.w, entry.h) // factor < self.PYRAMID_MIN_TEMPLATE_SIDE:
+            factor //= 2
+        if factor > 1:
+            return self._match_pyramid(screen_image, entry, variant, factor)
+
+        result = cv2.matchTemplate(screen_image, template, cv2.TM_CCOEFF_NORMED)
+        _, max_val, _, max_loc = cv2.minMaxLoc(result)
+        return max_val, max_loc
+
+    def _match_pyramid(self, screen_image, entry, variant, factor):
+        template = getattr(entry, variant)
+        small_tmpl = entry.scaled(factor, variant)
+        small_screen = self._coarse_screen(screen_image, factor)
+        s_h, s_w = screen_image.shape[:2]
+        st_h, st_w = small_tmpl.shape[:2]
+
+        if small_screen.shape[0] < st_h or small_screen.shape[1] < st_w:
+            result = cv2.matchTemplate(screen_image, template, cv2.TM_CCOEFF_NORMED)
+            _, max_val, _, max_loc = cv2.minMaxLoc(result)
+            return max_val, max_loc
 
-    def find_template(self, screen_image, template_path, threshold=0.8, check_negative=False):
+        coarse = cv2.matchTemplate(small_screen, small_tmpl, cv2.TM_CCOEFF_NORMED)
+        margin = 2 * factor
+        best_val, best_loc = -1.0, (0, 0)
+
+        for _ in range(self.PYRAMID_CANDIDATES):
+            _, c_val, _, c_loc = cv2.minMaxLoc(coarse)
+            if c_val <= -1.0:
+                break
+
+            # Ventana de refinado a resolución completa
+            x1 = max(0, c_loc[0] * factor - margin)
+            y1 = max(0, c_loc[1] * factor - margin)
+            x2 = min(s_w, c_loc[0] * factor + entry.w + margin)
+            y2 = min(s_h, c_loc[1] * factor + entry.h + margin)
+            window = screen_image[y1:y2, x1:x2]
+            if window.shape[0] >= entry.h and window.shape[1] >= entry.w:
+                result = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+                _, max_val, _, max_loc = cv2.minMaxLoc(result)
+                if max_val > best_val:
+                    best_val, best_loc = max_val, (x1 + max_loc[0], y1 + max_loc[1])
+
+            # Suprimir el vecindario del candidato para buscar el siguiente
+            cx1 = max(0, c_loc[0] - st_w // 2)
+            cy1 = max(0, c_loc[1] - st_h // 2)
+            coarse[cy1:c_loc[1] + st_h // 2 + 1, cx1:c_loc[0] + st_w // 2 + 1] = -1.0
+
+        return best_val, best_loc
+
+    def find_template(self, screen_image, template_path, threshold=0.8, check_negative=False, pyramid=None):
         """
         Busca una imagen plantilla dentro de la captura de pantalla.
         Devuelve (x, y, w, h) si se encuentra, o None si no.
         check_negative: Si True, busca también con la plantilla invertida (blanco<->negro).
+        pyramid: Factor coarse-to-fine (4 u 8). Por defecto el configurado en Vision.
         """
         if screen_image is None:
             return None
 
-        template = cv2.imread(template_path, cv2.IMREAD_COLOR)
-        if template is None:
-            print(f"Error: No se pudo cargar la imagen plantilla: {template_path}")
+        entry = self.registry.get(template_path)
+        if entry is None:
             return None
+        template = entry.bgr
             
         # Verify sizes
         t_h, t_w = template.shape[:2]
@@ -27,9 +406,11 @@ class Vision:
             # print(f"⚠ Warning: Imagen de pantalla ({s_w}x{s_h}) más pequeña que template ({t_w}x{t_h}). Saltando.")
             return None
 
+        if pyramid is None:
+            pyramid = self.pyramid
+
         # 1. Match Normal
-        result = cv2.matchTemplate(screen_image, template, cv2.TM_CCOEFF_NORMED)
-        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+        max_val, max_loc = self._match(screen_image, entry, "bgr", pyramid)
 
         best_val = max_val
         best_loc = max_loc
@@ -37,9 +418,7 @@ class Vision:
 
         # 2. Match Negativo (si solicitado)
         if check_negative:
-             template_inv = cv2.bitwise_not(template)
-             result_inv = cv2.matchTemplate(screen_image, template_inv, cv2.TM_CCOEFF_NORMED)
-             min_val_i, max_val_i, min_loc_i, max_loc_i = cv2.minMaxLoc(result_inv)
+             max_val_i, max_loc_i = self._match(screen_image, entry, "inv", pyramid)
              
              if max_val_i > best_val:
                  # print(f"Found better match with NEGATIVE template: {max_val_i}")
@@ -53,21 +432,21 @@ class Vision:
         
         return None
 
-    def find_template_adaptive(self, screen_image, template_path, hint_coords=None, threshold=0.8, thresholds=None):
+    def find_template_adaptive(self, screen_image, template_path, hint_coords=None, threshold=0.8, thresholds=None, pyramid=None):
         """
         Busca una imagen plantilla con memoria adaptativa.
         1. Si hint_coords (x, y, w, h) existe, primero busca en esa región.
-        2. Si no encuentra, busca en toda la imagen.
+        2. Si no encuentra, busca en toda la imagen (coarse-to-fine si pyramid).
         
         Retorna: (center_x, center_y, w, h) o None.
         """
         if screen_image is None:
             return None
         
-        template = cv2.imread(template_path, cv2.IMREAD_COLOR)
-        if template is None:
-            print(f"Error: No se pudo cargar la imagen plantilla: {template_path}")
+        entry = self.registry.get(template_path)
+        if entry is None:
             return None
+        template = entry.bgr
         
         t_h, t_w = template.shape[:2]
         s_h, s_w = screen_image.shape[:2]
@@ -77,29 +456,19 @@ class Vision:
         
         # --- Paso 1: Buscar en hint_coords si existen ---
         if hint_coords:
-            hx, hy, hw, hh = hint_coords
-            # Expandir el ROI para tolerancia
-            margin = max(50, t_w, t_h)
-            x1 = max(0, hx - margin)
-            y1 = max(0, hy - margin)
-            x2 = min(s_w, hx + hw + margin)
-            y2 = min(s_h, hy + hh + margin)
-            
-            roi = screen_image[y1:y2, x1:x2]
-            
-            if roi.shape[0] >= t_h and roi.shape[1] >= t_w:
-                result = cv2.matchTemplate(roi, template, cv2.TM_CCOEFF_NORMED)
-                min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-                
+            hint_match = self._match_hint(screen_image, entry, hint_coords)
+            if hint_match:
+                max_val, max_loc = hint_match
                 if max_val >= threshold:
-                    abs_x = x1 + max_loc[0] + t_w // 2
-                    abs_y = y1 + max_loc[1] + t_h // 2
+                    abs_x = max_loc[0] + t_w // 2
+                    abs_y = max_loc[1] + t_h // 2
                     print(f"Template Adaptive: Encontrado en hint ROI @ ({abs_x},{abs_y}) conf={max_val:.2f}")
                     return (abs_x, abs_y, t_w, t_h)
         
         # --- Paso 2: Búsqueda completa ---
-        result = cv2.matchTemplate(screen_image, template, cv2.TM_CCOEFF_NORMED)
-        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+        if pyramid is None:
+            pyramid = self.pyramid
+        max_val, max_loc = self._match(screen_image, entry, "bgr", pyramid)
         
         if max_val >= threshold:
             center_x = max_loc[0] + t_w // 2
@@ -109,6 +478,76 @@ class Vision:
         
         return None
 
+    def _match_hint(self, screen_image, entry, hint_coords):
+        """
+        Match dentro del ROI de memoria (hint_coords ampliado con margen).
+        Retorna (max_val, max_loc absoluto) o None si el ROI no admite la plantilla.
+        """
+        s_h, s_w = screen_image.shape[:2]
+        hx, hy, hw, hh = hint_coords
+        # Expandir el ROI para tolerancia
+        margin = max(50, entry.w, entry.h)
+        x1 = max(0, hx - margin)
+        y1 = max(0, hy - margin)
+        x2 = min(s_w, hx + hw + margin)
+        y2 = min(s_h, hy + hh + margin)
+
+        roi = screen_image[y1:y2, x1:x2]
+        if roi.shape[0] < entry.h or roi.shape[1] < entry.w:
+            return None
+
+        result = cv2.matchTemplate(roi, entry.bgr, cv2.TM_CCOEFF_NORMED)
+        _, max_val, _, max_loc = cv2.minMaxLoc(result)
+        return max_val, (x1 + max_loc[0], y1 + max_loc[1])
+
+    def scan(self, screen_image, template_set, hints=None, threshold=0.8, pyramid=None):
+        """
+        Evalúa un conjunto de plantillas sobre la misma captura en una sola pasada.
+        template_set: nombre de config.TEMPLATE_SETS o lista de nombres de asset.
+        hints: dict opcional {nombre: (x, y, w, h)} con la memoria adaptativa;
+               esas plantillas se buscan primero en su ROI y solo si fallan en todo el frame.
+
+        Retorna dict {nombre: (score, (cx, cy, w, h) | None)} con todas las puntuaciones.
+        El match solo se rellena si score >= threshold; el llamador decide la prioridad.
+        """
+        names = config.TEMPLATE_SETS[template_set] if isinstance(template_set, str) else template_set
+        results = {name: (-1.0, None) for name in names}
+        if screen_image is None:
+            return results
+
+        hints = hints or {}
+        if pyramid is None:
+            pyramid = self.pyramid
+        s_h, s_w = screen_image.shape[:2]
+        if pyramid and pyramid > 1:
+            # La captura reducida de la pirámide se comparte entre todas las plantillas
+            self._coarse_screen(screen_image, pyramid)
+
+        def scan_one(name):
+            entry = self.registry.get(name)
+            if entry is None or s_h < entry.h or s_w < entry.w:
+                return name, None
+
+            match = None
+            if hints.get(name):
+                match = self._match_hint(screen_image, entry, hints[name])
+                if match and match[0] < threshold:
+                    match = None
+            if match is None:
+                match = self._match(screen_image, entry, "bgr", pyramid)
+
+            score, loc = match
+            found = None
+            if score >= threshold:
+                found = (loc[0] + entry.w // 2, loc[1] + entry.h // 2, entry.w, entry.h)
+            return name, (score, found)
+
+        for name, result in self._map(scan_one, names):
+            if result is not None:
+                results[name] = result
+
+        return results
+
 
     def generate_x_templates(self):
         """Genera plantillas de 'X' en memoria para no depender de archivos."""
@@ -181,14 +620,10 @@ class Vision:
         Busca el botón de Fast Forward (>>) usando MULTIPLES assets (ff_button*.png)
         y lógica fall-back generativa.
         """
-        import glob
-        import os
+        # Patrones ff_button*.png precargados en el registro
+        ff_templates = self.registry.ff_buttons()
         
-        # Buscar todos los patrones
-        asset_pattern = os.path.join("assets", "ff_button*.png")
-        files = glob.glob(asset_pattern)
-        
-        if not files:
+        if not ff_templates:
             # print("⚠ Ningún asset ff_button*.png encontrado. Usando lógica generativa...")
             pass # Seguirá al final
 
@@ -203,47 +638,57 @@ class Vision:
         ]
 
         # 1. Iterar sobre todos los archivos encontrados
-        for f_path in files:
-            template = cv2.imread(f_path, cv2.IMREAD_UNCHANGED)
-            if template is None: continue
-
-            # Usar BGR directo
-            tmpl_bgr = template[:, :, :3] if template.shape[2] == 4 else template
-            
-            for roi_name, x1, y1, x2, y2 in rois:
+        def file_task(entry, x1, y1, x2, y2):
+            def task():
+                # Usar BGR directo
                 roi_img = image[y1:y2, x1:x2]
-                res = cv2.matchTemplate(roi_img, tmpl_bgr, cv2.TM_CCOEFF_NORMED)
+                if roi_img.shape[0] < entry.h or roi_img.shape[1] < entry.w:
+                    return []
+                res = cv2.matchTemplate(roi_img, entry.bgr, cv2.TM_CCOEFF_NORMED)
                 min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(res)
                 
                 if max_val > 0.70:
-                    h, w = tmpl_bgr.shape[:2]
-                    global_x = x1 + max_loc[0] + w // 2
-                    global_y = y1 + max_loc[1] + h // 2
-                    # print(f"Match FF con archivo '{os.path.basename(f_path)}': {max_val:.2f}")
-                    return (global_x, global_y, w, h)
+                    global_x = x1 + max_loc[0] + entry.w // 2
+                    global_y = y1 + max_loc[1] + entry.h // 2
+                    # print(f"Match FF con archivo '{entry.name}': {max_val:.2f}")
+                    return [(0, (global_x, global_y, entry.w, entry.h))]
+                return []
+            return task
+
+        stages = [lambda entry=entry, roi=roi: [file_task(entry, *roi[1:])]
+                  for entry in ff_templates for roi in rois]
 
         # Fallback: Generative logic (The shape user described: >>|)
         # print("ℹ Usando lógica generativa para Fast Forward (>>|)...")
-        gray_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
-        # Generar plantillas dinámicas
-        gen_templates = self.generate_ff_templates()
+        gray = []
+        def gray_image():
+            if not gray:
+                gray.append(as_frame(image).gray)
+            return gray[0]
         
-        for roi_name, x1, y1, x2, y2 in rois:
-            roi_img = gray_image[y1:y2, x1:x2]
-            
-            for name, tmpl in gen_templates:
-                res = cv2.matchTemplate(roi_img, tmpl, cv2.TM_CCOEFF_NORMED)
-                min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(res)
-                
-                if max_val > 0.55: # Threshold tolerante (Lowered to 0.55 for reliability)
-                    h, w = tmpl.shape[:2]
-                    global_x = x1 + max_loc[0] + w // 2
-                    global_y = y1 + max_loc[1] + h // 2
-                    # print(f"Match generativo FF ({name}): {max_val} en {global_x},{global_y}")
-                    return (global_x, global_y, w, h)
+        def bank_task(ctx, group, x1, y1):
+            def task():
+                candidates = []
+                for index, max_val, max_loc in self.ff_bank.match_group(ctx, group):
+                    if max_val > 0.55: # Threshold tolerante (Lowered to 0.55 for reliability)
+                        h, w = group["shape"]
+                        global_x = x1 + max_loc[0] + w // 2
+                        global_y = y1 + max_loc[1] + h // 2
+                        # print(f"Match generativo FF ({self.ff_bank.names[index]}): {max_val} en {global_x},{global_y}")
+                        candidates.append((index, (global_x, global_y, w, h)))
+                return candidates
+            return task
+
+        # Una etapa por ROI; dentro, un grupo de tamaño por tarea. Gana el menor índice
+        # del banco, como en el recorrido original plantilla a plantilla.
+        def bank_stage(x1, y1, x2, y2):
+            ctx = self.ff_bank.roi_context(gray_image()[y1:y2, x1:x2])
+            return [bank_task(ctx, group, x1, y1) for group in self.ff_bank.groups]
+
+        for roi in rois:
+            stages.append(lambda roi=roi: bank_stage(*roi[1:]))
                     
-        return None
+        return self._first_hit(stages)
 
     def find_fast_forward_button_backup(self, image):
         # ... Lógica generativa antigua (renombrada) ...
@@ -270,36 +715,38 @@ class Vision:
             # ("bottom_right", width - roi_size_w, height - roi_size_h, width, height)
         ]
         
-        gray_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
-        # 1. Búsqueda con templates generados
-        generated_templates = self.generate_x_templates()
+        gray_image = as_frame(image).gray
         
-        for roi_name, x1, y1, x2, y2 in rois:
-            roi_img = gray_image[y1:y2, x1:x2]
-            
-            for name, tmpl in generated_templates:
-                # Usar un threshold un poco más bajo para formas genéricas
-                res = cv2.matchTemplate(roi_img, tmpl, cv2.TM_CCOEFF_NORMED)
-                min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(res)
-                
-                if max_val > 0.65: # Threshold tolerante para formas
-                    h, w = tmpl.shape[:2]
-                    # Ajustar coordenadas globales
-                    global_x = x1 + max_loc[0] + w // 2
-                    global_y = y1 + max_loc[1] + h // 2
-                    
-                    # Verificar si está en zona ignorada
-                    if ignored_zones:
-                        is_ignored = False
-                        for (ix, iy, ir) in ignored_zones:
-                            dist = np.sqrt((global_x - ix)**2 + (global_y - iy)**2)
-                            if dist < ir:
-                                is_ignored = True
-                                break
-                        if is_ignored:
+        # 1. Búsqueda con templates generados (banco precalculado)
+        def is_ignored(global_x, global_y):
+            # Verificar si está en zona ignorada
+            if ignored_zones:
+                for (ix, iy, ir) in ignored_zones:
+                    dist = np.sqrt((global_x - ix)**2 + (global_y - iy)**2)
+                    if dist < ir:
+                        return True
+            return False
+
+        def bank_task(ctx, group, x1, y1):
+            def task():
+                candidates = []
+                for index, max_val, max_loc in self.x_bank.match_group(ctx, group):
+                    # Usar un threshold un poco más bajo para formas genéricas
+                    if max_val > 0.65: # Threshold tolerante para formas
+                        h, w = group["shape"]
+                        # Ajustar coordenadas globales
+                        global_x = x1 + max_loc[0] + w // 2
+                        global_y = y1 + max_loc[1] + h // 2
+                        if is_ignored(global_x, global_y):
                             continue
+                        candidates.append((index, (global_x, global_y, w, h)))
+                return candidates
+            return task
 
-                    return (global_x, global_y, w, h)
+        def bank_stage(x1, y1, x2, y2):
+            ctx = self.x_bank.roi_context(gray_image[y1:y2, x1:x2])
+            return [bank_task(ctx, group, x1, y1) for group in self.x_bank.groups]
 
-        return None
+        stages = [lambda roi=roi: bank_stage(*roi[1:]) for roi in rois]
+
+        return self._first_hit(stages)